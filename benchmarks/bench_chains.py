@@ -0,0 +1,168 @@
+"""Offline microbenchmarks for the patterns-app chains.
+
+Runs every chain against the stand-ins in `offline.py` and prints per-stage latency (embed, query, format,
+prompt, llm and the remaining chain overhead) together with per-call allocations:
+
+    python benchmarks/bench_chains.py --iterations 500 > bench_output.txt
+"""
+import argparse
+import os
+import sys
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'patterns-app'))
+
+import graphrag
+from ann_index import Neo4jVectorMirror
+from chain_run import ChainRun
+from connections import connection_manager, Neo4jCredentials
+from context_encoder import ContextEncoder
+from cypher_cache import CypherCache
+from embedding_cache import CachedEmbeddings, EmbeddingCache
+from offline import (StageRecorder, FakeDriver, FakeGraph, SyntheticCatalog, StubEmbeddings, StubLLM,
+                     run_benchmark, print_report)
+
+CREDENTIALS = Neo4jCredentials(uri='bolt://bench', password='bench', username='neo4j', database='neo4j')
+
+GRAPH_RETRIEVAL_QUERY = """
+WITH node AS product, score
+OPTIONAL MATCH (product)<-[:VARIANT_OF]-(:Article)<-[:CONTAINS]-(:Order)<-[:ORDERED]-(customer:Customer)
+RETURN product.text AS text, score, product {.*, customerData: customer {.*}} AS metadata
+"""
+
+PREFILTER_QUERY = """
+MATCH (customer:Customer {customerId: $customerId})-[:ORDERED]->(:Order)-[:CONTAINS]->(:Article)
+    -[:VARIANT_OF]->(:Product)<-[:VARIANT_OF]-(:Article)<-[:CONTAINS]-(:Order)<-[:ORDERED]-(:Customer)
+    -[:ORDERED]->(:Order)-[:CONTAINS]->(:Article)-[:VARIANT_OF]->(node:Product)
+WITH DISTINCT node, {customerData: customer {.*}} AS prefilterMetadata"""
+
+PROMPTS = [f'Recommend a {colour} {item} for a customer who bought {n} items this winter'
+           for colour in ['black', 'white', 'blue', 'red'] for item in ['sweater', 'dress', 'pair of shoes']
+           for n in range(5)]
+
+
+@dataclass(frozen=True)
+class TimedContextEncoder(ContextEncoder):
+    recorder: Any = None
+
+    def encode(self, records: List[Dict]) -> str:
+        with self.recorder.stage('format'):
+            return super().encode(records)
+
+
+class FakeNeo4jVector:
+    """The parts of `Neo4jVector` the chains use."""
+
+    def __init__(self, embedding, graph, index_name: str, retrieval_query: str = ''):
+        self.embedding = embedding
+        self.graph = graph
+        self.index_name = index_name
+        self.retrieval_query = retrieval_query or ''
+        self.text_node_property = 'text'
+        self.embedding_node_property = 'textEmbedding'
+
+    @classmethod
+    def from_existing_index(cls, embedding, graph, index_name: str, retrieval_query: str = '', **kwargs):
+        return cls(embedding, graph, index_name, retrieval_query)
+
+
+def install_stand_ins(recorder: StageRecorder, catalog: SyntheticCatalog, embedding_cache_size: int) -> FakeDriver:
+    driver = FakeDriver(catalog.respond, recorder)
+    connection_manager.register_graph(CREDENTIALS, FakeGraph(driver))
+    connection_manager.register_driver(CREDENTIALS, driver)
+    embeddings = CachedEmbeddings(StubEmbeddings(recorder), model_name='stub',
+                                  cache=EmbeddingCache(maxsize=embedding_cache_size))
+    graphrag.Neo4jVector = FakeNeo4jVector
+    graphrag.get_embedding_model = lambda: embeddings
+    graphrag.get_llm = lambda: StubLLM(responses=['Here are a few products that match what you asked for.'],
+                                       recorder=recorder)
+    graphrag.get_t2c_llm = lambda: StubLLM(responses=['MATCH (p:Product) RETURN p LIMIT 200'], recorder=recorder)
+    return driver
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--nodes', type=int, default=2000)
+    parser.add_argument('--candidates', type=int, default=500)
+    parser.add_argument('--embedding-cache-size', type=int, default=0,
+                        help='0 measures the embedding miss path on every call')
+    parser.add_argument('--token-budget', type=int, default=None)
+    args = parser.parse_args()
+
+    recorder = StageRecorder()
+    catalog = SyntheticCatalog(n_nodes=args.nodes, n_candidates=args.candidates)
+    driver = install_stand_ins(recorder, catalog, args.embedding_cache_size)
+    encoder = TimedContextEncoder(token_budget=args.token_budget, recorder=recorder)
+    connection = dict(neo4j_uri=CREDENTIALS.uri, neo4j_username=CREDENTIALS.username,
+                      neo4j_password=CREDENTIALS.password, neo4j_database=CREDENTIALS.database)
+    mirror = Neo4jVectorMirror.from_index(driver, 'product_text_embeddings', database=CREDENTIALS.database)
+
+    graphrag_chain = graphrag.GraphRAGChain(vector_index_name='product_text_embeddings',
+                                            prompt_instructions='Answer the question using the context.',
+                                            graph_retrieval_query=GRAPH_RETRIEVAL_QUERY, k=args.k,
+                                            context_encoder=encoder, **connection)
+    mirror_chain = graphrag.GraphRAGChain(vector_index_name='product_text_embeddings',
+                                          prompt_instructions='Answer the question using the context.',
+                                          graph_retrieval_query=GRAPH_RETRIEVAL_QUERY, k=args.k,
+                                          context_encoder=encoder, vector_mirror=mirror, **connection)
+    dynamic_chain = graphrag.DynamicGraphRAGChain(vector_index_name='product_text_embeddings',
+                                                  graph_retrieval_query=GRAPH_RETRIEVAL_QUERY, k=args.k,
+                                                  context_encoder=encoder, **connection)
+    prefilter_chain = graphrag.GraphRAGPreFilterChain(vector_index_name='product_text_embeddings',
+                                                      graph_prefilter_query=PREFILTER_QUERY, k=args.k,
+                                                      context_encoder=encoder, **connection)
+    client_prefilter_chain = graphrag.GraphRAGPreFilterChain(vector_index_name='product_text_embeddings',
+                                                             graph_prefilter_query=PREFILTER_QUERY, k=args.k,
+                                                             scoring_mode='client', context_encoder=encoder,
+                                                             **connection)
+    t2c_chain = graphrag.GraphRAGText2CypherChain(prompt_instructions='Generate Cypher for the question.',
+                                                  properties_to_remove_from_cypher_res=['textEmbedding'],
+                                                  context_encoder=encoder, cypher_cache=CypherCache(),
+                                                  **connection)
+
+    last = dict()
+
+    def prompt_build(chain):
+        def measure() -> Dict[str, float]:
+            start = time.perf_counter()
+            chain.prompt.invoke({'context': last['run'].context, 'input': last['prompt']})
+            return {'prompt': time.perf_counter() - start}
+        return measure
+
+    def call(method, **kwargs):
+        def fn(i: int):
+            last['prompt'], last['run'] = PROMPTS[i % len(PROMPTS)], ChainRun()
+            return method(last['prompt'], run=last['run'], **kwargs)
+        return fn
+
+    def unique_question(i: int):
+        # a new question on every call so each one misses the Cypher cache
+        last['prompt'], last['run'] = f'{PROMPTS[i % len(PROMPTS)]} (run {i})', ChainRun()
+        return t2c_chain.invoke(last['prompt'], run=last['run'])
+
+    customer = {'customerId': 'bench-customer'}
+    benchmarks = [
+        ('GraphRAGChain.invoke', call(graphrag_chain.invoke), prompt_build(graphrag_chain)),
+        ('GraphRAGChain.invoke (vector mirror)', call(mirror_chain.invoke), prompt_build(mirror_chain)),
+        ('GraphRAGChain.batch x8', lambda i: graphrag_chain.batch(PROMPTS[i % 8:i % 8 + 8]), None),
+        ('GraphRAGChain.batch x8 (vector mirror)', lambda i: mirror_chain.batch(PROMPTS[i % 8:i % 8 + 8]), None),
+        ('DynamicGraphRAGChain.invoke', call(dynamic_chain.invoke, query_params=customer),
+         prompt_build(dynamic_chain)),
+        ('GraphRAGPreFilterChain.invoke (database)', call(prefilter_chain.invoke, query_params=customer),
+         prompt_build(prefilter_chain)),
+        ('GraphRAGPreFilterChain.invoke (client)', call(client_prefilter_chain.invoke, query_params=customer),
+         prompt_build(client_prefilter_chain)),
+        ('GraphRAGText2CypherChain.invoke (cache miss)', unique_question, prompt_build(t2c_chain)),
+        ('GraphRAGText2CypherChain.invoke (cache hit)', call(t2c_chain.invoke), prompt_build(t2c_chain)),
+    ]
+    results = [run_benchmark(name, recorder, fn, iterations=args.iterations, after=after)
+               for name, fn, after in benchmarks]
+    print_report(results)
+
+
+if __name__ == '__main__':
+    main()
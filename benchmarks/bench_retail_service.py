@@ -0,0 +1,141 @@
+"""Offline microbenchmarks for `RetailService` in customer-graph.
+
+Run from anywhere:
+
+    python benchmarks/bench_retail_service.py --iterations 500 >> bench_output.txt
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+GRAPHRAG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'customer-graph', 'graphrag')
+sys.path.insert(0, GRAPHRAG_DIR)
+
+import formatters
+import retail_service
+from embedding_cache import embedding_cache
+from offline import (StageRecorder, FakeDriver, FakeAsyncDriver, FakeRecord, SyntheticCatalog, StubEmbeddings,
+                     StubLLM, run_benchmark, print_report)
+
+QUESTIONS = [f'How many orders contained {item} in {colour}?'
+             for item in ['sweaters', 'dresses', 'shoes'] for colour in ['black', 'white', 'blue', 'red']]
+
+
+async def gather(*aws):
+    # asyncio.gather binds to the loop it is called from, so call it from a coroutine the benchmark loop runs
+    return await asyncio.gather(*aws)
+
+
+def install_stand_ins(recorder: StageRecorder, catalog: SyntheticCatalog):
+    driver = FakeDriver(catalog.respond, recorder)
+
+    class GraphDatabase:
+        @staticmethod
+        def driver(uri, auth=None, **kwargs):
+            return driver
+
+    class AsyncGraphDatabase:
+        @staticmethod
+        def driver(uri, auth=None, **kwargs):
+            return FakeAsyncDriver(driver)
+
+    formatter = retail_service.product_record_formatter
+
+    def timed_formatter(record):
+        with recorder.stage('format'):
+            return formatter(record)
+
+    retail_service.GraphDatabase = GraphDatabase
+    retail_service.AsyncGraphDatabase = AsyncGraphDatabase
+    retail_service.HuggingFaceEmbeddings = lambda model_name: StubEmbeddings(recorder)
+    retail_service.HuggingFaceHub = lambda repo_id: StubLLM(responses=['MATCH (p:Product) RETURN p LIMIT 200'],
+                                                            recorder=recorder)
+    retail_service.product_record_formatter = timed_formatter
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--nodes', type=int, default=2000)
+    parser.add_argument('--embedding-cache-size', type=int, default=0,
+                        help='0 measures the embedding miss path on every call')
+    parser.add_argument('--copurchase-index', help='an index built by copurchase_index.py, relative to graphrag')
+    args = parser.parse_args()
+
+    # text_to_cypher_query reads the schema relative to the graphrag directory
+    os.chdir(GRAPHRAG_DIR)
+    embedding_cache.maxsize = args.embedding_cache_size
+    recorder = StageRecorder()
+    catalog = SyntheticCatalog(n_nodes=args.nodes)
+    install_stand_ins(recorder, catalog)
+    service = retail_service.RetailService('bolt://bench', 'neo4j', 'bench')
+    mirror_service = retail_service.RetailService('bolt://bench', 'neo4j', 'bench', use_vector_mirror=True)
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(gather(service.warmup(), mirror_service.warmup()))
+    services = [service, mirror_service]
+
+    def call(method, *arguments):
+        return lambda i: loop.run_until_complete(method(*arguments))
+
+    def unique_question(i: int):
+        # a new question on every call so each one misses the Cypher cache
+        return loop.run_until_complete(service.text_to_cypher_query(f'{QUESTIONS[i % len(QUESTIONS)]} (run {i})'))
+
+    # 20 vector search rows as each formatter receives them: whole nodes with their embedding for
+    # node_record_formatter, nodes projected in the query for product_record_formatter
+    full_records = [FakeRecord({'node': catalog.product_node(i), 'nodeLabels': ['Product'], 'id': catalog.ids[i],
+                                'score': 0.9}) for i in range(20)]
+    projected_records = [FakeRecord({**r.data(), 'node': catalog.project(r['node'], formatters.PRODUCT_PROJECTION)})
+                         for r in full_records]
+
+    def format_with(formatter, records):
+        def fn(i: int):
+            with recorder.stage('format'):
+                return [formatter(r).content for r in records]
+        return fn
+
+    def concurrent_calls(i: int):
+        # the tool calls one agent turn may issue together
+        return loop.run_until_complete(gather(
+            service.get_products_similar_text(QUESTIONS[i % len(QUESTIONS)]),
+            service.get_product_recommendations([100001, 100002, 3]),
+            service.get_product_order_supplier_info([100001, 100002])))
+
+    benchmarks = [
+        ('node_record_formatter x20 (str + literal_eval)', format_with(formatters.node_record_formatter, full_records)),
+        ('product_record_formatter x20 (projected)',
+         format_with(formatters.product_record_formatter, projected_records)),
+        ('get_products_similar_text',
+         lambda i: loop.run_until_complete(service.get_products_similar_text(QUESTIONS[i % len(QUESTIONS)]))),
+        ('get_products_similar_text (vector mirror)',
+         lambda i: loop.run_until_complete(mirror_service.get_products_similar_text(QUESTIONS[i % len(QUESTIONS)]))),
+        ('get_product_recommendations', call(service.get_product_recommendations, [100001, 100002, 3])),
+        ('get_product_order_supplier_info', call(service.get_product_order_supplier_info, [100001, 100002])),
+        ('get_supplier_order_product_info', call(service.get_supplier_order_product_info, [1, 2])),
+        ('text_to_cypher_query (cache miss)', unique_question),
+        ('text_to_cypher_query (cache hit)', call(service.text_to_cypher_query, QUESTIONS[0])),
+        ('3 tool calls via asyncio.gather', concurrent_calls),
+    ]
+    if args.copurchase_index:
+        copurchase_service = retail_service.RetailService('bolt://bench', 'neo4j', 'bench',
+                                                          copurchase_index_path=args.copurchase_index)
+        # the stand-in graph holds the orders the index was built from
+        catalog.orders_fingerprint = copurchase_service._copurchases.fingerprint
+        loop.run_until_complete(copurchase_service.warmup())
+        services.append(copurchase_service)
+        # two real article ids and the product code of the first
+        seeds = copurchase_service._copurchases.article_ids[:2].tolist()
+        seeds.append(seeds[0] // 1000)
+        benchmarks.append(('get_product_recommendations (co-purchase index)',
+                           call(copurchase_service.get_product_recommendations, seeds)))
+    try:
+        results = [run_benchmark(name, recorder, fn, iterations=args.iterations) for name, fn in benchmarks]
+    finally:
+        loop.run_until_complete(gather(*(s.aclose() for s in services)))
+        loop.close()
+    print_report(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,353 @@
+"""Offline stand-ins and a small harness for the chain and service benchmarks.
+
+Nothing here talks to Neo4j or a model endpoint: `FakeDriver` answers queries from a `SyntheticCatalog`,
+`StubEmbeddings` hashes text into a fixed vector, and `StubLLM` replays canned responses. Every stand-in reports
+the time it spends to a `StageRecorder`, so whatever is left of a call's total is the overhead the chains add on
+top of the database and the models.
+"""
+import hashlib
+import statistics
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.fake import FakeListLLM
+
+STAGES = ['embed', 'query', 'format', 'prompt', 'llm', 'overhead', 'total']
+
+
+class StageRecorder:
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self._current: Optional[Dict[str, float]] = None
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self._current is not None:
+                self._current[name] += time.perf_counter() - start
+
+    def begin(self):
+        self._current = defaultdict(float)
+
+    def end(self, total: float, extra: Dict[str, float] = None):
+        current, self._current = self._current, None
+        current.update(extra or {})
+        measured = sum(current[s] for s in ('embed', 'query', 'format', 'llm'))
+        current['overhead'] = max(total - measured, 0.0)
+        current['total'] = total
+        for name, value in current.items():
+            self.samples[name].append(value)
+
+    def reset(self):
+        self.samples.clear()
+        self._current = None
+
+
+# Neo4j ----------------------------------------------------------------------------------------------------------
+
+class FakeRecord:
+    """Minimal `neo4j.Record`: mapping access, `items()`, `data()`."""
+
+    def __init__(self, data: Dict):
+        self._data = data
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def get(self, key, default=None):
+        return self._data.get(key, default)
+
+    def keys(self):
+        return list(self._data.keys())
+
+    def values(self):
+        return list(self._data.values())
+
+    def items(self):
+        return list(self._data.items())
+
+    def data(self):
+        return dict(self._data)
+
+
+class FakeEagerResult(NamedTuple):
+    records: List[FakeRecord]
+    summary: Any
+    keys: List[str]
+
+
+class FakeResult:
+    def __init__(self, records: List[FakeRecord]):
+        self._records = records
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def data(self):
+        return [r.data() for r in self._records]
+
+    def consume(self):
+        self._records = []
+
+
+class FakeSession:
+    def __init__(self, driver: 'FakeDriver'):
+        self.driver = driver
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def run(self, query, parameters: Dict = None, **kwargs) -> FakeResult:
+        return FakeResult(self.driver.execute_query(query, parameters_=parameters, **kwargs).records)
+
+    def close(self):
+        pass
+
+
+class FakeDriver:
+    """Answers every query with `responder(query_text, params)`, timed as the 'query' stage."""
+
+    def __init__(self, responder: Callable[[str, Dict], List[Dict]], recorder: StageRecorder):
+        self.responder = responder
+        self.recorder = recorder
+        self.queries = 0
+
+    def execute_query(self, query, parameters_: Dict = None, database_: str = None, routing_=None, **kwargs):
+        text = getattr(query, 'text', query)
+        params = {**(parameters_ or {}), **{k: v for k, v in kwargs.items() if not k.endswith('_')}}
+        with self.recorder.stage('query'):
+            self.queries += 1
+            records = [FakeRecord(row) for row in self.responder(text, params)]
+        return FakeEagerResult(records, None, records[0].keys() if records else [])
+
+    def session(self, **kwargs) -> FakeSession:
+        return FakeSession(self)
+
+    def verify_connectivity(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeAsyncDriver:
+    """Awaitable facade over a `FakeDriver`, standing in for an `AsyncGraphDatabase` driver."""
+
+    def __init__(self, driver: FakeDriver):
+        self.driver = driver
+
+    async def execute_query(self, query, parameters_: Dict = None, **kwargs):
+        return self.driver.execute_query(query, parameters_=parameters_, **kwargs)
+
+    async def verify_connectivity(self):
+        pass
+
+    async def close(self):
+        pass
+
+
+class FakeGraph:
+    """Stands in for `langchain_neo4j.Neo4jGraph`, of which the chains only use `query`."""
+
+    def __init__(self, driver: FakeDriver):
+        self._driver = driver
+
+    def query(self, query: str, params: Dict = None) -> List[Dict]:
+        return [r.data() for r in self._driver.execute_query(query, parameters_=params).records]
+
+    def close(self):
+        pass
+
+
+class SyntheticCatalog:
+    """Deterministic product catalog shaped like the H&M and Northwind retrieval results."""
+
+    def __init__(self, n_nodes: int = 2000, n_candidates: int = 500, n_generic_rows: int = 200,
+                 dimension: int = 384, seed: int = 7474):
+        rng = np.random.default_rng(seed)
+        self.n_candidates = n_candidates
+        self.n_generic_rows = n_generic_rows
+        self.ids = [f'4:bench:{i}' for i in range(n_nodes)]
+        vectors = rng.standard_normal((n_nodes, dimension)).astype(np.float32)
+        self.embeddings = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        self.rows = {node_id: row for row, node_id in enumerate(self.ids)}
+        # what the orders fingerprint query returns; a benchmark sets it to match the index it measures
+        self.orders_fingerprint = None
+        self.customer = {'customerId': 'bench-customer', 'age': 34, 'clubMemberStatus': 'ACTIVE',
+                         'recentPurchases': [self.product(i)['prodName'] for i in range(5)]}
+
+    def product(self, i: int) -> Dict:
+        return {'productCode': 100000 + i,
+                'prodName': f'Product {i}',
+                'productTypeName': ['Trousers', 'Sweater', 'Dress', 'Shoes'][i % 4],
+                'colourGroupName': ['Black', 'White', 'Blue'][i % 3],
+                'detailDesc': f'Soft cotton product number {i} with a relaxed fit and ribbed trims.'}
+
+    def retrieval_record(self, i: int, score: float) -> Dict:
+        return {'text': self.product(i)['detailDesc'],
+                'score': score,
+                'metadata': {**self.product(i),
+                             'customerData': self.customer,
+                             'recommendedProducts': [self.product(j) for j in range(3)],
+                             'unused': None}}
+
+    def product_node(self, i: int) -> Dict:
+        return {'productCode': 100000 + i, 'name': f'Product {i}', 'description': self.product(i)['detailDesc'],
+                'textEmbedding': self.embeddings[i].tolist()}
+
+    @staticmethod
+    def project(node: Dict, query: str) -> Dict:
+        """Applies a `node {.`a`, .`b`}` map projection found in `query`, as the database would."""
+        if '.`' not in query:
+            return node
+        return {k: node.get(k) for k in node if f'.`{k}`' in query}
+
+    def respond(self, query: str, params: Dict) -> List[Dict]:
+        k = int(params.get('k', 5))
+        if query.lstrip().upper().startswith('EXPLAIN'):
+            return []
+        if 'SHOW VECTOR INDEXES' in query:
+            return [{'label': 'Product', 'property': 'textEmbedding'}]
+        if 'AS embedding' in query:
+            ids = params.get('ids') or self.ids
+            return [{'id': i, 'embedding': self.embeddings[self.rows[i]].tolist()} for i in ids if i in self.rows]
+        if 'RETURN elementId(node) AS id, prefilterMetadata' in query:
+            return [{'id': self.ids[i], 'prefilterMetadata': {'customerData': self.customer}}
+                    for i in range(self.n_candidates)]
+        if 'embeddings' in params:
+            return [{'promptIndex': p, **self.retrieval_record(i, 1.0 - i / 100)}
+                    for p in range(len(params['embeddings'])) for i in range(k)]
+        if 'queryVector' in params:
+            return [{'node': self.project(self.product_node(i), query), 'nodeLabels': ['Product'],
+                     'elementId': self.ids[i], 'id': self.ids[i], 'score': 1.0 - i / 100}
+                    for i in range(int(params.get('topK', 20)))]
+        if 'hits' in params and 'promptIndex' in query:
+            return [{'promptIndex': p, **self.retrieval_record(self.rows[h['id']], h['score'])}
+                    for p, hits in enumerate(params['hits']) for h in hits]
+        if 'hits' in params and 'nodeLabels' in query:
+            return [{'node': self.project(self.product_node(self.rows[h['id']]), query), 'nodeLabels': ['Product'],
+                     'id': h['id'], 'score': h['score']} for h in params['hits']]
+        if 'hits' in params:
+            return [self.retrieval_record(self.rows[h['id']], h['score']) for h in params['hits']]
+        if 'candidates' in params:
+            return [self.retrieval_record(self.rows[c['id']], c['score']) for c in params['candidates']]
+        if 'embedding' in params:
+            return [self.retrieval_record(i, 1.0 - i / 100) for i in range(k)]
+        if 'AS fingerprint' in query:
+            return [{'fingerprint': self.orders_fingerprint}]
+        if 'AS segments' in query:
+            # the benchmark seeds are product codes and a segment id
+            return [{'articles': False, 'products': True, 'segments': True}]
+        if 'RETURN product' in query:
+            return [{'product': self.project(self.product_node(i), query), 'id': self.ids[i],
+                     'recommendationScore': 20 - i} for i in range(20)]
+        if 'AS supplierInfos' in query:
+            key = 'productCode' if 'productCodes' in params else 'supplierId'
+            return [{key: v, 'totalOrders': 120, 'totalReturns': 7,
+                     'supplierInfos': [{'supplierId': s, 'name': f'Supplier {s}', 'numberOfOrders': 40,
+                                        'numberOfRefunds': 2} for s in range(3)]}
+                    for v in params.get('productCodes', params.get('supplierIds', []))]
+        return [{'p': self.product_node(i)} for i in range(self.n_generic_rows)]
+
+
+# Models ---------------------------------------------------------------------------------------------------------
+
+class StubEmbeddings(Embeddings):
+    """Deterministic embeddings: a unit vector seeded from the text's hash, timed as the 'embed' stage."""
+
+    def __init__(self, recorder: StageRecorder, dimension: int = 384):
+        self.recorder = recorder
+        self.dimension = dimension
+
+    def _vector(self, text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.sha1(text.encode('utf-8')).digest()[:8], 'little')
+        vector = np.random.default_rng(seed).standard_normal(self.dimension).astype(np.float32)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        with self.recorder.stage('embed'):
+            return self._vector(text)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with self.recorder.stage('embed'):
+            return [self._vector(t) for t in texts]
+
+
+class StubLLM(FakeListLLM):
+    """Replays `responses` in order, timed as the 'llm' stage."""
+    recorder: Any = None
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> str:
+        with self.recorder.stage('llm'):
+            return super()._call(prompt, stop=stop, run_manager=run_manager, **kwargs)
+
+
+# Harness --------------------------------------------------------------------------------------------------------
+
+class BenchmarkResult(NamedTuple):
+    name: str
+    iterations: int
+    stages: Dict[str, List[float]]
+    allocated_bytes: float
+    peak_bytes: float
+
+
+def run_benchmark(name: str, recorder: StageRecorder, fn: Callable[[int], Any], iterations: int = 200,
+                  warmup: int = 10, after: Callable[[], Dict[str, float]] = None) -> BenchmarkResult:
+    """Times `fn(i)` per stage over `iterations` calls, then repeats a shorter pass under tracemalloc.
+
+    `after` may return extra stage timings measured outside the call (e.g. prompt building).
+    """
+    for i in range(warmup):
+        fn(i)
+    recorder.reset()
+    for i in range(iterations):
+        recorder.begin()
+        start = time.perf_counter()
+        fn(i)
+        total = time.perf_counter() - start
+        recorder.end(total, after() if after is not None else None)
+    stages = {k: list(v) for k, v in recorder.samples.items()}
+
+    allocation_iterations = max(iterations // 10, 1)
+    allocated, peak = [], []
+    tracemalloc.start()
+    try:
+        for i in range(allocation_iterations):
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            fn(i)
+            current, high = tracemalloc.get_traced_memory()
+            allocated.append(current - before)
+            peak.append(high - before)
+    finally:
+        tracemalloc.stop()
+    return BenchmarkResult(name, iterations, stages, statistics.mean(allocated), statistics.mean(peak))
+
+
+def _ms(values: List[float], q: float) -> str:
+    if not values:
+        return '-'
+    return f'{np.percentile(values, q) * 1000:.3f}'
+
+
+def print_report(results: List[BenchmarkResult]):
+    """Prints p50/p95 milliseconds per stage and the mean retained and peak allocations per call."""
+    header = f"{'benchmark':<44}" + ''.join(f'{s + " p50/p95":>22}' for s in STAGES) + \
+             f"{'retained KiB':>14}{'peak KiB':>10}"
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        cells = ''.join(f'{_ms(r.stages.get(s, []), 50) + "/" + _ms(r.stages.get(s, []), 95):>22}' for s in STAGES)
+        print(f'{r.name:<44}{cells}{r.allocated_bytes / 1024:>14.1f}{r.peak_bytes / 1024:>10.1f}')
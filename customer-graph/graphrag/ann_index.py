@@ -0,0 +1 @@
+../../shared/ann_index.py
\ No newline at end of file
@@ -1,6 +1,7 @@
 import streamlit as st
 import os
 import asyncio
+import atexit
 
 from dotenv import load_dotenv
 from semantic_kernel import Kernel
@@ -22,19 +23,30 @@ load_dotenv('../.env')
 NEO4J_URI = os.getenv('NEO4J_URI')
 NEO4J_USER = os.getenv('NEO4J_USERNAME', 'neo4j')
 NEO4J_PASSWORD = os.getenv('NEO4J_PASSWORD')
+COPURCHASE_INDEX_PATH = os.getenv('COPURCHASE_INDEX_PATH')
 service_id = "contract_search"
 
 # Streamlit app configuration
 st.set_page_config(layout="wide")
 st.title("📄 Agent for Retail Analytics")
 
+
+@st.cache_resource
+def get_retail_service() -> RetailService:
+    # One service per process: every session shares its event loop thread and Neo4j driver
+    service = RetailService(NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD, copurchase_index_path=COPURCHASE_INDEX_PATH)
+    asyncio.run(service.warmup())
+    atexit.register(service.close)
+    return service
+
+
 # Initialize Kernel, Chat History, and Settings in Session State
 if 'semantic_kernel' not in st.session_state:
     # Initialize the kernel
     kernel = Kernel()
 
     # Add the Contract Search plugin to the kernel
-    retail_analytics_neo4j = RetailService(NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD)
+    retail_analytics_neo4j = get_retail_service()
     kernel.add_plugin(RetailPlugin(retail_service=retail_analytics_neo4j), plugin_name="retail_analytics")
 
     # Add the Hugging Face LLM service to the Kernel
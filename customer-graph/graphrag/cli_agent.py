@@ -21,13 +21,15 @@ load_dotenv()
 NEO4J_URI=os.getenv('NEO4J_URI')
 NEO4J_USER=os.getenv('NEO4J_USERNAME')
 NEO4J_PASSWORD=os.getenv('NEO4J_PASSWORD')
+COPURCHASE_INDEX_PATH=os.getenv('COPURCHASE_INDEX_PATH')
 service_id = "retail_search"
 
 # Initialize the kernel
 kernel = Kernel()
 
 # Add the Contract Search plugin to the kernel
-retail_analysis_neo4j = RetailService(NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD)
+retail_analysis_neo4j = RetailService(NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD,
+                                      copurchase_index_path=COPURCHASE_INDEX_PATH)
 kernel.add_plugin(RetailPlugin(retail_service=retail_analysis_neo4j), plugin_name="retail_analysis")
 
 hf_llm = HuggingFaceHub(repo_id="google/flan-t5-base")
@@ -38,6 +40,7 @@ kernel.hf_llm = hf_llm  # Attach for downstream use
 history = ChatHistory()
 
 async def basic_agent() :
+    await retail_analysis_neo4j.warmup()
     userInput = None
     while True:
         # Collect user input
@@ -61,6 +64,8 @@ async def basic_agent() :
         # Add the message from the agent to the chat history
         history.add_message(result)
 
+    await retail_analysis_neo4j.aclose()
+
 if __name__ == "__main__":
     
     asyncio.run(basic_agent())
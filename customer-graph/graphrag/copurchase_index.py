@@ -0,0 +1,186 @@
+"""Offline co-purchase index for product recommendations.
+
+Scores products the way `RetailService.get_product_recommendations` does in Neo4j: by the number of
+`(seed)<-[:CONTAINS]-()<-[:ORDERED]-(:Customer)-[:ORDERED]->()-[:CONTAINS]->(recArticle)` paths, i.e. pairs of
+distinct orders of the same customer, reaching each product's articles. Only the top N products per seed article
+and per seed product are kept.
+
+The index records the [order count, max orderId] of the orders it was built from, so callers can tell when the
+graph has moved on. Build from the csv files the graph is loaded from, and rebuild whenever they change:
+
+    python copurchase_index.py --data-dir ../data --output copurchase_index --top-n 100
+"""
+import argparse
+import csv
+import json
+import os
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from customer_schema import Product
+
+# csv column -> Product field
+PRODUCT_COLUMNS = {'prodName': 'name', 'detailDesc': 'description'}
+
+
+def _read_csv(path: str) -> List[Dict]:
+    with open(path, newline='', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+
+def _top_n_rows(matrix, n: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """CSR arrays (indptr, indices, scores) of the n highest scoring columns of each row, best first."""
+    matrix = matrix.tocsr()
+    indptr, indices, scores = [0], [], []
+    for row in range(matrix.shape[0]):
+        start, end = matrix.indptr[row], matrix.indptr[row + 1]
+        cols, vals = matrix.indices[start:end], matrix.data[start:end]
+        keep = np.argpartition(-vals, n - 1)[:n] if len(vals) > n else np.arange(len(vals))
+        keep = keep[np.argsort(-vals[keep], kind='stable')]
+        indices.append(cols[keep])
+        scores.append(vals[keep])
+        indptr.append(indptr[-1] + len(keep))
+    return (np.asarray(indptr, dtype=np.int64),
+            np.concatenate(indices).astype(np.int32) if indices else np.zeros(0, dtype=np.int32),
+            np.concatenate(scores).astype(np.float32) if scores else np.zeros(0, dtype=np.float32))
+
+
+class CopurchaseIndex:
+    """Top-N co-purchase scores from every article and every product to products, held as CSR arrays.
+
+    `recommend` only answers when it knows every seed id, so callers can fall back to the graph for anything else
+    (segment ids, items added after the build).
+    """
+
+    def __init__(self, article_ids: np.ndarray, product_codes: np.ndarray, products: List[Product],
+                 article_rows: Tuple[np.ndarray, np.ndarray, np.ndarray],
+                 product_rows: Tuple[np.ndarray, np.ndarray, np.ndarray], fingerprint: Optional[List[int]] = None):
+        # article_ids and product_codes are sorted, so ids are looked up with searchsorted
+        self.article_ids = article_ids
+        self.product_codes = product_codes
+        self.products = products
+        self.article_rows = article_rows
+        self.product_rows = product_rows
+        self.fingerprint = fingerprint
+
+    def __len__(self):
+        return len(self.product_codes)
+
+    @classmethod
+    def build(cls, data_dir: str, top_n: int = 100) -> 'CopurchaseIndex':
+        from scipy import sparse
+
+        articles = _read_csv(os.path.join(data_dir, 'articles.csv'))
+        product_rows = _read_csv(os.path.join(data_dir, 'products.csv'))
+        order_lines = _read_csv(os.path.join(data_dir, 'order-details.csv'))
+
+        article_codes = {int(a['articleId']): int(a['productCode']) for a in articles}
+        article_ids = np.fromiter(sorted(article_codes), dtype=np.int64, count=len(article_codes))
+        product_codes = np.unique(np.fromiter(article_codes.values(), dtype=np.int64, count=len(article_codes)))
+        article_product = np.searchsorted(product_codes, [article_codes[a] for a in article_ids.tolist()])
+
+        fields = {int(p['productCode']): {PRODUCT_COLUMNS[k]: v for k, v in p.items() if k in PRODUCT_COLUMNS and v}
+                  for p in product_rows}
+        products = [{**fields.get(code, dict()), 'productCode': code} for code in product_codes.tolist()]
+
+        order_ids = {int(l['orderId']) for l in order_lines}
+        fingerprint = [len(order_ids), max(order_ids, default=-1)]
+
+        lines = [l for l in order_lines if int(l['articleId']) in article_codes]
+        orders = {order_id: row for row, order_id in enumerate(dict.fromkeys(l['orderId'] for l in lines))}
+        customers = {customer_id: row for row, customer_id in enumerate(dict.fromkeys(l['customerId'] for l in lines))}
+        order_customer = {l['orderId']: l['customerId'] for l in lines}
+
+        # orders x articles, 1 where the order contains the article
+        contains = sparse.csr_matrix((np.ones(len(lines)),
+                                      ([orders[l['orderId']] for l in lines],
+                                       np.searchsorted(article_ids, [int(l['articleId']) for l in lines]))),
+                                     shape=(len(orders), len(article_ids)))
+        contains.data[:] = 1
+        # customers x orders
+        ordered = sparse.csr_matrix((np.ones(len(orders)),
+                                     ([customers[order_customer[o]] for o in orders], list(orders.values()))),
+                                    shape=(len(customers), len(orders)))
+        # customers x articles, the number of the customer's orders containing the article
+        purchases = ordered @ contains
+        # article x article paths through two orders of one customer, less those through the same order twice
+        copurchases = (purchases.T @ purchases - contains.T @ contains).tocsr()
+        copurchases.eliminate_zeros()
+        # articles x products
+        variant_of = sparse.csr_matrix((np.ones(len(article_ids)), (np.arange(len(article_ids)), article_product)),
+                                       shape=(len(article_ids), len(product_codes)))
+        article_scores = copurchases @ variant_of
+        product_scores = variant_of.T @ article_scores
+        return cls(article_ids, product_codes, products, _top_n_rows(article_scores, top_n),
+                   _top_n_rows(product_scores, top_n), fingerprint=fingerprint)
+
+    @staticmethod
+    def _find(sorted_ids: np.ndarray, item_id: int) -> Optional[int]:
+        row = int(np.searchsorted(sorted_ids, item_id))
+        return row if row < len(sorted_ids) and sorted_ids[row] == item_id else None
+
+    def recommend(self, item_ids: List[int], top_k: int = 20) -> Optional[List[Product]]:
+        """Products ordered by co-purchase score summed over the seeds, or None if any seed is not in the index."""
+        scores = defaultdict(float)
+        for item_id in item_ids:
+            matched = False
+            for sorted_ids, (indptr, indices, values) in ((self.article_ids, self.article_rows),
+                                                          (self.product_codes, self.product_rows)):
+                row = self._find(sorted_ids, item_id)
+                if row is None:
+                    continue
+                matched = True
+                start, end = indptr[row], indptr[row + 1]
+                for col, score in zip(indices[start:end].tolist(), values[start:end].tolist()):
+                    scores[col] += score
+            if not matched:
+                return None
+        return [dict(self.products[col]) for col in sorted(scores, key=scores.get, reverse=True)[:top_k]]
+
+    def save(self, path: str):
+        """Writes the index to `path` (a directory)."""
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, 'article_ids.npy'), self.article_ids)
+        np.save(os.path.join(path, 'product_codes.npy'), self.product_codes)
+        for prefix, rows in (('article', self.article_rows), ('product', self.product_rows)):
+            for name, array in zip(('indptr', 'indices', 'scores'), rows):
+                np.save(os.path.join(path, f'{prefix}_{name}.npy'), array)
+        with open(os.path.join(path, 'products.json'), 'w', encoding='utf-8') as f:
+            json.dump(self.products, f)
+        with open(os.path.join(path, 'fingerprint.json'), 'w', encoding='utf-8') as f:
+            json.dump(self.fingerprint, f)
+
+    @classmethod
+    def load(cls, path: str) -> 'CopurchaseIndex':
+        def arrays(prefix: str):
+            return tuple(np.load(os.path.join(path, f'{prefix}_{name}.npy'), mmap_mode='r')
+                         for name in ('indptr', 'indices', 'scores'))
+
+        with open(os.path.join(path, 'products.json'), encoding='utf-8') as f:
+            products = json.load(f)
+        fingerprint = None
+        if os.path.exists(os.path.join(path, 'fingerprint.json')):
+            with open(os.path.join(path, 'fingerprint.json'), encoding='utf-8') as f:
+                fingerprint = json.load(f)
+        return cls(np.load(os.path.join(path, 'article_ids.npy')), np.load(os.path.join(path, 'product_codes.npy')),
+                   products, arrays('article'), arrays('product'), fingerprint=fingerprint)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data-dir', default=os.path.join('..', 'data'))
+    parser.add_argument('--output', default='copurchase_index')
+    parser.add_argument('--top-n', type=int, default=100)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = CopurchaseIndex.build(args.data_dir, top_n=args.top_n)
+    index.save(args.output)
+    print(f'Built co-purchase index of {len(index)} products in {time.perf_counter() - start:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1 @@
+../../shared/cypher_cache.py
\ No newline at end of file
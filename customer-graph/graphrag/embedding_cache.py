@@ -0,0 +1 @@
+../../shared/embedding_cache.py
\ No newline at end of file
@@ -1,6 +1,13 @@
 from neo4j_graphrag.types import RetrieverResultItem
 import ast
+from typing import get_origin, get_type_hints
 from neo4j import Record
+from customer_schema import Product
+
+# Product fields stored as node properties; list-typed fields are relationships
+PRODUCT_PROPERTIES = tuple(k for k, t in get_type_hints(Product).items() if get_origin(t) is not list)
+# Cypher map projection of PRODUCT_PROPERTIES, e.g. node {PRODUCT_PROJECTION}, which leaves out vector properties
+PRODUCT_PROJECTION = '{' + ', '.join(f'.`{k}`' for k in PRODUCT_PROPERTIES) + '}'
 
 
 def node_record_formatter(record: Record) -> RetrieverResultItem:
@@ -14,6 +21,19 @@ def node_record_formatter(record: Record) -> RetrieverResultItem:
     return RetrieverResultItem(content=node_as_dict, metadata=metadata)
 
 
+def product_record_formatter(record: Record) -> RetrieverResultItem:
+    """Same metadata as `node_record_formatter`, but reads the `Product` fields straight off the node (a Node or a
+    projected map) without a string round trip. Missing and null properties are left out."""
+    metadata = {"score": record.get("score"), "nodeLabels": record.get("nodeLabels"), "id": record.get("id")}
+    node = record.get("node")
+    content = dict()
+    for k in PRODUCT_PROPERTIES:
+        value = node.get(k)
+        if value is not None:
+            content[k] = value
+    return RetrieverResultItem(content=content, metadata=metadata)
+
+
 def my_vector_search_excerpt_record_formatter(record: Record) -> RetrieverResultItem:
     #set up metadata    
     metadata = {"contract_id": record.get("contract_id"), "nodeLabels": ['Excerpt', 'Agreement', 'ContractClause']}
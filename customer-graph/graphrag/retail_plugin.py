@@ -23,7 +23,7 @@ class RetailPlugin:
         return await self.retail_service.get_product_recommendations(segment_item_ids_or_codes=segment_item_ids_or_codes)
     @kernel_function
     async def create_customer_segments(self) -> Annotated[List[CustomerSegment], "A list of customer segments"]:
-        """Creates Customer segments based on user purchase behavior.  Generally needs to be done just once per session"""
+        """Creates Customer segments based on user purchase behavior. Segments are reused until orders change, so repeated calls are cheap"""
         return await self.retail_service.run_customer_segmentation()
 
     @kernel_function
@@ -1,97 +1,366 @@
 import asyncio
+import functools
 import logging
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future
 
-from neo4j import GraphDatabase
-from typing import List
+from neo4j import AsyncDriver, AsyncGraphDatabase, GraphDatabase
+from typing import List, Optional
 from customer_schema import Product, CustomerSegment, Supplier, ProductInfo, SupplierInfo
-from neo4j_graphrag.retrievers import VectorCypherRetriever, Text2CypherRetriever, VectorRetriever
 from langchain_community.embeddings import HuggingFaceEmbeddings
-from formatters import node_record_formatter
+from formatters import product_record_formatter, PRODUCT_PROJECTION
+from embedding_cache import CachedEmbeddings
+from ann_index import Neo4jVectorMirror
+from copurchase_index import CopurchaseIndex
+from cypher_cache import CypherCache, get_cypher_cache, clean_generated_cypher, avalidate_cypher
 from langchain_community.llms import HuggingFaceHub
 
+TEXT_TO_CYPHER_PROMPT = """
+Task: Generate a Cypher statement for querying a Neo4j graph database from a user input. 
+- Do not include triple backticks ``` or ```cypher or any additional text except the generated Cypher statement in your response.
+- Do not use any properties or relationships not included in the schema.
+
+Schema:
+{schema}
+
+Examples (optional):
+{examples}
+
+Input:
+{query_text}
+
+Cypher query:
+"""
+
+VECTOR_INDEX_QUERY = """
+SHOW VECTOR INDEXES YIELD name, labelsOrTypes, properties
+WHERE name = $name
+RETURN labelsOrTypes[0] AS label, properties[0] AS property
+"""
+
+# same columns as neo4j_graphrag's VectorRetriever, with the node projected to the Product fields
+VECTOR_SEARCH_QUERY = f"""
+CALL db.index.vector.queryNodes($indexName, $topK, $queryVector) YIELD node, score
+RETURN node {PRODUCT_PROJECTION} AS node, labels(node) AS nodeLabels, elementId(node) AS elementId,
+    elementId(node) AS id, score
+"""
+
+MIRROR_SEARCH_QUERY = f"""
+UNWIND $hits AS hit
+MATCH (node) WHERE elementId(node) = hit.id
+RETURN node {PRODUCT_PROJECTION} AS node, labels(node) AS nodeLabels, elementId(node) AS id, hit.score AS score
+ORDER BY score DESC
+"""
+
+# Recommendation traversals, one per kind of seed id, each starting from an index seek on its seed. Products are
+# scored by the number of co-purchase paths reaching them from the seed.
+ARTICLE_RECOMMENDATIONS_QUERY = f"""
+MATCH (seed:Article)<-[:CONTAINS]-()<-[:ORDERED]-(:Customer)-[:ORDERED]->()-[:CONTAINS]->(recArticle:Article)
+    -[:VARIANT_OF]->(product:Product)
+WHERE seed.articleId IN $itemIds
+WITH count(recArticle) AS recommendationScore, product
+ORDER BY recommendationScore DESC LIMIT $limit
+RETURN product {PRODUCT_PROJECTION} AS product, elementId(product) AS id, recommendationScore
+"""
+
+PRODUCT_RECOMMENDATIONS_QUERY = f"""
+MATCH (seed:Product)<-[:VARIANT_OF]-(:Article)<-[:CONTAINS]-()<-[:ORDERED]-(:Customer)-[:ORDERED]->()-[:CONTAINS]->
+    (recArticle:Article)-[:VARIANT_OF]->(product:Product)
+WHERE seed.productCode IN $itemIds
+WITH count(recArticle) AS recommendationScore, product
+ORDER BY recommendationScore DESC LIMIT $limit
+RETURN product {PRODUCT_PROJECTION} AS product, elementId(product) AS id, recommendationScore
+"""
+
+SEGMENT_RECOMMENDATIONS_QUERY = f"""
+MATCH (seed:Customer)-[:ORDERED]->()-[:CONTAINS]->()-[:VARIANT_OF]->(:Product)<-[:VARIANT_OF]-(:Article)
+    <-[:CONTAINS]-()<-[:ORDERED]-(:Customer)-[:ORDERED]->()-[:CONTAINS]->(recArticle:Article)
+    -[:VARIANT_OF]->(product:Product)
+WHERE seed.segmentId IN $itemIds
+WITH count(recArticle) AS recommendationScore, product
+ORDER BY recommendationScore DESC LIMIT $limit
+RETURN product {PRODUCT_PROJECTION} AS product, elementId(product) AS id, recommendationScore
+"""
+
+SEGMENT_ID_INDEX_QUERY = "CREATE INDEX customer_segment_id IF NOT EXISTS FOR (c:Customer) ON (c.segmentId)"
+
+RECOMMENDATION_QUERIES = {"articles": ARTICLE_RECOMMENDATIONS_QUERY, "products": PRODUCT_RECOMMENDATIONS_QUERY,
+                          "segments": SEGMENT_RECOMMENDATIONS_QUERY}
+
+# Which kinds the seed ids are, with one index seek per kind, so only the matching traversals run
+RECOMMENDATION_SEED_KINDS_QUERY = """
+RETURN EXISTS { MATCH (a:Article) WHERE a.articleId IN $itemIds } AS articles,
+    EXISTS { MATCH (p:Product) WHERE p.productCode IN $itemIds } AS products,
+    EXISTS { MATCH (c:Customer) WHERE c.segmentId IN $itemIds } AS segments
+"""
+
+# The orders the offline co-purchase index is checked against, as [order count, max order id]
+ORDERS_FINGERPRINT_QUERY = """
+RETURN [COUNT { (:Order) },
+        coalesce(head(COLLECT { MATCH (o:Order) WHERE o.orderId IS NOT NULL
+                                RETURN o.orderId ORDER BY o.orderId DESC LIMIT 1 }), -1)] AS fingerprint
+"""
+
+# The orders segmentation depends on, summarized as [order count, order line count, max order id]. Both counts
+# come from the count store and the max id from the index backing the orderId_Order_uniq constraint, so the
+# fingerprint stays cheap as the graph grows.
+SEGMENTATION_FINGERPRINT_QUERY = """
+OPTIONAL MATCH (run:CustomerSegmentation {graphName: $graphName})
+RETURN [COUNT { (:Order) }, COUNT { ()-[:CONTAINS]->() },
+        coalesce(head(COLLECT { MATCH (o:Order) WHERE o.orderId IS NOT NULL
+                                RETURN o.orderId ORDER BY o.orderId DESC LIMIT 1 }), -1)] AS fingerprint,
+    run.fingerprint AS segmentedFingerprint, run.segmentIds AS segmentIds,
+    run.numbersOfCustomers AS numbersOfCustomers
+"""
+
+# Swaps the segment ids of a finished run in, and stores their summaries, in one transaction so the stored
+# summaries always describe the segmentIds readers see. Customers the run did not segment lose their segmentId.
+SEGMENT_SWAP_QUERY = """
+MATCH (c:Customer) WHERE c.segmentId IS NOT NULL OR c.nextSegmentId IS NOT NULL
+SET c.segmentId = c.nextSegmentId
+REMOVE c.nextSegmentId
+WITH c.segmentId AS segmentId, count(c) AS numberOfCustomers
+ORDER BY numberOfCustomers DESC
+WITH [s IN collect({segmentId: segmentId, numberOfCustomers: numberOfCustomers}) WHERE s.segmentId IS NOT NULL]
+    AS segments
+MERGE (run:CustomerSegmentation {graphName: $graphName})
+SET run.fingerprint = $fingerprint,
+    run.segmentIds = [s IN segments | s.segmentId],
+    run.numbersOfCustomers = [s IN segments | s.numberOfCustomers],
+    run.refreshedAt = datetime()
+RETURN run.segmentIds AS segmentIds, run.numbersOfCustomers AS numbersOfCustomers
+"""
+
+SEGMENTATION_GRAPH_NAME = "co-purchase-123"
+VECTOR_INDEX_NAME = "product_text_embeddings"
+TEXT_TO_CYPHER_SCHEMA_PATH = "../ontos/text-to-cypher.json"
+
+
+def _on_service_loop(method):
+    """Runs a `RetailService` coroutine method on the service's own event loop, where its async driver lives,
+    whichever loop awaits it."""
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        if asyncio.get_running_loop() is self._loop:
+            return await method(self, *args, **kwargs)
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(method(self, *args, **kwargs), self._loop))
+
+    return wrapper
+
 
 class RetailService:
-    def __init__(self, uri, user, pwd):
-        driver = GraphDatabase.driver(uri, auth=(user, pwd))
-        self._driver = driver
-        self._embedder = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+    """Retail tools for the agent, running every query on the async Neo4j driver so tool calls overlap.
+
+    An async driver is bound to the event loop it was created on, so the service runs its own event loop on a
+    daemon thread with a single driver and connection pool, and the tool methods hop onto it from whichever loop
+    calls them. Share one service per process and call `aclose` (or `close`) once at shutdown.
+
+    The vector index is checked and the text2cypher schema loaded once, at construction, so a missing index fails
+    at startup rather than on the first tool call. `warmup` additionally primes the embedding model, the driver
+    pool and the query plans.
+    """
+
+    def __init__(self, uri, user, pwd, use_vector_mirror: bool = False, vector_mirror_path: Optional[str] = None,
+                 cypher_cache_path: Optional[str] = None, copurchase_index_path: Optional[str] = None,
+                 copurchase_check_interval: float = 60.0,
+                 segmentation_concurrency: int = 1):
+        self._auth = (user, pwd)
+        self._embedder = CachedEmbeddings(HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2"))
         # Create LLM object. Used to generate the CYPHER queries
         self._llm = HuggingFaceHub(repo_id="google/flan-t5-base")
+        # Check the vector index exists once, on a short-lived sync driver
+        startup_driver = GraphDatabase.driver(uri, auth=self._auth)
+        try:
+            res = startup_driver.execute_query(VECTOR_INDEX_QUERY, name=VECTOR_INDEX_NAME)
+            if not res.records:
+                raise ValueError(f"Vector index {VECTOR_INDEX_NAME!r} does not exist")
+            # Optional local mirror of the product vector index, searched in-process instead of
+            # db.index.vector.queryNodes. It is built or loaded here and not refreshed afterwards.
+            self._vector_mirror = Neo4jVectorMirror.from_index(startup_driver, VECTOR_INDEX_NAME,
+                                                               path=vector_mirror_path) if use_vector_mirror else None
+            # Segment ids seed recommendations, so they are looked up by index from the first call
+            startup_driver.execute_query(SEGMENT_ID_INDEX_QUERY)
+            # Text2cypher schema, read once
+            with open(TEXT_TO_CYPHER_SCHEMA_PATH, "r", encoding="utf-8") as file:
+                self._t2c_schema = file.read()
+        finally:
+            startup_driver.close()
+        # The service's event loop and its one async driver
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, name="retail-service", daemon=True).start()
+        self._driver: AsyncDriver = AsyncGraphDatabase.driver(uri, auth=self._auth)
+        # Validated text2cypher queries keyed by normalized question, optionally persisted to cypher_cache_path
+        self._cypher_cache = get_cypher_cache(cypher_cache_path)
+        self._cypher_cache_namespace = CypherCache.namespace(TEXT_TO_CYPHER_PROMPT, self._t2c_schema)
+        # Optional offline co-purchase index built by copurchase_index.py, answering recommendations in-process
+        self._copurchases = CopurchaseIndex.load(copurchase_index_path) if copurchase_index_path else None
+        # and only while it was built from the orders in the graph, re-checked at most every check interval
+        self._copurchase_check_interval = copurchase_check_interval
+        self._copurchases_checked_at = float("-inf")
+        self._copurchases_current = False
+        # Leiden threads; only 1 makes segments reproducible across runs with the same randomSeed
+        self._segmentation_concurrency = segmentation_concurrency
+        # A background refresh runs on the service's loop, so it keeps going between tool calls
+        self._segmentation_future: Optional[Future] = None
+        self._segmentation_lock = threading.Lock()
+
+    async def aclose(self):
+        """Closes the driver and stops the service's event loop. The service can't be used afterwards."""
+        if not self._loop.is_running():
+            return
+        await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self._driver.close(), self._loop))
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+    def close(self):
+        """Blocking `aclose`, for callers without a running loop (e.g. `atexit`)."""
+        if self._loop.is_running():
+            asyncio.run_coroutine_threadsafe(self._driver.close(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+
+    @_on_service_loop
+    async def warmup(self):
+        """Runs a dummy encode, opens the driver pool, plans the search statements and checks the
+        co-purchase index, if any, against the orders in the graph.
 
+        The dummy text goes through the underlying model so it does not land in the embedding cache.
+        """
+        await asyncio.to_thread(self._embedder.embeddings.embed_query, "warmup")
+        driver = self._driver
+        await driver.verify_connectivity()
+        await asyncio.gather(*(driver.execute_query('EXPLAIN ' + query)
+                               for query in (VECTOR_SEARCH_QUERY, MIRROR_SEARCH_QUERY,
+                                             RECOMMENDATION_SEED_KINDS_QUERY, *RECOMMENDATION_QUERIES.values())))
+        if self._copurchases is not None:
+            await self._copurchases_match_graph()
+
+    @_on_service_loop
     async def get_products_similar_text(self, prompt_text: str) -> List[Product]:
-        #Set up vector retriever
-        retriever = VectorRetriever(
-            driver=self._driver,
-            index_name="product_text_embeddings",
-            embedder=self._embedder,
-            result_formatter=node_record_formatter
-        )
+        query_vector = await self._embedder.aembed_query(prompt_text)
+        if self._vector_mirror is not None:
+            hits = self._vector_mirror.search(query_vector, 20)
+            res = await self._driver.execute_query(MIRROR_SEARCH_QUERY, hits=hits)
+            return [product_record_formatter(record).content for record in res.records]
 
-        # run vector search query on excerpts and get results containing the relevant agreement and clause
-        retriever_result = retriever.search(query_text=prompt_text, top_k=20)
+        # run vector search query on product text embeddings
+        res = await self._driver.execute_query(VECTOR_SEARCH_QUERY, indexName=VECTOR_INDEX_NAME, topK=20,
+                                               queryVector=query_vector)
 
         #set up List to be returned
         products = []
-        for item in retriever_result.items:
-            p: Product = item.content
+        for record in res.records:
+            p: Product = product_record_formatter(record).content
             products.append(p)
 
         return products
 
-    async def get_product_recommendations(self, segment_item_ids_or_codes: List[int]) -> List[Product]:
-        res = self._driver.execute_query("""
-        //recommend from product codes
-        MATCH (customer:Customer)-[:ORDERED]->()-[:CONTAINS]->()-[:VARIANT_OF]->
-        (interestedInProducts:Product)<-[:VARIANT_OF]-(interestedInArticles:Article)<-[:CONTAINS]-()<-[:ORDERED]
-        -(:Customer)-[:ORDERED]->()-[:CONTAINS]->(recArticle:Article)-[:VARIANT_OF]->(product:Product)
-        WHERE (interestedInArticles.articleId IN $itemIds) 
-            OR (interestedInProducts.productCode IN $itemIds)
-            OR (customer.segmentId IN $itemIds)
-        WITH count(recArticle) AS recommendationScore, product
-        RETURN product ORDER BY recommendationScore DESC LIMIT 20
-        """, itemIds=segment_item_ids_or_codes)
+    @_on_service_loop
+    async def get_product_recommendations(self, segment_item_ids_or_codes: List[int], top_k: int = 20,
+                                          candidates_per_seed_kind: int = 100) -> List[Product]:
+        # the offline index knows article ids and product codes; anything else, or orders added since the index was
+        # built, goes to the graph
+        if self._copurchases is not None and await self._copurchases_match_graph():
+            products = self._copurchases.recommend(segment_item_ids_or_codes, top_k=top_k)
+            if products is not None:
+                return products
+
+        # recommend from article ids, product codes and segment ids, one anchored traversal per kind present among
+        # the seeds, in parallel
+        res = await self._driver.execute_query(RECOMMENDATION_SEED_KINDS_QUERY, itemIds=segment_item_ids_or_codes)
+        kinds = res.records[0]
+        results = await asyncio.gather(*(
+            self._driver.execute_query(query, itemIds=segment_item_ids_or_codes, limit=candidates_per_seed_kind)
+            for kind, query in RECOMMENDATION_QUERIES.items() if kinds[kind]))
+
+        # merge, summing the scores of products reached from seeds of several kinds
+        scores = defaultdict(int)
+        found = dict()
+        for res in results:
+            for item in res.records:
+                scores[item['id']] += item['recommendationScore']
+                found[item['id']] = item['product']
 
         products = []
-        for item in res.records:
-            src = item.data()['product']
-            s: Product = {k: src[k] for k in Product.__annotations__ if k in src}
+        for product_id in sorted(scores, key=scores.get, reverse=True)[:top_k]:
+            s: Product = {k: v for k, v in found[product_id].items() if v is not None}
             products.append(s)
         return products
 
-    async def run_customer_segmentation(self) -> List[CustomerSegment]:
-        # drop gds graph and segmentIds if they exists
-        self._driver.execute_query("CALL gds.graph.drop('co-purchase-123', false) YIELD graphName")
-        self._driver.execute_query("MATCH(n:Customer) REMOVE n.segmentId")
+    async def _copurchases_match_graph(self) -> bool:
+        if time.monotonic() - self._copurchases_checked_at > self._copurchase_check_interval:
+            self._copurchases_checked_at = time.monotonic()
+            res = await self._driver.execute_query(ORDERS_FINGERPRINT_QUERY)
+            current = res.records[0]["fingerprint"] == self._copurchases.fingerprint
+            if self._copurchases_current and not current:
+                logging.warning("Orders changed since the co-purchase index was built, recommending from Neo4j")
+            self._copurchases_current = current
+        return self._copurchases_current
+
+    @_on_service_loop
+    async def run_customer_segmentation(self, wait: bool = False) -> List[CustomerSegment]:
+        """Returns the customer segments, rerunning Leiden only when the orders changed since the last run.
+
+        The segment summaries are stored in the graph together with a fingerprint of the orders they were computed
+        from. When the orders changed, the previous summaries are returned while the segmentation reruns in the
+        background, unless there are none yet or `wait` is set.
+        """
+        res = await self._driver.execute_query(SEGMENTATION_FINGERPRINT_QUERY, graphName=SEGMENTATION_GRAPH_NAME)
+        record = res.records[0]
+        fingerprint = record["fingerprint"]
+        if record["segmentedFingerprint"] == fingerprint:
+            return self._stored_segments(record)
+        with self._segmentation_lock:
+            future = self._segmentation_future
+            if future is None or future.done():
+                future = asyncio.run_coroutine_threadsafe(self._write_segments(fingerprint), self._loop)
+                future.add_done_callback(self._log_segmentation_failure)
+                self._segmentation_future = future
+        if record["segmentedFingerprint"] is None or wait:
+            return await asyncio.wrap_future(future)
+        return self._stored_segments(record)
+
+    @staticmethod
+    def _stored_segments(record) -> List[CustomerSegment]:
+        return [{"segmentId": segment_id, "numberOfCustomers": number_of_customers}
+                for segment_id, number_of_customers in zip(record["segmentIds"], record["numbersOfCustomers"])]
+
+    @staticmethod
+    def _log_segmentation_failure(future: Future):
+        if not future.cancelled() and future.exception() is not None:
+            logging.error("Customer segmentation failed", exc_info=future.exception())
+
+    async def _write_segments(self, fingerprint: List[int]) -> List[CustomerSegment]:
+        # drop the gds graph and any ids left by an interrupted run
+        await self._driver.execute_query("CALL gds.graph.drop($graphName, false) YIELD graphName",
+                                         graphName=SEGMENTATION_GRAPH_NAME)
+        await self._driver.execute_query("MATCH (c:Customer) WHERE c.nextSegmentId IS NOT NULL REMOVE c.nextSegmentId")
         # perform projection
-        self._driver.execute_query("""
+        await self._driver.execute_query("""
         MATCH(c1:Customer)-[:ORDERED]->()-[:CONTAINS]->(a:Article)<-[:CONTAINS]-()<-[:ORDERED]-(c2:Customer)
         WHERE elementId(c1) < elementId(c2)
         WITH c1, c2, count(a) AS coPurchaseCount
-        WITH gds.graph.project('co-purchase-123', c1, c2, { 
-            relationshipProperties: { coPurchaseCount: coPurchaseCount }}, 
+        WITH gds.graph.project($graphName, c1, c2, {
+            relationshipProperties: { coPurchaseCount: coPurchaseCount }},
             {undirectedRelationshipTypes: ['*']}) AS g
-        RETURN g.graphName AS graph, g.nodeCount AS nodes, g.relationshipCount AS rels       
-        """)
-        # run community detection
-        self._driver.execute_query("""
-        CALL gds.leiden.write('co-purchase-123', { relationshipWeightProperty: 'coPurchaseCount', randomSeed: 7474, writeProperty: 'segmentId', concurrency:1})
+        RETURN g.graphName AS graph, g.nodeCount AS nodes, g.relationshipCount AS rels
+        """, graphName=SEGMENTATION_GRAPH_NAME)
+        # run community detection into nextSegmentId, leaving the segmentIds readers see untouched until the swap
+        await self._driver.execute_query("""
+        CALL gds.leiden.write($graphName, { relationshipWeightProperty: 'coPurchaseCount', randomSeed: 7474, writeProperty: 'nextSegmentId', concurrency: $concurrency})
         YIELD communityCount, nodePropertiesWritten
-        RETURN communityCount, nodePropertiesWritten   
-        """)
-        # pull customer segments
-        res = self._driver.execute_query("""
-        MATCH(c:Customer) WHERE c.segmentId IS NOT NULL
-        RETURN c.segmentId AS segmentId, count(c) AS numberOfCustomers ORDER BY numberOfCustomers DESC
-        """)
-
-        segments = []
-        for item in res.records:
-            s: CustomerSegment = item.data()
-            segments.append(s)
-        return segments
+        RETURN communityCount, nodePropertiesWritten
+        """, graphName=SEGMENTATION_GRAPH_NAME, concurrency=self._segmentation_concurrency)
+        await self._driver.execute_query("CALL gds.graph.drop($graphName, false) YIELD graphName",
+                                         graphName=SEGMENTATION_GRAPH_NAME)
+        # swap the new segments in and store them with the fingerprint they were computed from
+        res = await self._driver.execute_query(SEGMENT_SWAP_QUERY, graphName=SEGMENTATION_GRAPH_NAME,
+                                               fingerprint=fingerprint)
+        return self._stored_segments(res.records[0])
 
+    @_on_service_loop
     async def get_product_order_supplier_info(self, product_codes: List[int]) -> list[ProductInfo]:
-        res = self._driver.execute_query("""
+        res = await self._driver.execute_query("""
         MATCH(p:Product)<-[:VARIANT_OF]-(a:Article)-[:SUPPLIED_BY]->(s)
         WHERE p.productCode IN $productCodes
         WITH *,
@@ -109,8 +378,9 @@ class RetailService:
             product_infos.append(product_info)
         return product_infos
 
+    @_on_service_loop
     async def get_supplier_order_product_info(self, supplier_ids: List[int]) -> list[SupplierInfo]:
-        res = self._driver.execute_query("""
+        res = await self._driver.execute_query("""
         MATCH(p:Product)<-[:VARIANT_OF]-(:Article)-[:SUPPLIED_BY]->(s)
         WHERE s.supplierId IN $supplierIds
         WITH DISTINCT p, s,
@@ -128,64 +398,44 @@ class RetailService:
             supplier_infos.append(supplier_info)
         return supplier_infos
 
+    @_on_service_loop
     async def text_to_cypher_query(self, user_question: str) -> str:
-        with open("../ontos/text-to-cypher.json", "r", encoding="utf-8") as file:
-            query_schema = file.read()
-            #print(query_schema)
-
-        # Initialize the retriever
-        retriever = Text2CypherRetriever(
-            driver=self._driver,
-            llm=self._llm,
-            neo4j_schema=query_schema,
-            custom_prompt="""
-Task: Generate a Cypher statement for querying a Neo4j graph database from a user input. 
-- Do not include triple backticks ``` or ```cypher or any additional text except the generated Cypher statement in your response.
-- Do not use any properties or relationships not included in the schema.
-
-Schema:
-{schema}
-
-Examples (optional):
-{examples}
-
-Input:
-{query_text}
-
-Cypher query:
-"""
-        )
-
-        # Generate a Cypher query using the LLM, send it to the Neo4j database, and return the results
-        retriever_result = retriever.search(query_text=user_question)
+        namespace = self._cypher_cache_namespace
+        cypher = self._cypher_cache.get(namespace, user_question)
 
         max_retries = 3
         attempt = 0
         errors = []
+        question = user_question
 
-        while attempt < max_retries:
-            try:
-                # Attempt retrieval
-                retriever_result = retriever.search(query_text=user_question)
-
-                answer = ""
-                logging.info(f"Text2Cypher Query:\n{retriever_result.metadata['cypher']}")
-                for item in retriever_result.items:
-                    content = str(item.content)
-                    if content:
-                        answer += content + '\n\n'
-
-                return answer  # Return the result if successful
+        # Generate Cypher with the LLM and check it with EXPLAIN before running it, feeding errors back on retry
+        while cypher is None and attempt < max_retries:
+            prompt = TEXT_TO_CYPHER_PROMPT.format(schema=self._t2c_schema, examples="", query_text=question)
+            candidate = clean_generated_cypher(await self._llm.ainvoke(prompt))
+            error = await avalidate_cypher(self._driver, candidate)
+            if error is None:
+                cypher = candidate
+                self._cypher_cache.put(namespace, user_question, cypher)
+                break
+            # Capture the error and append it to the question for LLM awareness
+            error_message = f"\nError on last attempt number {attempt + 1}: {error}"
+            errors.append(error_message)
+            question += error_message
+            attempt += 1
 
-            except Exception as e:
-                # Capture the error and append it to user_question
-                error_message = f"\nError on last attempt number {attempt + 1}: {str(e)}"
-                errors.append(error_message)
-                user_question += error_message  # Append errors to user question for LLM awareness
-                attempt += 1
+        if cypher is None:
+            # If all retries fail, return an error message
+            return f"Failed after {max_retries} attempts. Errors: {errors}"
 
-                if attempt < max_retries:
-                    await asyncio.sleep(1)  # Small delay before retrying
+        logging.info(f"Text2Cypher Query:\n{cypher}")
+        try:
+            res = await self._driver.execute_query(cypher)
+        except Exception as e:
+            return f"Failed to run generated query. Error: {str(e)}"
 
-        # If all retries fail, return an error message
-        return f"Failed after {max_retries} attempts. Errors: {errors}"
+        answer = ""
+        for record in res.records:
+            content = str(record)
+            if content:
+                answer += content + '\n\n'
+        return answer
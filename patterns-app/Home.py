@@ -1,8 +1,12 @@
 import streamlit as st
 
 
+from models import warmup
 from ui_utils import render_header_svg
 
+if st.secrets.get('WARMUP_MODELS', False):
+    warmup(include_llms=True)
+
 st.set_page_config(page_icon="images/logo-mark-fullcolor-RGB-transBG.svg", layout="wide")
 
 render_header_svg("images/graphrag.svg", 200)
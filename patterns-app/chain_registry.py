@@ -0,0 +1,60 @@
+import threading
+from typing import Any, Dict, Hashable, Optional, Tuple, Type
+
+
+class _Identity:
+    """Hashes an unhashable argument by identity, keeping it alive so its id is not reused."""
+
+    def __init__(self, value):
+        self.value = value
+
+    def __hash__(self):
+        return id(self.value)
+
+    def __eq__(self, other):
+        return isinstance(other, _Identity) and other.value is self.value
+
+
+def _freeze(value) -> Hashable:
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    try:
+        hash(value)
+    except TypeError:
+        return _Identity(value)
+    return value
+
+
+class ChainRegistry:
+    """Memoizes chains by class and constructor arguments, so each configuration is constructed once.
+
+    Chains keep no per-invocation state (that goes into the `ChainRun` of each call), so one registry can serve
+    every session concurrently.
+    """
+
+    def __init__(self):
+        self._chains: Dict[Tuple, Any] = dict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._chains)
+
+    def get(self, chain_cls: Type, **config):
+        key = (chain_cls, _freeze(config))
+        with self._lock:
+            chain = self._chains.get(key)
+            if chain is None:
+                chain = chain_cls(**config)
+                self._chains[key] = chain
+            return chain
+
+    def invalidate(self, chain_cls: Optional[Type] = None):
+        """Drops every memoized chain, or only those of `chain_cls`."""
+        with self._lock:
+            for key in [k for k in self._chains if chain_cls is None or k[0] is chain_cls]:
+                del self._chains[key]
+
+
+chain_registry = ChainRegistry()
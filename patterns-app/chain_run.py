@@ -0,0 +1,29 @@
+import json
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+
+@dataclass
+class ChainRun:
+    """What one chain invocation used and measured: the context, stage timings, query profile and retrieval query.
+
+    Chains fill it in as they run rather than keeping it on themselves, so a single chain can serve every session
+    concurrently. Pass a `ChainRun` as `run=` to a chain's `invoke`, `ainvoke` or `stream` to read it back.
+    """
+    context: Optional[str] = None
+    timings: Dict[str, float] = field(default_factory=dict)
+    # QueryProfile of the retrieval statements, when the chain runs them under PROFILE
+    profile: Optional[Any] = None
+    retrieval_query: Optional[str] = None
+    retrieval_query_params: Optional[Dict] = None
+    # BoundedResult of a generated Cypher query, including whether it was truncated
+    fetch: Optional[Any] = None
+    query_from_cache: bool = False
+
+    def browser_queries(self) -> Dict[str, str]:
+        params_string = json.dumps(self.retrieval_query_params)
+        params_query = f":params {params_string}"
+        return {'params_query': params_query,
+                'params_url_query': f'/browser?cmd=params&arg={params_string}',
+                'query_body': self.retrieval_query}
+
@@ -0,0 +1,258 @@
+import asyncio
+import atexit
+import hashlib
+import json
+import threading
+from dataclasses import dataclass, asdict
+from typing import Awaitable, Callable, Collection, Dict, List, Optional, Tuple, TypeVar
+
+from langchain_neo4j import Neo4jGraph
+from neo4j import AsyncGraphDatabase, AsyncDriver, Driver, GraphDatabase
+from neo4j.graph import Node, Relationship, Path
+
+T = TypeVar('T')
+
+
+@dataclass(frozen=True)
+class Neo4jCredentials:
+    uri: Optional[str]
+    password: Optional[str]
+    username: Optional[str] = "neo4j"
+    database: Optional[str] = "neo4j"
+
+    @property
+    def key(self) -> Tuple[Optional[str], Optional[str], Optional[str], str]:
+        """Identifies a connection. The password is included as a hash, so that changed credentials open a new
+        connection rather than reusing one authenticated with the old password."""
+        password_hash = hashlib.sha256((self.password or '').encode('utf-8')).hexdigest()
+        return self.uri, self.username, self.database, password_hash
+
+
+@dataclass(frozen=True)
+class PoolConfig:
+    max_connection_pool_size: int = 50
+    connection_acquisition_timeout: float = 60.0
+    liveness_check_timeout: Optional[float] = 30.0
+
+
+@dataclass
+class BoundedResult:
+    rows: List[Dict]
+    bytes: int
+    truncated: bool = False
+    reason: Optional[str] = None
+
+    def describe(self) -> Optional[str]:
+        if not self.truncated:
+            return None
+        return f"result truncated after {len(self.rows)} rows ({self.reason})"
+
+
+def strip_value(value, keys_to_remove: Collection[str] = ()):
+    """Converts a record value the same way `Record.data()` does, skipping `keys_to_remove` at every level."""
+    if isinstance(value, Node):
+        return {k: strip_value(v, keys_to_remove) for k, v in value.items() if k not in keys_to_remove}
+    if isinstance(value, Relationship):
+        return strip_value(value.start_node, keys_to_remove), value.type, strip_value(value.end_node, keys_to_remove)
+    if isinstance(value, Path):
+        path = [strip_value(value.start_node, keys_to_remove)]
+        for relationship in value.relationships:
+            path.append(relationship.type)
+            path.append(strip_value(relationship.end_node, keys_to_remove))
+        return path
+    if isinstance(value, dict):
+        return {k: strip_value(v, keys_to_remove) for k, v in value.items() if k not in keys_to_remove}
+    if isinstance(value, (list, tuple)):
+        return [strip_value(v, keys_to_remove) for v in value]
+    return value
+
+
+class _ResultBounds:
+    def __init__(self, max_rows: Optional[int], max_bytes: Optional[int], keys_to_remove: Collection[str]):
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.keys_to_remove = set(keys_to_remove)
+        self.result = BoundedResult(rows=[], bytes=0)
+
+    def add(self, record) -> bool:
+        """Adds a record and returns False once a bound is hit and the rest of the stream should be discarded."""
+        if self.max_rows is not None and len(self.result.rows) >= self.max_rows:
+            self.result.truncated, self.result.reason = True, f"max_rows={self.max_rows}"
+            return False
+        row = {k: strip_value(v, self.keys_to_remove) for k, v in record.items() if k not in self.keys_to_remove}
+        size = len(json.dumps(row, separators=(',', ':'), default=str))
+        if self.max_bytes is not None and self.result.bytes + size > self.max_bytes:
+            self.result.truncated, self.result.reason = True, f"max_bytes={self.max_bytes}"
+            return False
+        self.result.rows.append(row)
+        self.result.bytes += size
+        return True
+
+    @property
+    def fetch_size(self) -> int:
+        return min(self.max_rows + 1, 1000) if self.max_rows is not None else 1000
+
+
+class Neo4jConnectionManager:
+    """Process-wide registry of Neo4j connections keyed by `Neo4jCredentials.key`.
+
+    Each key maps to a single `Neo4jGraph`, which all chains in the process share and the vector stores are built
+    on via `Neo4jVector(graph=...)`, and to a single driver the manager opens itself, with the same pool settings,
+    for everything that needs the driver API (bounded and profiled queries, Cypher validation, batch jobs).
+
+    Async drivers are bound to the event loop they were created on, so the manager runs its own event loop on a
+    daemon thread and keeps one async driver per key there. Async calls from any loop are handed to it with `arun`,
+    and the drivers live until `close`, `aclose_all` or `close_all` (run at exit) closes them.
+    """
+
+    def __init__(self, pool_config: PoolConfig = PoolConfig()):
+        self.pool_config = pool_config
+        self._graphs: Dict[Tuple, Neo4jGraph] = dict()
+        self._drivers: Dict[Tuple, Driver] = dict()
+        # only touched from self._loop
+        self._async_drivers: Dict[Tuple, AsyncDriver] = dict()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+
+    def configure(self, **kwargs):
+        """Update pool settings. Only applies to connections opened after the call."""
+        self.pool_config = PoolConfig(**{**asdict(self.pool_config), **kwargs})
+
+    def get_graph(self, credentials: Neo4jCredentials) -> Neo4jGraph:
+        graph = self._graphs.get(credentials.key)
+        if graph is not None:
+            return graph
+        with self._lock:
+            graph = self._graphs.get(credentials.key)
+            if graph is None:
+                graph = Neo4jGraph(
+                    url=credentials.uri,
+                    username=credentials.username,
+                    password=credentials.password,
+                    database=credentials.database,
+                    refresh_schema=False,
+                    driver_config=asdict(self.pool_config))
+                self._graphs[credentials.key] = graph
+            return graph
+
+    def register_graph(self, credentials: Neo4jCredentials, graph: Neo4jGraph):
+        """Makes `graph` the shared graph for `credentials`, e.g. a graph configured elsewhere or an offline stand-in."""
+        with self._lock:
+            self._graphs[credentials.key] = graph
+
+    def get_driver(self, credentials: Neo4jCredentials) -> Driver:
+        driver = self._drivers.get(credentials.key)
+        if driver is not None:
+            return driver
+        with self._lock:
+            driver = self._drivers.get(credentials.key)
+            if driver is None:
+                driver = GraphDatabase.driver(credentials.uri,
+                                              auth=(credentials.username, credentials.password),
+                                              **asdict(self.pool_config))
+                self._drivers[credentials.key] = driver
+            return driver
+
+    def register_driver(self, credentials: Neo4jCredentials, driver: Driver):
+        """Makes `driver` the shared driver for `credentials`, e.g. an offline stand-in."""
+        with self._lock:
+            self._drivers[credentials.key] = driver
+
+    def _driver_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name='neo4j-async-drivers', daemon=True).start()
+            return self._loop
+
+    def _async_driver(self, credentials: Neo4jCredentials) -> AsyncDriver:
+        driver = self._async_drivers.get(credentials.key)
+        if driver is None:
+            driver = AsyncGraphDatabase.driver(credentials.uri,
+                                               auth=(credentials.username, credentials.password),
+                                               **asdict(self.pool_config))
+            self._async_drivers[credentials.key] = driver
+        return driver
+
+    async def arun(self, credentials: Neo4jCredentials, fn: Callable[[AsyncDriver], Awaitable[T]]) -> T:
+        """Awaits `fn(driver)` on the manager's event loop with the shared async driver for `credentials`."""
+        async def call():
+            return await fn(self._async_driver(credentials))
+
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(call(), self._driver_loop()))
+
+    async def aquery(self, credentials: Neo4jCredentials, query: str, params: Dict = None) -> List[Dict]:
+        async def run(driver: AsyncDriver) -> List[Dict]:
+            async with driver.session(database=credentials.database) as session:
+                result = await session.run(query, params or {})
+                return await result.data()
+
+        return await self.arun(credentials, run)
+
+    def query_bounded(self, credentials: Neo4jCredentials, query: str, params: Dict = None,
+                      max_rows: Optional[int] = None, max_bytes: Optional[int] = None,
+                      keys_to_remove: Collection[str] = ()) -> BoundedResult:
+        """Streams the result row by row, dropping `keys_to_remove` as each row arrives, and stops reading once
+        `max_rows` rows or `max_bytes` bytes of serialized rows are reached. The rest of the result is discarded
+        when the session closes."""
+        bounds = _ResultBounds(max_rows, max_bytes, keys_to_remove)
+        with self.get_driver(credentials).session(database=credentials.database,
+                                                  fetch_size=bounds.fetch_size) as session:
+            for record in session.run(query, params or {}):
+                if not bounds.add(record):
+                    break
+        return bounds.result
+
+    async def aquery_bounded(self, credentials: Neo4jCredentials, query: str, params: Dict = None,
+                             max_rows: Optional[int] = None, max_bytes: Optional[int] = None,
+                             keys_to_remove: Collection[str] = ()) -> BoundedResult:
+        bounds = _ResultBounds(max_rows, max_bytes, keys_to_remove)
+
+        async def run(driver: AsyncDriver):
+            async with driver.session(database=credentials.database, fetch_size=bounds.fetch_size) as session:
+                result = await session.run(query, params or {})
+                async for record in result:
+                    if not bounds.add(record):
+                        break
+
+        await self.arun(credentials, run)
+        return bounds.result
+
+    def close(self, credentials: Neo4jCredentials):
+        with self._lock:
+            graph = self._graphs.pop(credentials.key, None)
+            driver = self._drivers.pop(credentials.key, None)
+        if graph is not None:
+            graph.close()
+        if driver is not None:
+            driver.close()
+        if self._loop is not None:
+            asyncio.run_coroutine_threadsafe(self._aclose_drivers([credentials.key]), self._loop).result()
+
+    def close_all(self):
+        with self._lock:
+            graphs = list(self._graphs.values())
+            self._graphs.clear()
+            drivers = list(self._drivers.values())
+            self._drivers.clear()
+        for graph in graphs:
+            graph.close()
+        for driver in drivers:
+            driver.close()
+        if self._loop is not None:
+            asyncio.run_coroutine_threadsafe(self._aclose_drivers(), self._loop).result()
+
+    async def aclose_all(self):
+        """Closes the async drivers. Later async calls open new ones."""
+        if self._loop is not None:
+            await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self._aclose_drivers(), self._loop))
+
+    async def _aclose_drivers(self, keys: Optional[Collection[Tuple]] = None):
+        keys = list(self._async_drivers) if keys is None else keys
+        drivers = [self._async_drivers.pop(key) for key in keys if key in self._async_drivers]
+        for driver in drivers:
+            await driver.close()
+
+
+connection_manager = Neo4jConnectionManager()
+atexit.register(connection_manager.close_all)
@@ -0,0 +1,102 @@
+import json
+import math
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+# nested values shorter than this are cheaper to repeat than to reference
+_MIN_ENTITY_CHARS = 32
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False, default=str)
+
+
+@dataclass(frozen=True)
+class ContextEncoder:
+    """Encodes retrieved records into a compact prompt context.
+
+    Records are written one per line as minified JSON with nulls dropped and floats rounded. Nested maps or lists
+    that repeat across records (the same customer or product attached to many hits, for example) are written once
+    under a `# entities` legend and referenced as `"@E<n>"`. With a `token_budget`, records are added in descending
+    score order until the next one would exceed the budget; the rest are dropped and counted in a trailing comment.
+    Token counts are estimated as `len(text) / chars_per_token`.
+    """
+    token_budget: Optional[int] = None
+    chars_per_token: float = 4.0
+    max_list_items: Optional[int] = None
+    float_precision: Optional[int] = 4
+    dedupe_entities: bool = True
+
+    def count_tokens(self, text: str) -> int:
+        return math.ceil(len(text) / self.chars_per_token)
+
+    def _clean(self, value):
+        if isinstance(value, dict):
+            return {k: self._clean(v) for k, v in value.items() if v is not None}
+        if isinstance(value, (list, tuple)):
+            items = [self._clean(v) for v in value if v is not None]
+            return items[:self.max_list_items] if self.max_list_items is not None else items
+        if isinstance(value, float) and self.float_precision is not None:
+            return round(value, self.float_precision)
+        return value
+
+    def _count_nested(self, value, counts: Counter):
+        for child in (value.values() if isinstance(value, dict) else value):
+            if isinstance(child, (dict, list)):
+                counts[_dumps(child)] += 1
+                self._count_nested(child, counts)
+
+    def _replace_nested(self, value, counts: Counter, entities: Dict[str, str]):
+        def replace(child):
+            if not isinstance(child, (dict, list)):
+                return child
+            encoded = _dumps(child)
+            if counts[encoded] > 1 and len(encoded) >= _MIN_ENTITY_CHARS:
+                return '@' + entities.setdefault(encoded, f'E{len(entities) + 1}')
+            return self._replace_nested(child, counts, entities)
+
+        if isinstance(value, dict):
+            return {k: replace(v) for k, v in value.items()}
+        return [replace(v) for v in value]
+
+    def encode(self, records: List[Dict]) -> str:
+        records = [self._clean(r) for r in records]
+        if records and all(isinstance(r.get('score'), (int, float)) for r in records):
+            records = sorted(records, key=lambda r: r['score'], reverse=True)
+
+        lines: List[Tuple[str, List[str]]] = []
+        entities: Dict[str, str] = dict()
+        counts = Counter()
+        if self.dedupe_entities:
+            for record in records:
+                self._count_nested(record, counts)
+        seen = set()
+        for record in records:
+            if self.dedupe_entities:
+                before = set(entities.values())
+                line = _dumps(self._replace_nested(record, counts, entities))
+                new = [e for e in entities.values() if e not in before]
+            else:
+                line, new = _dumps(record), []
+            if line in seen:
+                continue
+            seen.add(line)
+            lines.append((line, new))
+
+        definitions = {name: encoded for encoded, name in entities.items()}
+        kept, used_entities, used_tokens = [], [], 0
+        for line, new in lines:
+            entity_lines = [f'{name} {definitions[name]}' for name in new]
+            cost = self.count_tokens(line) + sum(self.count_tokens(e) for e in entity_lines)
+            if self.token_budget is not None and used_tokens + cost > self.token_budget:
+                break
+            kept.append(line)
+            used_entities.extend(entity_lines)
+            used_tokens += cost
+
+        out = (['# entities ("@E<n>" in a record stands for the entity E<n> below)'] + used_entities + ['# records']
+               if used_entities else []) + kept
+        if len(kept) < len(lines):
+            out.append(f'# {len(lines) - len(kept)} lower-ranked records omitted to fit the context budget')
+        return '\n'.join(out)
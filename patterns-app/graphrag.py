@@ -1,27 +1,57 @@
-import json
+import asyncio
+import hashlib
+import os
+import threading
 from collections import OrderedDict
-from dataclasses import dataclass
 from operator import itemgetter
-from typing import Dict, List, Tuple, Optional
+from typing import Callable, Dict, Iterator, List, Tuple, Optional
 
 from langchain.prompts.prompt import PromptTemplate
-from langchain_neo4j import Neo4jGraph
 from langchain_neo4j import Neo4jVector
 from langchain_core.documents import Document
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.runnables import RunnablePassthrough, RunnableLambda
 
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.llms import HuggingFaceHub
-
-embedding_model = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-llm = HuggingFaceHub(repo_id="google/flan-t5-base")
-t2c_llm = HuggingFaceHub(repo_id="google/flan-t5-base")
+from ann_index import Neo4jVectorMirror
+from connections import connection_manager, Neo4jCredentials, BoundedResult
+from context_encoder import ContextEncoder
+from chain_run import ChainRun
+from cypher_cache import CypherCache, get_cypher_cache, clean_generated_cypher, validate_cypher, avalidate_cypher
+from models import get_embedding_model, get_llm, get_t2c_llm, T2C_LLM_REPO_ID
+from node_embeddings import NodeEmbeddingStore
+from profiling import QueryProfile, run_profiled, arun_profiled
+from semantic_cache import SemanticCache, SemanticCacheEntry
+from timings import current_run, stage, timed, timed_stream, llm_timing_callback, cypher_generation_timing_callback
 
 VECTOR_QUERY_HEAD = """CALL db.index.vector.queryNodes($index, $k, $embedding)
 YIELD node, score
 """
 
+MIRROR_VECTOR_QUERY_HEAD = """UNWIND $hits AS hit
+MATCH (node) WHERE elementId(node) = hit.id
+WITH node, hit.score AS score
+"""
+
+BATCH_VECTOR_QUERY_HEAD = """UNWIND range(0, size($embeddings) - 1) AS promptIndex
+CALL {
+WITH promptIndex
+CALL db.index.vector.queryNodes($index, $k, $embeddings[promptIndex])
+YIELD node, score
+"""
+
+BATCH_MIRROR_VECTOR_QUERY_HEAD = """UNWIND range(0, size($hits) - 1) AS promptIndex
+CALL {
+WITH promptIndex
+UNWIND $hits[promptIndex] AS hit
+MATCH (node) WHERE elementId(node) = hit.id
+WITH node, hit.score AS score
+"""
+
+BATCH_VECTOR_QUERY_TAIL = """
+}
+RETURN promptIndex, text, score, metadata
+"""
+
 PROMPT_CONTEXT_TEMPLATE = """
 
 # Question
@@ -37,6 +67,15 @@ T2C_PROMPT_TEMPLATE = '''
 
 Remove english explanation, provide just the Cypher code. 
 '''
+T2C_RETRY_TEMPLATE = """{input}
+
+The previous Cypher statement was rejected by the database. Fix it.
+# Previous Cypher:
+{query}
+# Error:
+{error}
+"""
+
 T2C_RESPONSE_PROMPT_TEMPLATE = """
 Transform below data to human readable format with bullets if needed, And summarize it in a sentence or two if possible
 # Sample Ask and Response :
@@ -84,25 +123,112 @@ def format_res_dicts(d: Dict) -> Dict:
     return res
 
 
-def remove_key_from_dict(x, keys_to_remove):
-    if isinstance(x, dict):
-        x_clean = dict()
-        for k, v in x.items():
-            if k not in keys_to_remove:
-                x_clean[k] = remove_key_from_dict(v, keys_to_remove)
-    elif isinstance(x, list):
-        x_clean = [remove_key_from_dict(i, keys_to_remove) for i in x]
-    else:
-        x_clean = x
-    return x_clean
-
-
-@dataclass(frozen=True)
-class Neo4jCredentials:
-    uri: str
-    password: str
-    username: str = "neo4j"
-    database: str = "neo4j"
+def records_to_documents(records: List[Dict]) -> List[Document]:
+    return [Document(page_content=r['text'],
+                     metadata={k: v for k, v in (r['metadata'] or {}).items() if v is not None})
+            for r in records]
+
+
+def group_batch_results(rows: List[Dict], n: int) -> List[List[Dict]]:
+    grouped = [[] for _ in range(n)]
+    for row in rows:
+        grouped[row['promptIndex']].append({k: v for k, v in row.items() if k != 'promptIndex'})
+    return grouped
+
+
+_vector_mirrors: Dict[Tuple, Neo4jVectorMirror] = dict()
+_vector_mirrors_lock = threading.Lock()
+
+
+def get_vector_mirror(credentials: Neo4jCredentials, index_name: str, directory: Optional[str] = None,
+                      refresh_interval: Optional[float] = None) -> Neo4jVectorMirror:
+    """Returns the process-wide local mirror of a vector index, building it on first use.
+
+    With a `directory`, the mirror is saved under it on build and memory-mapped back from there on later starts.
+    With a `refresh_interval` (seconds), searches periodically pick up added and deleted nodes.
+    """
+    key = (credentials.key, index_name)
+    with _vector_mirrors_lock:
+        if key not in _vector_mirrors:
+            path = None
+            if directory is not None:
+                digest = hashlib.sha1(f'{credentials.uri}/{credentials.database}'.encode()).hexdigest()[:12]
+                path = os.path.join(directory, f'{index_name}-{digest}')
+            _vector_mirrors[key] = Neo4jVectorMirror.from_index(
+                connection_manager.get_driver(credentials), index_name, database=credentials.database, path=path,
+                refresh_interval=refresh_interval)
+        return _vector_mirrors[key]
+
+
+_vector_stores: Dict[Tuple, Neo4jVector] = dict()
+_node_embedding_stores: Dict[Tuple, NodeEmbeddingStore] = dict()
+_shared_resources_lock = threading.Lock()
+
+
+def get_vector_store(credentials: Neo4jCredentials, index_name: str,
+                     retrieval_query: Optional[str] = None) -> Neo4jVector:
+    """Returns the process-wide vector store for an index, resolving the index metadata on first use only."""
+    key = (credentials.key, index_name, retrieval_query)
+    with _shared_resources_lock:
+        if key not in _vector_stores:
+            _vector_stores[key] = Neo4jVector.from_existing_index(
+                embedding=get_embedding_model(),
+                graph=connection_manager.get_graph(credentials),
+                index_name=index_name,
+                retrieval_query=retrieval_query)
+        return _vector_stores[key]
+
+
+def get_node_embedding_store(credentials: Neo4jCredentials, embedding_node_property: str) -> NodeEmbeddingStore:
+    """Returns the process-wide in-process embedding matrix for a node property, shared by every chain using it."""
+    key = (credentials.key, embedding_node_property)
+    with _shared_resources_lock:
+        if key not in _node_embedding_stores:
+            _node_embedding_stores[key] = NodeEmbeddingStore(connection_manager.get_graph(credentials),
+                                                             embedding_node_property)
+        return _node_embedding_stores[key]
+
+
+def invalidate_shared_resources(credentials: Optional[Neo4jCredentials] = None):
+    """Drops the memoized vector stores and node embedding stores (only those of `credentials`, if given) so they
+    are rebuilt on next use, e.g. after reloading data or recreating an index. Chains already built keep the objects
+    they hold.
+
+    Vector mirrors are rebuilt in place instead, re-saving any persisted copy, so chains holding them see the new
+    data too."""
+    with _shared_resources_lock, _vector_mirrors_lock:
+        for memo in (_vector_stores, _node_embedding_stores):
+            for key in [k for k in memo if credentials is None or k[0] == credentials.key]:
+                del memo[key]
+        mirrors = [m for k, m in _vector_mirrors.items() if credentials is None or k[0] == credentials.key]
+    for mirror in mirrors:
+        mirror.build()
+
+
+def refresh_node_embeddings(ids: List[str], credentials: Optional[Neo4jCredentials] = None):
+    """Re-reads the given nodes (element ids) into the vector mirrors and node embedding stores, e.g. after their
+    embeddings changed."""
+    with _shared_resources_lock, _vector_mirrors_lock:
+        stores = [m for k, m in _vector_mirrors.items() if credentials is None or k[0] == credentials.key]
+        stores += [m for k, m in _node_embedding_stores.items() if credentials is None or k[0] == credentials.key]
+    for store in stores:
+        store.refresh(ids)
+
+
+def run_retrieval_query(credentials: Neo4jCredentials, query: str, params: Dict, profile: bool = False,
+                        step: Optional[str] = None) -> Tuple[List[Dict], Optional[QueryProfile]]:
+    """Runs a retrieval statement on the shared graph, under PROFILE when `profile` is set."""
+    if not profile:
+        return connection_manager.get_graph(credentials).query(query, params=params), None
+    return run_profiled(connection_manager.get_driver(credentials), query, params, credentials.database, step)
+
+
+async def arun_retrieval_query(credentials: Neo4jCredentials, query: str, params: Dict, profile: bool = False,
+                               step: Optional[str] = None) -> Tuple[List[Dict], Optional[QueryProfile]]:
+    if not profile:
+        return await connection_manager.aquery(credentials, query, params), None
+    return await connection_manager.arun(
+        credentials, lambda driver: arun_profiled(driver, query, params, credentials.database, step))
 
 
 class GraphRAGChain:
@@ -114,27 +240,25 @@ class GraphRAGChain:
                  neo4j_uri: Optional[str] = None,
                  neo4j_username: Optional[str] = None,
                  neo4j_password: Optional[str] = None,
-                 neo4j_database: Optional[str] = None
+                 neo4j_database: Optional[str] = None,
+                 semantic_cache: Optional[SemanticCache] = None,
+                 vector_mirror: Optional[Neo4jVectorMirror] = None,
+                 context_encoder: Optional[ContextEncoder] = None,
+                 profile: bool = False
                  ):
-        self.store = Neo4jVector.from_existing_index(
-            embedding=embedding_model,
-            url=neo4j_uri,
-            username=neo4j_username,
-            password=neo4j_password,
-            database=neo4j_database,
-            index_name=vector_index_name,
-            retrieval_query=graph_retrieval_query)
-
-        self.retriever = self.store.as_retriever(search_kwargs={"k": k})
+        self.credentials = Neo4jCredentials(uri=neo4j_uri, password=neo4j_password,
+                                            username=neo4j_username, database=neo4j_database)
+        self.store = get_vector_store(self.credentials, vector_index_name, graph_retrieval_query)
 
         self.prompt = PromptTemplate.from_template(prompt_instructions + PROMPT_CONTEXT_TEMPLATE)
 
-        self.chain = ({'context': self.retriever | self._format_and_save_context, 'input': RunnablePassthrough()}
-                      | self.prompt
-                      | llm
-                      | StrOutputParser())
+        self.response_chain = self.prompt | get_llm().with_config(callbacks=[llm_timing_callback]) | StrOutputParser()
+
+        self.chain = ({'context': RunnableLambda(self._retrieve) | self._format_and_save_context,
+                       'input': RunnablePassthrough()}
+                      | self.response_chain)
 
-        self.last_used_context = None
+        self.profile = profile
 
         self.k = k
 
@@ -147,13 +271,207 @@ class GraphRAGChain:
             self.store.retrieval_query if self.store.retrieval_query else default_retrieval
         )
 
+        self.semantic_cache = semantic_cache
+        self.vector_mirror = vector_mirror
+        self.context_encoder = context_encoder if context_encoder is not None else ContextEncoder()
+        self.semantic_cache_namespace = SemanticCache.namespace(
+            self.prompt.template, self.retrieval_query, self.store.index_name, self.k, repr(self.context_encoder))
+
+    def _format_context(self, docs) -> str:
+        with stage('context_formatting'):
+            return self.context_encoder.encode([format_doc(d) for d in docs])
+
     def _format_and_save_context(self, docs) -> str:
-        res = json.dumps([format_doc(d) for d in docs], indent=1)
-        self.last_used_context = res
+        res = self._format_context(docs)
+        current_run().context = res
         return res
 
-    def invoke(self, prompt: str):
-        return self.chain.invoke(prompt)
+    def _retrieve(self, prompt: str) -> List[Document]:
+        # same statement the vector store retriever runs, issued directly so each stage can be timed
+        with stage('embedding'):
+            query_vector = self.store.embedding.embed_query(prompt)
+        if self.vector_mirror is not None:
+            with stage('vector_search'):
+                hits = self.vector_mirror.search(query_vector, self.k)
+            with stage('graph_expansion'):
+                records, profile = run_retrieval_query(
+                    self.credentials, MIRROR_VECTOR_QUERY_HEAD + self.retrieval_query, {'hits': hits}, self.profile)
+        else:
+            with stage('retrieval'):
+                records, profile = run_retrieval_query(
+                    self.credentials, VECTOR_QUERY_HEAD + self.retrieval_query,
+                    {'index': self.store.index_name, 'k': self.k, 'embedding': query_vector}, self.profile)
+        current_run().profile = profile
+        return records_to_documents(records)
+
+    def _lookup_cached_answer(self, prompt: str, query_vector: List[float]):
+        with stage('cache_lookup'):
+            cached = self.semantic_cache.lookup(self.semantic_cache_namespace, prompt, query_vector)
+        if cached is not None:
+            run = current_run()
+            run.context, run.profile = cached.context, None
+        return cached
+
+    def invoke(self, prompt: str, run: Optional[ChainRun] = None):
+        with timed(self, run) as run:
+            if self.semantic_cache is None:
+                return self.chain.invoke(prompt)
+            with stage('embedding'):
+                query_vector = self.store.embedding.embed_query(prompt)
+            cached = self._lookup_cached_answer(prompt, query_vector)
+            if cached is not None:
+                return cached.answer
+            answer = self.chain.invoke(prompt)
+            self.semantic_cache.store(self.semantic_cache_namespace, prompt, query_vector, run.context, answer)
+            return answer
+
+    @timed_stream
+    def stream(self, prompt: str, on_context: Callable[[str], None] = None) -> Iterator[str]:
+        """Yields answer tokens as the LLM produces them. `on_context` is called with the context once retrieval
+        finishes, before the first token."""
+        if self.semantic_cache is not None:
+            with stage('embedding'):
+                query_vector = self.store.embedding.embed_query(prompt)
+            cached = self._lookup_cached_answer(prompt, query_vector)
+            if cached is not None:
+                if on_context is not None:
+                    on_context(cached.context)
+                yield cached.answer
+                return
+        context = self._format_and_save_context(self._retrieve(prompt))
+        if on_context is not None:
+            on_context(context)
+        answer = ''
+        for token in self.response_chain.stream({'context': context, 'input': prompt}):
+            answer += token
+            yield token
+        if self.semantic_cache is not None:
+            self.semantic_cache.store(self.semantic_cache_namespace, prompt, query_vector, context, answer)
+
+    def _batch_retrieval_query(self, query_vectors: List[List[float]]) -> Tuple[str, Dict, str]:
+        """The statement `_retrieve` runs, for every query vector at once: the query, its parameters and the stage it
+        is timed as. With a vector mirror, the searches run here, in-process."""
+        if self.vector_mirror is not None:
+            with stage('vector_search'):
+                hits = [self.vector_mirror.search(query_vector, self.k) for query_vector in query_vectors]
+            return (BATCH_MIRROR_VECTOR_QUERY_HEAD + self.retrieval_query + BATCH_VECTOR_QUERY_TAIL, {'hits': hits},
+                    'graph_expansion')
+        return (BATCH_VECTOR_QUERY_HEAD + self.retrieval_query + BATCH_VECTOR_QUERY_TAIL,
+                {'index': self.store.index_name, 'k': self.k, 'embeddings': query_vectors}, 'retrieval')
+
+    def _retrieve_many(self, query_vectors: List[List[float]]) -> List[List[Document]]:
+        query, params, stage_name = self._batch_retrieval_query(query_vectors)
+        with stage(stage_name):
+            rows, profile = run_retrieval_query(self.credentials, query, params, self.profile)
+        current_run().profile = profile
+        return [records_to_documents(records) for records in group_batch_results(rows, len(query_vectors))]
+
+    def _lookup_cached_answers(self, prompts: List[str],
+                               query_vectors: List[List[float]]) -> List[Optional[SemanticCacheEntry]]:
+        if self.semantic_cache is None:
+            return [None] * len(prompts)
+        return [self._lookup_cached_answer(p, query_vector) for p, query_vector in zip(prompts, query_vectors)]
+
+    def _finish_batch(self, prompts: List[str], query_vectors: List[List[float]],
+                      cached: List[Optional[SemanticCacheEntry]], contexts: Dict[int, str],
+                      answers: Dict[int, str]) -> List[str]:
+        """Merges cached and generated answers in prompt order, caching the generated ones."""
+        if self.semantic_cache is not None:
+            for i, answer in answers.items():
+                self.semantic_cache.store(self.semantic_cache_namespace, prompts[i], query_vectors[i], contexts[i],
+                                          answer)
+        last = len(prompts) - 1
+        current_run().context = contexts[last] if last in contexts else cached[last].context
+        return [answers[i] if i in answers else entry.answer for i, entry in enumerate(cached)]
+
+    def retrieve_many(self, prompts: List[str]) -> List[str]:
+        """Retrieves context for every prompt with one batched embedding call and one Cypher round trip."""
+        if not prompts:
+            return []
+        with stage('embedding'):
+            query_vectors = self.store.embedding.embed_documents(prompts)
+        return [self._format_context(docs) for docs in self._retrieve_many(query_vectors)]
+
+    def batch(self, prompts: List[str], run: Optional[ChainRun] = None) -> List[str]:
+        """`invoke` for every prompt, with one batched embedding call, one Cypher round trip and one LLM batch for
+        the prompts the semantic cache doesn't answer. The run's timings and profile cover the whole batch; its
+        context is the last prompt's."""
+        if not prompts:
+            return []
+        with timed(self, run):
+            with stage('embedding'):
+                query_vectors = self.store.embedding.embed_documents(prompts)
+            cached = self._lookup_cached_answers(prompts, query_vectors)
+            misses = [i for i, entry in enumerate(cached) if entry is None]
+            contexts, answers = dict(), dict()
+            if misses:
+                for i, docs in zip(misses, self._retrieve_many([query_vectors[i] for i in misses])):
+                    contexts[i] = self._format_context(docs)
+                generated = self.response_chain.batch([{'context': contexts[i], 'input': prompts[i]} for i in misses])
+                answers = dict(zip(misses, generated))
+            return self._finish_batch(prompts, query_vectors, cached, contexts, answers)
+
+    async def aretriever(self, prompt: str) -> List[Document]:
+        with stage('embedding'):
+            query_vector = await self.store.embedding.aembed_query(prompt)
+        if self.vector_mirror is not None:
+            with stage('vector_search'):
+                hits = self.vector_mirror.search(query_vector, self.k)
+            with stage('graph_expansion'):
+                records, profile = await arun_retrieval_query(
+                    self.credentials, MIRROR_VECTOR_QUERY_HEAD + self.retrieval_query, {'hits': hits}, self.profile)
+        else:
+            with stage('retrieval'):
+                records, profile = await arun_retrieval_query(
+                    self.credentials, VECTOR_QUERY_HEAD + self.retrieval_query,
+                    {'index': self.store.index_name, 'k': self.k, 'embedding': query_vector}, self.profile)
+        current_run().profile = profile
+        return records_to_documents(records)
+
+    async def ainvoke(self, prompt: str, run: Optional[ChainRun] = None):
+        with timed(self, run):
+            if self.semantic_cache is not None:
+                with stage('embedding'):
+                    query_vector = await self.store.embedding.aembed_query(prompt)
+                cached = self._lookup_cached_answer(prompt, query_vector)
+                if cached is not None:
+                    return cached.answer
+            context = self._format_and_save_context(await self.aretriever(prompt))
+            answer = await self.response_chain.ainvoke({'context': context, 'input': prompt})
+            if self.semantic_cache is not None:
+                self.semantic_cache.store(self.semantic_cache_namespace, prompt, query_vector, context, answer)
+            return answer
+
+    async def _aretrieve_many(self, query_vectors: List[List[float]]) -> List[List[Document]]:
+        query, params, stage_name = self._batch_retrieval_query(query_vectors)
+        with stage(stage_name):
+            rows, profile = await arun_retrieval_query(self.credentials, query, params, self.profile)
+        current_run().profile = profile
+        return [records_to_documents(records) for records in group_batch_results(rows, len(query_vectors))]
+
+    async def aretrieve_many(self, prompts: List[str]) -> List[str]:
+        if not prompts:
+            return []
+        with stage('embedding'):
+            query_vectors = await self.store.embedding.aembed_documents(prompts)
+        return [self._format_context(docs) for docs in await self._aretrieve_many(query_vectors)]
+
+    async def abatch(self, prompts: List[str], run: Optional[ChainRun] = None) -> List[str]:
+        if not prompts:
+            return []
+        with timed(self, run):
+            with stage('embedding'):
+                query_vectors = await self.store.embedding.aembed_documents(prompts)
+            cached = self._lookup_cached_answers(prompts, query_vectors)
+            misses = [i for i, entry in enumerate(cached) if entry is None]
+            contexts, answers = dict(), dict()
+            if misses:
+                for i, docs in zip(misses, await self._aretrieve_many([query_vectors[i] for i in misses])):
+                    contexts[i] = self._format_context(docs)
+                generated = await self.response_chain.abatch([{'context': contexts[i], 'input': prompts[i]}
+                                                              for i in misses])
+                answers = dict(zip(misses, generated))
+            return self._finish_batch(prompts, query_vectors, cached, contexts, answers)
 
     def get_full_retrieval_query_template(self):
         query_head = """CALL db.index.vector.queryNodes($index, $k, $embedding)
@@ -184,40 +502,126 @@ class GraphRAGText2CypherChain:
                  neo4j_uri: Optional[str] = None,
                  neo4j_username: Optional[str] = None,
                  neo4j_password: Optional[str] = None,
-                 neo4j_database: Optional[str] = None
+                 neo4j_database: Optional[str] = None,
+                 context_encoder: Optional[ContextEncoder] = None,
+                 max_rows: Optional[int] = 1000,
+                 max_bytes: Optional[int] = 1_000_000,
+                 cypher_cache: Optional[CypherCache] = None,
+                 max_generation_attempts: int = 3
                  ):
-        self.store = Neo4jGraph(
-            url=neo4j_uri,
-            username=neo4j_username,
-            password=neo4j_password,
-            database=neo4j_database
-        )
+        """Generated Cypher runs in a guarded mode: the result is streamed, `properties_to_remove_from_cypher_res`
+        are dropped as rows arrive, and reading stops at `max_rows` rows or `max_bytes` bytes (None for no bound).
+        The run's `fetch` holds the `BoundedResult` of the query, including whether it was truncated.
+
+        Before execution each generated statement is checked with EXPLAIN; on a planning error the LLM is asked
+        again with the error, up to `max_generation_attempts` times. Validated statements are kept in
+        `cypher_cache` (the in-memory process-wide cache by default) so repeated questions skip the LLM."""
+        self.credentials = Neo4jCredentials(uri=neo4j_uri, password=neo4j_password,
+                                            username=neo4j_username, database=neo4j_database)
+        self.store = connection_manager.get_graph(self.credentials)
         self.t2c_prompt = PromptTemplate.from_template(prompt_instructions + T2C_PROMPT_TEMPLATE)
         self.prompt = PromptTemplate.from_template(T2C_RESPONSE_PROMPT_TEMPLATE)
+        self.t2c_chain = (self.t2c_prompt | get_t2c_llm().with_config(callbacks=[cypher_generation_timing_callback])
+                          | StrOutputParser())
+        self.response_chain = self.prompt | get_llm().with_config(callbacks=[llm_timing_callback]) | StrOutputParser()
         self.chain = ({
-                          'context': self.t2c_prompt | t2c_llm | StrOutputParser() | self._format_and_save_query | self.store.query | self._format_and_save_context,
+                          'context': RunnableLambda(self.generate_cypher, afunc=self.agenerate_cypher)
+                                     | self._format_and_save_query | self._fetch | self._format_and_save_context,
                           'input': RunnablePassthrough()
                       }
-                      | self.prompt
-                      | llm
-                      | StrOutputParser())
-        self.last_used_context = None
-        self.last_retrieval_query = None
+                      | self.response_chain)
         self.properties_to_remove_from_cypher_res = properties_to_remove_from_cypher_res
-
-    def _format_and_save_context(self, docs) -> str:
-        if self.properties_to_remove_from_cypher_res is not None:
-            docs = remove_key_from_dict(docs, self.properties_to_remove_from_cypher_res)
-        res = json.dumps(docs, indent=1)
-        self.last_used_context = res
+        self.context_encoder = context_encoder if context_encoder is not None else ContextEncoder()
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.cypher_cache = cypher_cache if cypher_cache is not None else get_cypher_cache()
+        self.cypher_cache_namespace = CypherCache.namespace(self.t2c_prompt.template, T2C_LLM_REPO_ID,
+                                                            self.credentials.uri, self.credentials.database)
+        self.max_generation_attempts = max_generation_attempts
+
+    def _t2c_input(self, prompt: str, query: Optional[str], error: Optional[str]) -> str:
+        return prompt if error is None else T2C_RETRY_TEMPLATE.format(input=prompt, query=query, error=error)
+
+    def generate_cypher(self, prompt: str) -> str:
+        with stage('cache_lookup'):
+            query = self.cypher_cache.get(self.cypher_cache_namespace, prompt)
+        current_run().query_from_cache = query is not None
+        if query is not None:
+            return query
+        error = None
+        for _ in range(self.max_generation_attempts):
+            query = clean_generated_cypher(self.t2c_chain.invoke(self._t2c_input(prompt, query, error)))
+            with stage('cypher_validation'):
+                error = validate_cypher(connection_manager.get_driver(self.credentials), query,
+                                        self.credentials.database)
+            if error is None:
+                self.cypher_cache.put(self.cypher_cache_namespace, prompt, query)
+                break
+        # an invalid last attempt is still returned so the execution error surfaces as before
+        return query
+
+    async def agenerate_cypher(self, prompt: str) -> str:
+        with stage('cache_lookup'):
+            query = self.cypher_cache.get(self.cypher_cache_namespace, prompt)
+        current_run().query_from_cache = query is not None
+        if query is not None:
+            return query
+        error = None
+        for _ in range(self.max_generation_attempts):
+            query = clean_generated_cypher(await self.t2c_chain.ainvoke(self._t2c_input(prompt, query, error)))
+            with stage('cypher_validation'):
+                error = await connection_manager.arun(
+                    self.credentials, lambda driver: avalidate_cypher(driver, query, self.credentials.database))
+            if error is None:
+                self.cypher_cache.put(self.cypher_cache_namespace, prompt, query)
+                break
+        return query
+
+    def _fetch(self, query: str) -> BoundedResult:
+        with stage('retrieval'):
+            return connection_manager.query_bounded(self.credentials, query, max_rows=self.max_rows,
+                                                    max_bytes=self.max_bytes,
+                                                    keys_to_remove=self.properties_to_remove_from_cypher_res or ())
+
+    async def _afetch(self, query: str) -> BoundedResult:
+        with stage('retrieval'):
+            return await connection_manager.aquery_bounded(
+                self.credentials, query, max_rows=self.max_rows, max_bytes=self.max_bytes,
+                keys_to_remove=self.properties_to_remove_from_cypher_res or ())
+
+    def _format_and_save_context(self, fetched: BoundedResult) -> str:
+        current_run().fetch = fetched
+        with stage('context_formatting'):
+            res = self.context_encoder.encode(fetched.rows)
+        if fetched.truncated:
+            res += f"\n# {fetched.describe()}"
+        current_run().context = res
         return res
 
     def _format_and_save_query(self, s) -> str:
-        self.last_retrieval_query = s
+        current_run().retrieval_query = s
         return s
 
-    def invoke(self, prompt: str):
-        return self.chain.invoke(prompt)
+    def invoke(self, prompt: str, run: Optional[ChainRun] = None):
+        with timed(self, run):
+            return self.chain.invoke(prompt)
+
+    @timed_stream
+    def stream(self, prompt: str, on_context: Callable[[str], None] = None) -> Iterator[str]:
+        query = self._format_and_save_query(self.generate_cypher(prompt))
+        context = self._format_and_save_context(self._fetch(query))
+        if on_context is not None:
+            on_context(context)
+        yield from self.response_chain.stream({'context': context, 'input': prompt})
+
+    async def ainvoke(self, prompt: str, run: Optional[ChainRun] = None):
+        with timed(self, run):
+            query = self._format_and_save_query(await self.agenerate_cypher(prompt))
+            context = self._format_and_save_context(await self._afetch(query))
+            return await self.response_chain.ainvoke({'context': context, 'input': prompt})
+
+    async def abatch(self, prompts: List[str]) -> List[str]:
+        return list(await asyncio.gather(*[self.ainvoke(prompt) for prompt in prompts]))
 
 
 class GraphRAGPreFilterChain:
@@ -229,24 +633,25 @@ class GraphRAGPreFilterChain:
                  neo4j_uri: Optional[str] = None,
                  neo4j_username: Optional[str] = None,
                  neo4j_password: Optional[str] = None,
-                 neo4j_database: Optional[str] = None
+                 neo4j_database: Optional[str] = None,
+                 scoring_mode: str = 'database',
+                 context_encoder: Optional[ContextEncoder] = None,
+                 profile: bool = False
                  ):
-        self.vectorStore = Neo4jVector.from_existing_index(
-            embedding=embedding_model,
-            url=neo4j_uri,
-            username=neo4j_username,
-            password=neo4j_password,
-            database=neo4j_database,
-            index_name=vector_index_name)
-
-        self.store = Neo4jGraph(
-            url=neo4j_uri,
-            username=neo4j_username,
-            password=neo4j_password,
-            database=neo4j_database
-        )
+        """`scoring_mode='client'` fetches only prefiltered candidate ids from Neo4j, scores them against an
+        in-process embedding matrix, and fetches text and metadata for the final top k only.
 
-        self.embedding_model = embedding_model
+        With `profile` the retrieval statements run under PROFILE and the run's `profile` holds their per-operator
+        db hits, rows and page cache counters."""
+        if scoring_mode not in ('database', 'client'):
+            raise ValueError(f"scoring_mode must be 'database' or 'client', got {scoring_mode!r}")
+        self.credentials = Neo4jCredentials(uri=neo4j_uri, password=neo4j_password,
+                                            username=neo4j_username, database=neo4j_database)
+        self.store = connection_manager.get_graph(self.credentials)
+
+        self.vectorStore = get_vector_store(self.credentials, vector_index_name)
+
+        self.embedding_model = get_embedding_model()
 
         self.vector_search_template = f"""
 WITH node, prefilterMetadata, vector.similarity.cosine($embedding, node.`{self.vectorStore.embedding_node_property}`) AS score
@@ -261,53 +666,129 @@ ORDER by score DESC LIMIT toInteger($k)
 
         self.retrieval_query_template = graph_prefilter_query + '\n' + self.vector_search_template
 
+        self.scoring_mode = scoring_mode
+        self.candidate_query_template = graph_prefilter_query + '\nRETURN elementId(node) AS id, prefilterMetadata'
+        self.top_k_fetch_query = f"""
+UNWIND $candidates AS candidate
+MATCH (node) WHERE elementId(node) = candidate.id
+RETURN node.`{self.vectorStore.text_node_property}` AS text, 
+    candidate.score AS score, 
+    apoc.map.merge(node {{.*, `{self.vectorStore.text_node_property}`: Null, `{self.vectorStore.embedding_node_property}`: Null, id: Null}}, candidate.prefilterMetadata) AS metadata
+ORDER BY score DESC
+            """
+        self.node_embeddings = get_node_embedding_store(self.credentials, self.vectorStore.embedding_node_property) \
+            if scoring_mode == 'client' else None
+
         self.prompt = PromptTemplate.from_template(prompt_instructions + PROMPT_CONTEXT_TEMPLATE)
 
+        self.response_chain = self.prompt | get_llm().with_config(callbacks=[llm_timing_callback]) | StrOutputParser()
+
         self.chain = ({
                           'context': (lambda x: x['retrieverInput']) | RunnableLambda(
                               self.retriever) | self._format_and_save_context,
                           'input': (lambda x: x['prompt'])
                       }
-                      | self.prompt
-                      | llm
-                      | StrOutputParser())
+                      | self.response_chain)
 
-        self.last_used_context = None
-        self.last_retrieval_query = None
-        self.last_retrieval_query_params = None
         self.k = k
+        self.context_encoder = context_encoder if context_encoder is not None else ContextEncoder()
+        self.profile = profile
 
     def _format_and_save_context(self, docs) -> str:
-        res = json.dumps([format_res_dicts(doc) for doc in docs], indent=1)
-        self.last_used_context = res
+        with stage('context_formatting'):
+            res = self.context_encoder.encode([format_res_dicts(doc) for doc in docs])
+        current_run().context = res
         return res
 
     def _format_and_save_query(self, template: str, params: Dict):
-        self.last_retrieval_query = template
-        self.last_retrieval_query_params = params
-
-    def get_last_browser_queries(self):
-        params_string = json.dumps(self.last_retrieval_query_params)
-        params_query = f":params {params_string}"
-        return {'params_query': params_query,
-                'params_url_query': f'/browser?cmd=params&arg={params_string}',
-                'query_body': self.last_retrieval_query}
+        run = current_run()
+        run.retrieval_query, run.retrieval_query_params = template, params
+
+    def _client_scored_retrieval(self, query_vector: List[float], query_params: Dict) -> List[Dict]:
+        with stage('graph_prefilter'):
+            candidates, prefilter_profile = run_retrieval_query(self.credentials, self.candidate_query_template,
+                                                                query_params, self.profile, step='prefilter')
+        with stage('vector_search'):
+            top = self.node_embeddings.top_k([c['id'] for c in candidates], query_vector, self.k)
+        hits = [{'id': candidates[p]['id'], 'score': score, 'prefilterMetadata': candidates[p]['prefilterMetadata']}
+                for p, score in top]
+        with stage('graph_expansion'):
+            res, fetch_profile = run_retrieval_query(self.credentials, self.top_k_fetch_query, {'candidates': hits},
+                                                     self.profile, step='fetch')
+        if self.profile:
+            current_run().profile = QueryProfile.merge(prefilter_profile, fetch_profile)
+        return res
 
     def retriever(self, x):
-        query_vector = self.embedding_model.embed_query(x['searchPrompt'])
+        with stage('embedding'):
+            query_vector = self.embedding_model.embed_query(x['searchPrompt'])
+        params = {**x['queryParams'], **{'index': self.vectorStore.index_name, 'k': self.k, 'embedding': query_vector}}
+        if self.scoring_mode == 'client':
+            res = self._client_scored_retrieval(query_vector, x['queryParams'])
+        else:
+            with stage('retrieval'):
+                res, profile = run_retrieval_query(self.credentials, self.retrieval_query_template, params,
+                                                   self.profile)
+            current_run().profile = profile
+        # the browser query is the single-statement equivalent in both scoring modes
+        self._format_and_save_query(self.retrieval_query_template, params)
+        return res
+
+    def invoke(self, prompt: str, retrieval_search_text: str = None, query_params: Dict = None,
+               run: Optional[ChainRun] = None):
+        if retrieval_search_text is None:
+            retrieval_search_text = prompt
+        if query_params is None:
+            query_params = dict()
+        with timed(self, run):
+            return self.chain.invoke(
+                {'retrieverInput': {'searchPrompt': retrieval_search_text, 'queryParams': query_params},
+                 'prompt': prompt})
+
+    @timed_stream
+    def stream(self, prompt: str, retrieval_search_text: str = None, query_params: Dict = None,
+               on_context: Callable[[str], None] = None) -> Iterator[str]:
+        if retrieval_search_text is None:
+            retrieval_search_text = prompt
+        if query_params is None:
+            query_params = dict()
+        docs = self.retriever({'searchPrompt': retrieval_search_text, 'queryParams': query_params})
+        context = self._format_and_save_context(docs)
+        if on_context is not None:
+            on_context(context)
+        yield from self.response_chain.stream({'context': context, 'input': prompt})
+
+    async def aretriever(self, x):
+        with stage('embedding'):
+            query_vector = await self.embedding_model.aembed_query(x['searchPrompt'])
         params = {**x['queryParams'], **{'index': self.vectorStore.index_name, 'k': self.k, 'embedding': query_vector}}
-        res = self.store.query(self.retrieval_query_template, params=params)
+        if self.scoring_mode == 'client':
+            # to_thread carries the invocation timer and run into the worker thread
+            res = await asyncio.to_thread(self._client_scored_retrieval, query_vector, x['queryParams'])
+        else:
+            with stage('retrieval'):
+                res, profile = await arun_retrieval_query(self.credentials, self.retrieval_query_template, params,
+                                                          self.profile)
+            current_run().profile = profile
         self._format_and_save_query(self.retrieval_query_template, params)
         return res
 
-    def invoke(self, prompt: str, retrieval_search_text: str = None, query_params: Dict = None):
+    async def ainvoke(self, prompt: str, retrieval_search_text: str = None, query_params: Dict = None,
+                      run: Optional[ChainRun] = None):
         if retrieval_search_text is None:
             retrieval_search_text = prompt
         if query_params is None:
             query_params = dict()
-        return self.chain.invoke(
-            {'retrieverInput': {'searchPrompt': retrieval_search_text, 'queryParams': query_params},
-             'prompt': prompt})
+        with timed(self, run):
+            docs = await self.aretriever({'searchPrompt': retrieval_search_text, 'queryParams': query_params})
+            context = self._format_and_save_context(docs)
+            return await self.response_chain.ainvoke({'context': context, 'input': prompt})
+
+    async def abatch(self, prompts: List[str], retrieval_search_texts: List[str] = None, query_params: Dict = None):
+        if retrieval_search_texts is None:
+            retrieval_search_texts = prompts
+        return list(await asyncio.gather(*[self.ainvoke(prompt, search_text, query_params)
+                                           for prompt, search_text in zip(prompts, retrieval_search_texts)]))
 
 
 class DynamicGraphRAGChain:
@@ -319,36 +800,30 @@ class DynamicGraphRAGChain:
                  neo4j_uri: Optional[str] = None,
                  neo4j_username: Optional[str] = None,
                  neo4j_password: Optional[str] = None,
-                 neo4j_database: Optional[str] = None
+                 neo4j_database: Optional[str] = None,
+                 semantic_cache: Optional[SemanticCache] = None,
+                 vector_mirror: Optional[Neo4jVectorMirror] = None,
+                 context_encoder: Optional[ContextEncoder] = None,
+                 profile: bool = False
                  ):
-        self.vectorStore = Neo4jVector.from_existing_index(
-            embedding=embedding_model,
-            url=neo4j_uri,
-            username=neo4j_username,
-            password=neo4j_password,
-            database=neo4j_database,
-            index_name=vector_index_name,
-            retrieval_query=graph_retrieval_query)
-
-        self.store = Neo4jGraph(
-            url=neo4j_uri,
-            username=neo4j_username,
-            password=neo4j_password,
-            database=neo4j_database,
-        )
+        self.credentials = Neo4jCredentials(uri=neo4j_uri, password=neo4j_password,
+                                            username=neo4j_username, database=neo4j_database)
+        self.store = connection_manager.get_graph(self.credentials)
 
-        self.embedding_model = embedding_model
+        self.vectorStore = get_vector_store(self.credentials, vector_index_name, graph_retrieval_query)
+
+        self.embedding_model = get_embedding_model()
 
         self.prompt = PromptTemplate.from_template(prompt_instructions + PROMPT_CONTEXT_TEMPLATE)
 
+        self.response_chain = self.prompt | get_llm().with_config(callbacks=[llm_timing_callback]) | StrOutputParser()
+
         self.chain = ({
                           'context': (lambda x: x['retrieverInput']) | RunnableLambda(
                               self.retriever) | self._format_and_save_context,
                           'input': (lambda x: x['prompt'])
                       }
-                      | self.prompt
-                      | llm
-                      | StrOutputParser())
+                      | self.response_chain)
 
         self.k = k
 
@@ -362,39 +837,184 @@ class DynamicGraphRAGChain:
         )
 
         self.full_retrieval_query_template = VECTOR_QUERY_HEAD + self.retrieval_query
-        self.last_used_context = None
-        self.last_retrieval_query = None
-        self.last_retrieval_query_params = None
+        self.semantic_cache = semantic_cache
+        self.vector_mirror = vector_mirror
+        self.context_encoder = context_encoder if context_encoder is not None else ContextEncoder()
+        self.profile = profile
+
+    def _format_context(self, docs) -> str:
+        with stage('context_formatting'):
+            return self.context_encoder.encode([format_res_dicts(doc) for doc in docs])
 
     def _format_and_save_context(self, docs) -> str:
-        res = json.dumps([format_res_dicts(doc) for doc in docs], indent=1)
-        self.last_used_context = res
+        res = self._format_context(docs)
+        current_run().context = res
         return res
 
     def _format_and_save_query(self, template: str, params: Dict):
-        self.last_retrieval_query = template
-        self.last_retrieval_query_params = params
-
-    def get_last_browser_queries(self):
-        params_string = json.dumps(self.last_retrieval_query_params)
-        params_query = f":params {params_string}"
-        return {'params_query': params_query,
-                'params_url_query': f'/browser?cmd=params&arg={params_string}',
-                'query_body': self.last_retrieval_query}
+        run = current_run()
+        run.retrieval_query, run.retrieval_query_params = template, params
+
+    def _semantic_cache_namespace(self, prompt: str, retrieval_search_text: str, query_params: Dict) -> str:
+        # the answer depends on the full prompt whenever retrieval searches on different text
+        return SemanticCache.namespace(self.prompt.template, self.full_retrieval_query_template,
+                                       self.vectorStore.index_name, self.k, query_params, repr(self.context_encoder),
+                                       None if prompt == retrieval_search_text else prompt)
+
+    def _lookup_cached_answer(self, namespace: str, search_text: str, query_vector: List[float], query_params: Dict):
+        with stage('cache_lookup'):
+            cached = self.semantic_cache.lookup(namespace, search_text, query_vector)
+        if cached is not None:
+            run = current_run()
+            run.context, run.profile = cached.context, None
+            self._format_and_save_query(self.full_retrieval_query_template,
+                                        {**query_params, **{'index': self.vectorStore.index_name, 'k': self.k,
+                                                            'embedding': query_vector}})
+        return cached
 
     def retriever(self, x):
-        query_vector = self.embedding_model.embed_query(x['searchPrompt'])
+        with stage('embedding'):
+            query_vector = self.embedding_model.embed_query(x['searchPrompt'])
         params = {**x['queryParams'], **{'index': self.vectorStore.index_name, 'k': self.k, 'embedding': query_vector}}
-        res = self.store.query(self.full_retrieval_query_template, params=params)
+        if self.vector_mirror is not None:
+            with stage('vector_search'):
+                hits = self.vector_mirror.search(query_vector, self.k)
+            with stage('graph_expansion'):
+                res, profile = run_retrieval_query(self.credentials, MIRROR_VECTOR_QUERY_HEAD + self.retrieval_query,
+                                                   {**x['queryParams'], 'hits': hits}, self.profile)
+        else:
+            with stage('retrieval'):
+                res, profile = run_retrieval_query(self.credentials, self.full_retrieval_query_template, params,
+                                                   self.profile)
+        current_run().profile = profile
         self._format_and_save_query(self.full_retrieval_query_template, params)
         return res
 
-    def invoke(self, prompt: str, retrieval_search_text: str = None, query_params: Dict = None):
+    def invoke(self, prompt: str, retrieval_search_text: str = None, query_params: Dict = None,
+               run: Optional[ChainRun] = None):
         if retrieval_search_text is None:
             retrieval_search_text = prompt
         if query_params is None:
             query_params = dict()
-        return self.chain.invoke({
-            'retrieverInput': {'searchPrompt': retrieval_search_text, 'queryParams': query_params},
-            'prompt': prompt
-        })
+        with timed(self, run) as run:
+            chain_input = {
+                'retrieverInput': {'searchPrompt': retrieval_search_text, 'queryParams': query_params},
+                'prompt': prompt
+            }
+            if self.semantic_cache is None:
+                return self.chain.invoke(chain_input)
+            namespace = self._semantic_cache_namespace(prompt, retrieval_search_text, query_params)
+            with stage('embedding'):
+                query_vector = self.embedding_model.embed_query(retrieval_search_text)
+            cached = self._lookup_cached_answer(namespace, retrieval_search_text, query_vector, query_params)
+            if cached is not None:
+                return cached.answer
+            answer = self.chain.invoke(chain_input)
+            self.semantic_cache.store(namespace, retrieval_search_text, query_vector, run.context, answer)
+            return answer
+
+    @timed_stream
+    def stream(self, prompt: str, retrieval_search_text: str = None, query_params: Dict = None,
+               on_context: Callable[[str], None] = None) -> Iterator[str]:
+        if retrieval_search_text is None:
+            retrieval_search_text = prompt
+        if query_params is None:
+            query_params = dict()
+        if self.semantic_cache is not None:
+            namespace = self._semantic_cache_namespace(prompt, retrieval_search_text, query_params)
+            with stage('embedding'):
+                query_vector = self.embedding_model.embed_query(retrieval_search_text)
+            cached = self._lookup_cached_answer(namespace, retrieval_search_text, query_vector, query_params)
+            if cached is not None:
+                if on_context is not None:
+                    on_context(cached.context)
+                yield cached.answer
+                return
+        docs = self.retriever({'searchPrompt': retrieval_search_text, 'queryParams': query_params})
+        context = self._format_and_save_context(docs)
+        if on_context is not None:
+            on_context(context)
+        answer = ''
+        for token in self.response_chain.stream({'context': context, 'input': prompt}):
+            answer += token
+            yield token
+        if self.semantic_cache is not None:
+            self.semantic_cache.store(namespace, retrieval_search_text, query_vector, context, answer)
+
+    def retrieve_many(self, search_prompts: List[str], query_params: Dict = None) -> List[str]:
+        """Retrieves context for every search prompt with one batched embedding call and one Cypher round trip.
+
+        `query_params` are shared by all prompts in the batch.
+        """
+        if not search_prompts:
+            return []
+        if query_params is None:
+            query_params = dict()
+        embeddings = self.embedding_model.embed_documents(search_prompts)
+        params = {**query_params, **{'index': self.vectorStore.index_name, 'k': self.k, 'embeddings': embeddings}}
+        rows = self.store.query(BATCH_VECTOR_QUERY_HEAD + self.retrieval_query + BATCH_VECTOR_QUERY_TAIL,
+                                params=params)
+        return [self._format_context(records) for records in group_batch_results(rows, len(search_prompts))]
+
+    def batch(self, prompts: List[str], retrieval_search_texts: List[str] = None, query_params: Dict = None):
+        if retrieval_search_texts is None:
+            retrieval_search_texts = prompts
+        contexts = self.retrieve_many(retrieval_search_texts, query_params)
+        return self.response_chain.batch([{'context': c, 'input': p} for p, c in zip(prompts, contexts)])
+
+    async def aretriever(self, x):
+        with stage('embedding'):
+            query_vector = await self.embedding_model.aembed_query(x['searchPrompt'])
+        params = {**x['queryParams'], **{'index': self.vectorStore.index_name, 'k': self.k, 'embedding': query_vector}}
+        if self.vector_mirror is not None:
+            with stage('vector_search'):
+                hits = self.vector_mirror.search(query_vector, self.k)
+            with stage('graph_expansion'):
+                res, profile = await arun_retrieval_query(self.credentials,
+                                                          MIRROR_VECTOR_QUERY_HEAD + self.retrieval_query,
+                                                          {**x['queryParams'], 'hits': hits}, self.profile)
+        else:
+            with stage('retrieval'):
+                res, profile = await arun_retrieval_query(self.credentials, self.full_retrieval_query_template,
+                                                          params, self.profile)
+        current_run().profile = profile
+        self._format_and_save_query(self.full_retrieval_query_template, params)
+        return res
+
+    async def ainvoke(self, prompt: str, retrieval_search_text: str = None, query_params: Dict = None,
+                      run: Optional[ChainRun] = None):
+        if retrieval_search_text is None:
+            retrieval_search_text = prompt
+        if query_params is None:
+            query_params = dict()
+        with timed(self, run):
+            if self.semantic_cache is not None:
+                namespace = self._semantic_cache_namespace(prompt, retrieval_search_text, query_params)
+                with stage('embedding'):
+                    query_vector = await self.embedding_model.aembed_query(retrieval_search_text)
+                cached = self._lookup_cached_answer(namespace, retrieval_search_text, query_vector, query_params)
+                if cached is not None:
+                    return cached.answer
+            docs = await self.aretriever({'searchPrompt': retrieval_search_text, 'queryParams': query_params})
+            context = self._format_and_save_context(docs)
+            answer = await self.response_chain.ainvoke({'context': context, 'input': prompt})
+            if self.semantic_cache is not None:
+                self.semantic_cache.store(namespace, retrieval_search_text, query_vector, context, answer)
+            return answer
+
+    async def aretrieve_many(self, search_prompts: List[str], query_params: Dict = None) -> List[str]:
+        if not search_prompts:
+            return []
+        if query_params is None:
+            query_params = dict()
+        embeddings = await self.embedding_model.aembed_documents(search_prompts)
+        params = {**query_params, **{'index': self.vectorStore.index_name, 'k': self.k, 'embeddings': embeddings}}
+        rows = await connection_manager.aquery(
+            self.credentials, BATCH_VECTOR_QUERY_HEAD + self.retrieval_query + BATCH_VECTOR_QUERY_TAIL, params=params)
+        return [self._format_context(records) for records in group_batch_results(rows, len(search_prompts))]
+
+    async def abatch(self, prompts: List[str], retrieval_search_texts: List[str] = None, query_params: Dict = None):
+        if retrieval_search_texts is None:
+            retrieval_search_texts = prompts
+        contexts = await self.aretrieve_many(retrieval_search_texts, query_params)
+        return await self.response_chain.abatch([{'context': c, 'input': p} for p, c in zip(prompts, contexts)])
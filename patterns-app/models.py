@@ -0,0 +1,77 @@
+import functools
+import logging
+import threading
+from typing import Optional
+
+from embedding_cache import CachedEmbeddings
+
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+LLM_REPO_ID = "google/flan-t5-base"
+T2C_LLM_REPO_ID = "google/flan-t5-base"
+
+
+def load_once(factory):
+    """Turns a zero-argument factory into a thread-safe provider that builds its object on first call only."""
+    lock = threading.Lock()
+    instance = []
+
+    @functools.wraps(factory)
+    def provider():
+        if not instance:
+            with lock:
+                if not instance:
+                    instance.append(factory())
+        return instance[0]
+
+    provider.is_loaded = lambda: bool(instance)
+    return provider
+
+
+@load_once
+def get_embedding_model() -> CachedEmbeddings:
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+    return CachedEmbeddings(HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME), model_name=EMBEDDING_MODEL_NAME)
+
+
+@load_once
+def get_llm():
+    from langchain_community.llms import HuggingFaceHub
+    return HuggingFaceHub(repo_id=LLM_REPO_ID)
+
+
+@load_once
+def get_t2c_llm():
+    from langchain_community.llms import HuggingFaceHub
+    return HuggingFaceHub(repo_id=T2C_LLM_REPO_ID)
+
+
+_warmup_lock = threading.Lock()
+_warmup_thread: Optional[threading.Thread] = None
+
+
+def _run_warmup(include_llms: bool):
+    try:
+        # encode through the underlying model so the dummy text doesn't land in the embedding cache
+        get_embedding_model().embeddings.embed_query("warmup")
+        if include_llms:
+            get_llm()
+            get_t2c_llm()
+    except Exception:
+        logging.exception("Model warmup failed")
+
+
+def warmup(include_llms: bool = False, background: bool = True) -> Optional[threading.Thread]:
+    """Loads the embedding model (and optionally the LLMs) and runs a dummy encode.
+
+    Safe to call on every Streamlit rerun: warmup only ever runs once per process, on a daemon thread which is
+    returned to the caller. With `background=False` the call blocks until warmup has finished.
+    """
+    global _warmup_thread
+    with _warmup_lock:
+        if _warmup_thread is None:
+            _warmup_thread = threading.Thread(target=_run_warmup, args=(include_llms,), name="model-warmup",
+                                              daemon=True)
+            _warmup_thread.start()
+    if not background:
+        _warmup_thread.join()
+    return _warmup_thread
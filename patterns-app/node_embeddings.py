@@ -0,0 +1,110 @@
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_neo4j import Neo4jGraph
+
+
+class NodeEmbeddingStore:
+    """In-process float32 copy of a node embedding property, keyed by node element id.
+
+    Rows are L2-normalized on load so cosine similarity against a whole candidate set is a single matrix-vector
+    product. Embeddings are fetched from Neo4j the first time a node is seen and kept until `refresh` or
+    `invalidate` is called for the node.
+    """
+
+    def __init__(self, graph: Neo4jGraph, embedding_node_property: str):
+        self.graph = graph
+        self.embedding_node_property = embedding_node_property
+        self._rows: Dict[str, int] = dict()
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        # rows of invalidated nodes, reused before the matrix grows
+        self._free: List[int] = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _fetch(self, ids: List[str]) -> List[Dict]:
+        return self.graph.query(f"""
+        MATCH (n) WHERE elementId(n) IN $ids AND n.`{self.embedding_node_property}` IS NOT NULL
+        RETURN elementId(n) AS id, n.`{self.embedding_node_property}` AS embedding
+        """, params={'ids': ids})
+
+    def _add(self, rows: List[Dict], replace: bool = False):
+        """Stores the embeddings of new ids in free rows, appending rows only once none are left. Ids already
+        present, e.g. fetched meanwhile by a concurrent caller, are skipped, or overwritten in place with `replace`."""
+        if not rows:
+            return
+        new = np.asarray([r['embedding'] for r in rows], dtype=np.float32)
+        norms = np.linalg.norm(new, axis=1, keepdims=True)
+        new /= np.where(norms == 0, 1.0, norms)
+        with self._lock:
+            if replace:
+                for position, r in enumerate(rows):
+                    row = self._rows.get(r['id'])
+                    if row is not None:
+                        self._matrix[row] = new[position]
+            keep = [p for p, r in enumerate(rows) if r['id'] not in self._rows]
+            if not keep:
+                return
+            reused = min(len(keep), len(self._free))
+            for position in keep[:reused]:
+                row = self._free.pop()
+                self._matrix[row] = new[position]
+                self._rows[rows[position]['id']] = row
+            appended = keep[reused:]
+            if not appended:
+                return
+            start = len(self._matrix)
+            self._matrix = new[appended] if start == 0 else np.vstack([self._matrix, new[appended]])
+            for offset, position in enumerate(appended):
+                self._rows[rows[position]['id']] = start + offset
+
+    def ensure(self, ids: List[str]):
+        with self._lock:
+            missing = [i for i in ids if i not in self._rows]
+        if missing:
+            self._add(self._fetch(missing))
+
+    def refresh(self, ids: List[str]):
+        """Re-reads the given nodes: changed embeddings are overwritten, nodes without one any more are dropped."""
+        rows = self._fetch(ids)
+        found = {r['id'] for r in rows}
+        self.invalidate([i for i in ids if i not in found])
+        self._add(rows, replace=True)
+
+    def invalidate(self, ids: Optional[List[str]] = None):
+        """Forgets the given nodes, or all of them, so their embeddings are fetched again on next use."""
+        with self._lock:
+            if ids is None:
+                self._rows.clear()
+                self._free.clear()
+                self._matrix = np.zeros((0, 0), dtype=np.float32)
+            else:
+                for node_id in ids:
+                    row = self._rows.pop(node_id, None)
+                    if row is not None:
+                        self._free.append(row)
+
+    def top_k(self, ids: List[str], query_vector: List[float], k: int) -> List[Tuple[int, float]]:
+        """Scores `ids` against `query_vector` and returns (position in `ids`, score) for the best k.
+
+        Scores use the same [0, 1] scale as `vector.similarity.cosine`, and ids without an embedding are skipped
+        just as that function returns null for them.
+        """
+        self.ensure(ids)
+        with self._lock:
+            positions = [p for p, i in enumerate(ids) if i in self._rows]
+            if not positions:
+                return []
+            candidates = self._matrix[[self._rows[ids[p]] for p in positions]]
+        query = np.asarray(query_vector, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        scores = candidates @ query
+        if len(scores) > k:
+            best = np.argpartition(-scores, k - 1)[:k]
+        else:
+            best = np.arange(len(scores))
+        best = best[np.argsort(-scores[best])]
+        return [(positions[b], (1.0 + float(scores[b])) / 2) for b in best]
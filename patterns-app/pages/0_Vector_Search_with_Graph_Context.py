@@ -1,12 +1,21 @@
 import streamlit as st
 
-from graphrag import GraphRAGChain
-from ui_utils import render_header_svg, get_neo4j_url_from_uri
+from graphrag import GraphRAGChain, Neo4jCredentials, get_vector_mirror
+from semantic_cache import get_answer_cache
+from chain_run import ChainRun
+from context_encoder import ContextEncoder
+from ui_utils import render_header_svg, get_neo4j_url_from_uri, run_side_by_side, ComparisonColumn, \
+    render_query_profile, get_chain
 
 NORTHWIND_NEO4J_URI = st.secrets['NORTHWIND_NEO4J_URI']
 NORTHWIND_NEO4J_USERNAME = st.secrets['NORTHWIND_NEO4J_USERNAME']
 NORTHWIND_NEO4J_PASSWORD = st.secrets['NORTHWIND_NEO4J_PASSWORD']
 NORTHWIND_NEO4J_DATABASE = st.secrets.get('NORTHWIND_NEO4J_DATABASE', 'neo4j')
+CONTEXT_ENCODER = ContextEncoder(token_budget=st.secrets.get('CONTEXT_TOKEN_BUDGET'))
+PROFILE_QUERIES = st.secrets.get('PROFILE_QUERIES', False)
+SEMANTIC_CACHE = get_answer_cache(float(st.secrets.get('SEMANTIC_CACHE_THRESHOLD', 0.95))) \
+    if st.secrets.get('SEMANTIC_CACHE', False) else None
+MATERIALIZED_GRAPH_CONTEXT = st.secrets.get('MATERIALIZED_GRAPH_CONTEXT', False)
 
 
 st.set_page_config(page_icon="images/logo-mark-fullcolor-RGB-transBG.svg", layout="wide")
@@ -61,8 +70,24 @@ RETURN  product.text AS text,
     } AS metadata
 """
 
+# reads what `python precompute.py copurchases` materializes instead of traversing every order of every product
+materialized_graph_retrieval_query = """WITH node AS product, score
+MATCH (product)-[:SUPPLIED_BY]->(s:Supplier)
+RETURN product.text AS text,
+    score,
+    {
+        productSupplierName: s.companyName,
+        totalOrders: product.totalOrders,
+        customerData: [(c:Customer)-[r:ORDERED_PRODUCT]->(product) |
+            {customerName: c.companyName, orderCount: r.orderCount}],
+        recommendedProducts: [(product)-[r:COPURCHASED_WITH]->(recommendedProduct:Product) WHERE r.count > 2 |
+            {recommendedProduct: recommendedProduct.productName, copurchaseCount: r.count}]
+    } AS metadata
+"""
+
 prompt_instructions = """You are a product and retail expert who can answer questions based only on the context below.
-* Answer the question STRICTLY based on the context provided in JSON below.
+* Answer the question STRICTLY based on the context provided below, one JSON record per line.
+* "@E1", "@E2", ... in a record refer to the entities listed under "# entities".
 * Do not assume or retrieve any information outside of the context 
 * Think step by step before answering.
 * Do not return helpful or extra text or apologies
@@ -70,74 +95,88 @@ prompt_instructions = """You are a product and retail expert who can answer ques
 
 top_k = 5
 vector_index_name = 'product_text_embeddings'
-
-vector_only_rag_chain = GraphRAGChain(
+vector_mirror = get_vector_mirror(Neo4jCredentials(uri=NORTHWIND_NEO4J_URI, password=NORTHWIND_NEO4J_PASSWORD,
+                                                   username=NORTHWIND_NEO4J_USERNAME, database=NORTHWIND_NEO4J_DATABASE),
+                                  vector_index_name, directory=st.secrets.get('VECTOR_MIRROR_DIR'),
+                                  refresh_interval=st.secrets.get('VECTOR_MIRROR_REFRESH_SECONDS')
+                                  ) if st.secrets.get('VECTOR_MIRROR', False) else None
+
+vector_only_rag_chain = get_chain(
+    GraphRAGChain,
     neo4j_uri=NORTHWIND_NEO4J_URI,
     neo4j_username=NORTHWIND_NEO4J_USERNAME,
     neo4j_password=NORTHWIND_NEO4J_PASSWORD,
     neo4j_database=NORTHWIND_NEO4J_DATABASE,
     vector_index_name=vector_index_name,
     prompt_instructions=prompt_instructions,
-    k=top_k)
-
-graphrag_chain = GraphRAGChain(
+    k=top_k,
+    semantic_cache=SEMANTIC_CACHE,
+    vector_mirror=vector_mirror,
+    context_encoder=CONTEXT_ENCODER,
+    profile=PROFILE_QUERIES)
+
+graphrag_chain = get_chain(
+    GraphRAGChain,
     neo4j_uri=NORTHWIND_NEO4J_URI,
     neo4j_username=NORTHWIND_NEO4J_USERNAME,
     neo4j_password=NORTHWIND_NEO4J_PASSWORD,
     neo4j_database=NORTHWIND_NEO4J_DATABASE,
     vector_index_name=vector_index_name,
     prompt_instructions=prompt_instructions,
-    graph_retrieval_query=graph_retrieval_query,
-    k=top_k)
+    graph_retrieval_query=materialized_graph_retrieval_query if MATERIALIZED_GRAPH_CONTEXT else graph_retrieval_query,
+    k=top_k,
+    semantic_cache=SEMANTIC_CACHE,
+    vector_mirror=vector_mirror,
+    context_encoder=CONTEXT_ENCODER,
+    profile=PROFILE_QUERIES)
 
 prompt = st.text_input("submit a prompt:", value="")
 col1, col2 = st.columns(2)
+col1.subheader("Vector Only")
+col2.subheader("Vector Search & Graph Context")
+vector_only_run, graphrag_run = ChainRun(), ChainRun()
+if prompt:
+    run_side_by_side([
+        ComparisonColumn(col1, 'Running Vector Only RAG...',
+                         lambda on_context: vector_only_rag_chain.stream(prompt, on_context=on_context,
+                                                                         run=vector_only_run)),
+        ComparisonColumn(col2, 'Running GraphRAG...',
+                         lambda on_context: graphrag_chain.stream(prompt, on_context=on_context, run=graphrag_run)),
+    ])
 
 with col1:
-    st.subheader("Vector Only")
     if prompt:
-        with st.spinner('Running Vector Only RAG...'):
-            with st.expander('__Response:__', True):
-                st.markdown(vector_only_rag_chain.invoke(prompt))
-            with st.expander("__Context used to answer this prompt:__"):
-                st.json(vector_only_rag_chain.last_used_context)
-            with st.expander("__Query used to retrieve context:__"):
-                vector_rag_query = vector_only_rag_chain.get_full_retrieval_query(prompt)
-                st.markdown(f"""
-                This query only uses vector search.  The vector search will return the highest ranking `nodes` based on the vector similarity `score`(for this example we chose `{top_k}` nodes)
-                """)
-                st.code(vector_rag_query, language='cypher')
-                st.markdown('### Visualize Retrieval in Neo4j')
-                st.markdown('To explore the results in Neo4j do the following:\n' +
-                            f'* Go to [Neo4j Browser]({get_neo4j_url_from_uri(NORTHWIND_NEO4J_URI)}) and enter your credentials\n' +
-                            '* Run the above queries')
-                st.link_button("Try in Neo4j Browser!", get_neo4j_url_from_uri(NORTHWIND_NEO4J_URI))
-
-            st.success('Done!')
+        with st.expander("__Query used to retrieve context:__"):
+            vector_rag_query = vector_only_rag_chain.get_full_retrieval_query(prompt)
+            st.markdown(f"""
+            This query only uses vector search.  The vector search will return the highest ranking `nodes` based on the vector similarity `score`(for this example we chose `{top_k}` nodes)
+            """)
+            st.code(vector_rag_query, language='cypher')
+            render_query_profile(vector_only_run.profile)
+            st.markdown('### Visualize Retrieval in Neo4j')
+            st.markdown('To explore the results in Neo4j do the following:\n' +
+                        f'* Go to [Neo4j Browser]({get_neo4j_url_from_uri(NORTHWIND_NEO4J_URI)}) and enter your credentials\n' +
+                        '* Run the above queries')
+            st.link_button("Try in Neo4j Browser!", get_neo4j_url_from_uri(NORTHWIND_NEO4J_URI))
+
+        st.success('Done!')
 
 with col2:
-    st.subheader("Vector Search & Graph Context")
-
     if prompt:
-        with st.spinner('Running GraphRAG...'):
-            with st.expander('__Response:__', True):
-                st.markdown(graphrag_chain.invoke(prompt))
-
-            with st.expander("__Context used to answer this prompt:__"):
-                st.json(graphrag_chain.last_used_context)
-
-            with st.expander("__Query used to retrieve context:__"):
-                graph_rag_query = graphrag_chain.get_full_retrieval_query(prompt)
-                st.markdown(f"""The following Cypher query was used to obtain vector results enriched with additional context from the graph. The query initially performs a vector search, returning the highest ranking `nodes` based on their vector similarity `score`. In this example, we selected `{top_k}` nodes. Subsequently, the query performs further graph traversals and aggregation to gather context. You can think of this context as 'metadata,' but with the advantages of real-time collection and the flexibility to use robust patterns.
-                """)
-                st.code(graph_rag_query, language='cypher')
-                st.markdown('### Visualize Retrieval in Neo4j')
-                st.markdown('To explore the results in Neo4j do the following:\n' +
-                            f'* Go to [Neo4j Browser]({get_neo4j_url_from_uri(NORTHWIND_NEO4J_URI)}) and enter your credentials\n' +
-                            '* Run the above queries')
-                st.link_button("Try in Neo4j Browser!", get_neo4j_url_from_uri(NORTHWIND_NEO4J_URI))
-
-            st.success('Done!')
+
+        with st.expander("__Query used to retrieve context:__"):
+            graph_rag_query = graphrag_chain.get_full_retrieval_query(prompt)
+            st.markdown(f"""The following Cypher query was used to obtain vector results enriched with additional context from the graph. The query initially performs a vector search, returning the highest ranking `nodes` based on their vector similarity `score`. In this example, we selected `{top_k}` nodes. Subsequently, the query performs further graph traversals and aggregation to gather context. You can think of this context as 'metadata,' but with the advantages of real-time collection and the flexibility to use robust patterns.
+            """)
+            st.code(graph_rag_query, language='cypher')
+            render_query_profile(graphrag_run.profile)
+            st.markdown('### Visualize Retrieval in Neo4j')
+            st.markdown('To explore the results in Neo4j do the following:\n' +
+                        f'* Go to [Neo4j Browser]({get_neo4j_url_from_uri(NORTHWIND_NEO4J_URI)}) and enter your credentials\n' +
+                        '* Run the above queries')
+            st.link_button("Try in Neo4j Browser!", get_neo4j_url_from_uri(NORTHWIND_NEO4J_URI))
+
+        st.success('Done!')
 
 
 
@@ -1,12 +1,18 @@
 import streamlit as st
 
-from graphrag import GraphRAGChain, GraphRAGText2CypherChain
-from ui_utils import render_header_svg, get_neo4j_url_from_uri
+from graphrag import GraphRAGChain, GraphRAGText2CypherChain, Neo4jCredentials, get_vector_mirror
+from chain_run import ChainRun
+from context_encoder import ContextEncoder
+from cypher_cache import get_cypher_cache
+from ui_utils import render_header_svg, get_neo4j_url_from_uri, run_side_by_side, ComparisonColumn, \
+    render_query_profile, get_chain
 
 NORTHWIND_NEO4J_URI = st.secrets['NORTHWIND_NEO4J_URI']
 NORTHWIND_NEO4J_USERNAME = st.secrets['NORTHWIND_NEO4J_USERNAME']
 NORTHWIND_NEO4J_PASSWORD = st.secrets['NORTHWIND_NEO4J_PASSWORD']
 NORTHWIND_NEO4J_DATABASE = st.secrets.get('NORTHWIND_NEO4J_DATABASE', 'neo4j')
+CONTEXT_ENCODER = ContextEncoder(token_budget=st.secrets.get('CONTEXT_TOKEN_BUDGET'))
+PROFILE_QUERIES = st.secrets.get('PROFILE_QUERIES', False)
 
 st.set_page_config(page_icon="images/logo-mark-fullcolor-RGB-transBG.svg", layout="wide")
 render_header_svg("images/graphrag.svg", 200)
@@ -44,7 +50,8 @@ Accepted graph traversal paths
 '''
 
 prompt_instructions_vector_only = """You are a product and retail expert who can answer questions based only on the context below.
-* Answer the question STRICTLY based on the context provided in JSON below.
+* Answer the question STRICTLY based on the context provided below, one JSON record per line.
+* "@E1", "@E2", ... in a record refer to the entities listed under "# entities".
 * Do not assume or retrieve any information outside of the context 
 * Think step by step before answering.
 * Do not return helpful or extra text or apologies
@@ -52,72 +59,87 @@ prompt_instructions_vector_only = """You are a product and retail expert who can
 
 top_k_vector_only = 5
 vector_index_name = 'product_text_embeddings'
-
-vector_only_rag_chain = GraphRAGChain(
+vector_mirror = get_vector_mirror(Neo4jCredentials(uri=NORTHWIND_NEO4J_URI, password=NORTHWIND_NEO4J_PASSWORD,
+                                                   username=NORTHWIND_NEO4J_USERNAME, database=NORTHWIND_NEO4J_DATABASE),
+                                  vector_index_name, directory=st.secrets.get('VECTOR_MIRROR_DIR'),
+                                  refresh_interval=st.secrets.get('VECTOR_MIRROR_REFRESH_SECONDS')
+                                  ) if st.secrets.get('VECTOR_MIRROR', False) else None
+
+vector_only_rag_chain = get_chain(
+    GraphRAGChain,
     neo4j_uri=NORTHWIND_NEO4J_URI,
     neo4j_username=NORTHWIND_NEO4J_USERNAME,
     neo4j_password=NORTHWIND_NEO4J_PASSWORD,
     neo4j_database=NORTHWIND_NEO4J_DATABASE,
     vector_index_name=vector_index_name,
     prompt_instructions=prompt_instructions_vector_only,
-    k=top_k_vector_only)
+    k=top_k_vector_only,
+    vector_mirror=vector_mirror,
+    context_encoder=CONTEXT_ENCODER,
+    profile=PROFILE_QUERIES)
 
-graphrag_t2c_chain = GraphRAGText2CypherChain(
+graphrag_t2c_chain = get_chain(
+    GraphRAGText2CypherChain,
     neo4j_uri=NORTHWIND_NEO4J_URI,
     neo4j_username=NORTHWIND_NEO4J_USERNAME,
     neo4j_password=NORTHWIND_NEO4J_PASSWORD,
     neo4j_database=NORTHWIND_NEO4J_DATABASE,
     prompt_instructions=prompt_instructions_with_schema,
-    properties_to_remove_from_cypher_res=['textEmbedding'])
+    properties_to_remove_from_cypher_res=['textEmbedding'],
+    context_encoder=CONTEXT_ENCODER,
+    cypher_cache=get_cypher_cache(st.secrets.get('CYPHER_CACHE_PATH')))
 
 prompt = st.text_input("submit a prompt:", value="")
 col1, col2 = st.columns(2)
+col1.subheader("Vector Only")
+col2.subheader("Text2Cypher")
+vector_only_run, graphrag_t2c_run = ChainRun(), ChainRun()
+if prompt:
+    run_side_by_side([
+        ComparisonColumn(col1, 'Running Vector Only RAG...',
+                         lambda on_context: vector_only_rag_chain.stream(prompt, on_context=on_context,
+                                                                         run=vector_only_run)),
+        ComparisonColumn(col2, 'Running GraphRAG...',
+                         lambda on_context: graphrag_t2c_chain.stream(prompt, on_context=on_context,
+                                                                      run=graphrag_t2c_run)),
+    ])
 
 with col1:
-    st.subheader("Vector Only")
     if prompt:
-        with st.spinner('Running Vector Only RAG...'):
-            with st.expander('__Response:__', True):
-                st.markdown(vector_only_rag_chain.invoke(prompt))
-            with st.expander("__Context used to answer this prompt:__"):
-                st.json(vector_only_rag_chain.last_used_context)
-            with st.expander("__Query used to retrieve context:__"):
-                vector_rag_query = vector_only_rag_chain.get_full_retrieval_query(prompt)
-                st.markdown(f"""
-                This query only uses vector search.  The vector search will return the highest ranking `nodes` based on the vector similarity `score`(for this example we chose `{top_k_vector_only}` nodes)
-                """)
-                st.code(vector_rag_query, language='cypher')
-                st.markdown('### Visualize Retrieval in Neo4j')
-                st.markdown('To explore the results in Neo4j do the following:\n' +
-                            f'* Go to [Neo4j Browser]({get_neo4j_url_from_uri(NORTHWIND_NEO4J_URI)}) and enter your credentials\n' +
-                            '* Run the above queries')
-                st.link_button("Try in Neo4j Browser!", get_neo4j_url_from_uri(NORTHWIND_NEO4J_URI))
-
-            st.success('Done!')
+        with st.expander("__Query used to retrieve context:__"):
+            vector_rag_query = vector_only_rag_chain.get_full_retrieval_query(prompt)
+            st.markdown(f"""
+            This query only uses vector search.  The vector search will return the highest ranking `nodes` based on the vector similarity `score`(for this example we chose `{top_k_vector_only}` nodes)
+            """)
+            st.code(vector_rag_query, language='cypher')
+            render_query_profile(vector_only_run.profile)
+            st.markdown('### Visualize Retrieval in Neo4j')
+            st.markdown('To explore the results in Neo4j do the following:\n' +
+                        f'* Go to [Neo4j Browser]({get_neo4j_url_from_uri(NORTHWIND_NEO4J_URI)}) and enter your credentials\n' +
+                        '* Run the above queries')
+            st.link_button("Try in Neo4j Browser!", get_neo4j_url_from_uri(NORTHWIND_NEO4J_URI))
+
+        st.success('Done!')
 
 with col2:
-    st.subheader("Text2Cypher")
-
     if prompt:
-        with st.spinner('Running GraphRAG...'):
-            with st.expander('__Response:__', True):
-                st.markdown(graphrag_t2c_chain.invoke(prompt))
-
-            with st.expander("__Context used to answer this prompt:__"):
-                st.json(graphrag_t2c_chain.last_used_context)
-
-            with st.expander("__Query used to retrieve context:__"):
-                graph_rag_query = graphrag_t2c_chain.last_retrieval_query
-                st.markdown(f"""
-                """)
-                st.code(graph_rag_query, language='cypher')
-                st.markdown('### Visualize Retrieval in Neo4j')
-                st.markdown('To explore the results in Neo4j do the following:\n' +
-                            f'* Go to [Neo4j Browser]({get_neo4j_url_from_uri(NORTHWIND_NEO4J_URI)}) and enter your credentials\n' +
-                            '* Run the above queries')
-                st.link_button("Try in Neo4j Browser!", get_neo4j_url_from_uri(NORTHWIND_NEO4J_URI))
-
-            st.success('Done!')
+
+        with st.expander("__Query used to retrieve context:__"):
+            graph_rag_query = graphrag_t2c_run.retrieval_query
+            st.markdown(f"""
+            """)
+            st.code(graph_rag_query, language='cypher')
+            if graphrag_t2c_run.query_from_cache:
+                st.caption('Served from the generated Cypher cache')
+            if graphrag_t2c_run.fetch is not None and graphrag_t2c_run.fetch.truncated:
+                st.warning(f"The generated query returned too much data: {graphrag_t2c_run.fetch.describe()}")
+            st.markdown('### Visualize Retrieval in Neo4j')
+            st.markdown('To explore the results in Neo4j do the following:\n' +
+                        f'* Go to [Neo4j Browser]({get_neo4j_url_from_uri(NORTHWIND_NEO4J_URI)}) and enter your credentials\n' +
+                        '* Run the above queries')
+            st.link_button("Try in Neo4j Browser!", get_neo4j_url_from_uri(NORTHWIND_NEO4J_URI))
+
+        st.success('Done!')
 
 st.markdown("---")
 
@@ -1,12 +1,17 @@
 import streamlit as st
 
-from graphrag import DynamicGraphRAGChain
-from ui_utils import render_header_svg, get_neo4j_url_from_uri
+from graphrag import DynamicGraphRAGChain, Neo4jCredentials, get_vector_mirror
+from chain_run import ChainRun
+from context_encoder import ContextEncoder
+from ui_utils import render_header_svg, get_neo4j_url_from_uri, run_side_by_side, ComparisonColumn, \
+    render_query_profile, get_chain
 
 HM_NEO4J_URI = st.secrets['HM_NEO4J_URI']
 HM_NEO4J_USERNAME = st.secrets['HM_NEO4J_USERNAME']
 HM_NEO4J_PASSWORD = st.secrets['HM_NEO4J_PASSWORD']
 HM_NEO4J_DATABASE = st.secrets.get('HM_NEO4J_DATABASE', 'neo4j')
+CONTEXT_ENCODER = ContextEncoder(token_budget=st.secrets.get('CONTEXT_TOKEN_BUDGET'))
+PROFILE_QUERIES = st.secrets.get('PROFILE_QUERIES', False)
 
 st.set_page_config(page_icon="images/logo-mark-fullcolor-RGB-transBG.svg", layout="wide")
 render_header_svg("images/graphrag.svg", 200)
@@ -23,6 +28,11 @@ st.markdown('''### Task: Generate fashion recommendations to pair with customer'
 
 
 vector_index_name = 'product_text_embeddings'
+vector_mirror = get_vector_mirror(Neo4jCredentials(uri=HM_NEO4J_URI, password=HM_NEO4J_PASSWORD,
+                                                   username=HM_NEO4J_USERNAME, database=HM_NEO4J_DATABASE),
+                                  vector_index_name, directory=st.secrets.get('VECTOR_MIRROR_DIR'),
+                                  refresh_interval=st.secrets.get('VECTOR_MIRROR_REFRESH_SECONDS')
+                                  ) if st.secrets.get('VECTOR_MIRROR', False) else None
 
 graph_retrieval_query = """WITH node AS searchProduct, score AS searchScore
 MATCH(searchProduct)<-[:VARIANT_OF]-(searchArticle:Article)
@@ -35,20 +45,26 @@ RETURN product.`text` AS text,
     product {.*, `text`: Null, `textEmbedding`: Null, id: Null} AS metadata
 ORDER by score DESC LIMIT 20"""
 
-graph_vector_chain = DynamicGraphRAGChain(neo4j_uri=HM_NEO4J_URI,
-                                          neo4j_username=HM_NEO4J_USERNAME,
-                                          neo4j_password=HM_NEO4J_PASSWORD,
-                                          neo4j_database=HM_NEO4J_DATABASE,
-                                          vector_index_name='product_text_embeddings',
-                                          graph_retrieval_query=graph_retrieval_query,
-                                          k=10)
-
-vector_only_chain = DynamicGraphRAGChain(neo4j_uri=HM_NEO4J_URI,
-                                         neo4j_username=HM_NEO4J_USERNAME,
-                                         neo4j_password=HM_NEO4J_PASSWORD,
-                                         neo4j_database=HM_NEO4J_DATABASE,
-                                         vector_index_name='product_text_embeddings',
-                                         k=10)
+graph_vector_chain = get_chain(DynamicGraphRAGChain, neo4j_uri=HM_NEO4J_URI,
+                               neo4j_username=HM_NEO4J_USERNAME,
+                               neo4j_password=HM_NEO4J_PASSWORD,
+                               neo4j_database=HM_NEO4J_DATABASE,
+                               vector_index_name='product_text_embeddings',
+                               graph_retrieval_query=graph_retrieval_query,
+                               k=10,
+                               vector_mirror=vector_mirror,
+                               context_encoder=CONTEXT_ENCODER,
+                               profile=PROFILE_QUERIES)
+
+vector_only_chain = get_chain(DynamicGraphRAGChain, neo4j_uri=HM_NEO4J_URI,
+                              neo4j_username=HM_NEO4J_USERNAME,
+                              neo4j_password=HM_NEO4J_PASSWORD,
+                              neo4j_database=HM_NEO4J_DATABASE,
+                              vector_index_name='product_text_embeddings',
+                              k=10,
+                              vector_mirror=vector_mirror,
+                              context_encoder=CONTEXT_ENCODER,
+                              profile=PROFILE_QUERIES)
 
 
 def generate_prompt(cstmr_name_input, time_of_year_input, cstmr_interests_input):
@@ -102,48 +118,48 @@ if gen_content:
     st.markdown(generate_prompt(customer_name, time_of_year, customer_interests))
 
 col1, col2 = st.columns(2)
+col1.subheader("Vector Only")
+col2.subheader("GraphRAG With Graph Vectors")
+vector_only_run, graph_vector_run = ChainRun(), ChainRun()
+if gen_content:
+    full_prompt = generate_prompt(customer_name, time_of_year, customer_interests)
+    run_side_by_side([
+        ComparisonColumn(col1, 'Running Vector Only RAG...',
+                         lambda on_context: vector_only_chain.stream(full_prompt,
+                                                                     retrieval_search_text=customer_interests,
+                                                                     on_context=on_context, run=vector_only_run)),
+        ComparisonColumn(col2, 'Running GraphRAG...',
+                         lambda on_context: graph_vector_chain.stream(full_prompt,
+                                                                      retrieval_search_text=customer_interests,
+                                                                      on_context=on_context, run=graph_vector_run)),
+    ])
+
 with col1:
-    st.subheader("Vector Only")
     if gen_content:
-        with st.spinner('Running Vector Only RAG...'):
-            with st.expander('__Response:__', True):
-                st.markdown(vector_only_chain.invoke(generate_prompt(customer_name, time_of_year, customer_interests),
-                                                     retrieval_search_text=customer_interests)
-                            )
-            with st.expander("__Context used to answer this prompt:__"):
-                st.json(vector_only_chain.last_used_context)
-
-            with st.expander("__Query used to retrieve context:__"):
-                vector_only_queries = vector_only_chain.get_last_browser_queries()
-                st.code(vector_only_queries['params_query'], language='cypher')
-                st.code(vector_only_queries['query_body'], language='cypher')
-                st.markdown('### Visualize Retrieval in Neo4j')
-                st.markdown('To explore the results in Neo4j do the following:\n' +
-                            f'* Go to [Neo4j Browser]({get_neo4j_url_from_uri(HM_NEO4J_URI)}) and enter your credentials\n' +
-                            '* Run the above queries')
-                st.link_button("Try in Neo4j Browser!", get_neo4j_url_from_uri(HM_NEO4J_URI))
-
-            st.success('Done!')
+        with st.expander("__Query used to retrieve context:__"):
+            vector_only_queries = vector_only_run.browser_queries()
+            st.code(vector_only_queries['params_query'], language='cypher')
+            st.code(vector_only_queries['query_body'], language='cypher')
+            render_query_profile(vector_only_run.profile)
+            st.markdown('### Visualize Retrieval in Neo4j')
+            st.markdown('To explore the results in Neo4j do the following:\n' +
+                        f'* Go to [Neo4j Browser]({get_neo4j_url_from_uri(HM_NEO4J_URI)}) and enter your credentials\n' +
+                        '* Run the above queries')
+            st.link_button("Try in Neo4j Browser!", get_neo4j_url_from_uri(HM_NEO4J_URI))
+
+        st.success('Done!')
 
 with col2:
-    st.subheader("GraphRAG With Graph Vectors")
     if gen_content:
-        with st.spinner('Running GraphRAG...'):
-            with st.expander('__Response:__', True):
-                st.markdown(graph_vector_chain.invoke(generate_prompt(customer_name, time_of_year, customer_interests),
-                                                      retrieval_search_text=customer_interests)
-                            )
-            with st.expander("__Context used to answer this prompt:__"):
-                st.json(graph_vector_chain.last_used_context)
-
-            with st.expander("__Query used to retrieve context:__"):
-                graph_vector_queries = graph_vector_chain.get_last_browser_queries()
-                st.code(graph_vector_queries['params_query'], language='cypher')
-                st.code(graph_vector_queries['query_body'], language='cypher')
-                st.markdown('### Visualize Retrieval in Neo4j')
-                st.markdown('To explore the results in Neo4j do the following:\n' +
-                            f'* Go to [Neo4j Browser]({get_neo4j_url_from_uri(HM_NEO4J_URI)}) and enter your credentials\n' +
-                            '* Run the above queries')
-                st.link_button("Try in Neo4j Browser!", get_neo4j_url_from_uri(HM_NEO4J_URI))
-
-            st.success('Done!')
+        with st.expander("__Query used to retrieve context:__"):
+            graph_vector_queries = graph_vector_run.browser_queries()
+            st.code(graph_vector_queries['params_query'], language='cypher')
+            st.code(graph_vector_queries['query_body'], language='cypher')
+            render_query_profile(graph_vector_run.profile)
+            st.markdown('### Visualize Retrieval in Neo4j')
+            st.markdown('To explore the results in Neo4j do the following:\n' +
+                        f'* Go to [Neo4j Browser]({get_neo4j_url_from_uri(HM_NEO4J_URI)}) and enter your credentials\n' +
+                        '* Run the above queries')
+            st.link_button("Try in Neo4j Browser!", get_neo4j_url_from_uri(HM_NEO4J_URI))
+
+        st.success('Done!')
@@ -1,12 +1,18 @@
 import streamlit as st
 
 from graphrag import GraphRAGPreFilterChain, DynamicGraphRAGChain
-from ui_utils import render_header_svg, get_neo4j_url_from_uri
+from chain_run import ChainRun
+from context_encoder import ContextEncoder
+from ui_utils import render_header_svg, get_neo4j_url_from_uri, run_side_by_side, ComparisonColumn, \
+    render_query_profile, get_chain
 
 HM_NEO4J_URI = st.secrets['HM_NEO4J_URI']
 HM_NEO4J_USERNAME = st.secrets['HM_NEO4J_USERNAME']
 HM_NEO4J_PASSWORD = st.secrets['HM_NEO4J_PASSWORD']
 HM_NEO4J_DATABASE = st.secrets.get('HM_NEO4J_DATABASE', 'neo4j')
+CONTEXT_ENCODER = ContextEncoder(token_budget=st.secrets.get('CONTEXT_TOKEN_BUDGET'))
+PROFILE_QUERIES = st.secrets.get('PROFILE_QUERIES', False)
+MATERIALIZED_AFFINITY = st.secrets.get('MATERIALIZED_AFFINITY', False)
 
 st.set_page_config(page_icon="images/logo-mark-fullcolor-RGB-transBG.svg", layout="wide")
 st.markdown(' ')
@@ -43,21 +49,46 @@ RETURN text,
     {productCode: productCode, purchaseScore:purchaseScore, searchScore:searchScore} AS metadata
 ORDER BY purchaseScore DESC, searchScore DESC LIMIT 20"""
 
-graphrag_prefilter_chain = GraphRAGPreFilterChain(neo4j_uri=HM_NEO4J_URI,
-                                                  neo4j_username=HM_NEO4J_USERNAME,
-                                                  neo4j_password=HM_NEO4J_PASSWORD,
-                                                  neo4j_database=HM_NEO4J_DATABASE,
-                                                  vector_index_name='product_text_embeddings',
-                                                  graph_prefilter_query=prefilter_graph_retrieval_query,
-                                                  k=top_k)
+# read the top-N scores `python precompute.py affinity` stores instead of traversing the customer's neighbourhood
+materialized_prefilter_graph_retrieval_query = """
+MATCH (:Customer {customerId:$customerId})-[affinity:AFFINITY]->(product:Product)
+WITH affinity.score AS recommendationScore, product
+ORDER BY recommendationScore DESC LIMIT 100
+WITH product AS node, {recommendationScore:recommendationScore} AS prefilterMetadata"""
 
-graphrag_postfilter_chain = DynamicGraphRAGChain(neo4j_uri=HM_NEO4J_URI,
-                                                 neo4j_username=HM_NEO4J_USERNAME,
-                                                 neo4j_password=HM_NEO4J_PASSWORD,
-                                                 neo4j_database=HM_NEO4J_DATABASE,
-                                                 vector_index_name='product_text_embeddings',
-                                                 graph_retrieval_query=postfilter_graph_retrieval_query,
-                                                 k=100)
+materialized_postfilter_graph_retrieval_query = """WITH node AS product, score AS searchScore
+OPTIONAL MATCH (:Customer {customerId: $customerId})-[affinity:AFFINITY]->(product)
+
+WITH coalesce(affinity.score, 0) AS purchaseScore, product.text AS text, searchScore, product.productCode AS productCode
+RETURN text,
+    (1+purchaseScore)*searchScore AS score,
+    {productCode: productCode, purchaseScore:purchaseScore, searchScore:searchScore} AS metadata
+ORDER BY purchaseScore DESC, searchScore DESC LIMIT 20"""
+
+if MATERIALIZED_AFFINITY:
+    prefilter_graph_retrieval_query = materialized_prefilter_graph_retrieval_query
+    postfilter_graph_retrieval_query = materialized_postfilter_graph_retrieval_query
+
+graphrag_prefilter_chain = get_chain(GraphRAGPreFilterChain, neo4j_uri=HM_NEO4J_URI,
+                                     neo4j_username=HM_NEO4J_USERNAME,
+                                     neo4j_password=HM_NEO4J_PASSWORD,
+                                     neo4j_database=HM_NEO4J_DATABASE,
+                                     vector_index_name='product_text_embeddings',
+                                     graph_prefilter_query=prefilter_graph_retrieval_query,
+                                     k=top_k,
+                                     scoring_mode=st.secrets.get('PREFILTER_SCORING_MODE', 'database'),
+                                     context_encoder=CONTEXT_ENCODER,
+                                     profile=PROFILE_QUERIES)
+
+graphrag_postfilter_chain = get_chain(DynamicGraphRAGChain, neo4j_uri=HM_NEO4J_URI,
+                                      neo4j_username=HM_NEO4J_USERNAME,
+                                      neo4j_password=HM_NEO4J_PASSWORD,
+                                      neo4j_database=HM_NEO4J_DATABASE,
+                                      vector_index_name='product_text_embeddings',
+                                      graph_retrieval_query=postfilter_graph_retrieval_query,
+                                      k=100,
+                                      context_encoder=CONTEXT_ENCODER,
+                                      profile=PROFILE_QUERIES)
 
 
 def generate_prompt(cstmr_name_input, time_of_year_input):
@@ -119,53 +150,52 @@ if gen_content:
     st.markdown(generate_prompt(customer_name, time_of_year))
 
 col1, col2 = st.columns(2)
+col1.subheader("Graph Post-Filtering")
+col2.subheader("Graph Pre-Filtering")
+postfilter_run, prefilter_run = ChainRun(), ChainRun()
+if gen_content:
+    full_prompt = generate_prompt(customer_name, time_of_year)
+    run_side_by_side([
+        ComparisonColumn(col1, 'Running GraphRAG...',
+                         lambda on_context: graphrag_postfilter_chain.stream(full_prompt,
+                                                                             retrieval_search_text=customer_interests,
+                                                                             query_params={"customerId": customer_id},
+                                                                             on_context=on_context,
+                                                                             run=postfilter_run)),
+        ComparisonColumn(col2, 'Running GraphRAG...',
+                         lambda on_context: graphrag_prefilter_chain.stream(full_prompt,
+                                                                            retrieval_search_text=customer_interests,
+                                                                            query_params={"customerId": customer_id},
+                                                                            on_context=on_context,
+                                                                            run=prefilter_run)),
+    ])
 
 with col1:
-    st.subheader("Graph Post-Filtering")
     if gen_content:
-        with st.spinner('Running GraphRAG...'):
-            with st.expander('__Response:__', True):
-                st.markdown(graphrag_postfilter_chain.invoke(
-                    generate_prompt(customer_name, time_of_year),
-                    retrieval_search_text=customer_interests,
-                    query_params={"customerId": customer_id})
-                )
-            with st.expander("__Context used to answer this prompt:__"):
-                st.json(graphrag_postfilter_chain.last_used_context)
-
-            with st.expander("__Query used to retrieve context:__"):
-                graphrag_post_filter_queries = graphrag_postfilter_chain.get_last_browser_queries()
-                st.code(graphrag_post_filter_queries['params_query'], language='cypher')
-                st.code(graphrag_post_filter_queries['query_body'], language='cypher')
-                st.markdown('### Visualize Retrieval in Neo4j')
-                st.markdown('To explore the results in Neo4j do the following:\n' +
-                            f'* Go to [Neo4j Browser]({get_neo4j_url_from_uri(HM_NEO4J_URI)}) and enter your credentials\n' +
-                            '* Run the above queries')
-                st.link_button("Try in Neo4j Browser!", get_neo4j_url_from_uri(HM_NEO4J_URI))
-
-            st.success('Done!')
+        with st.expander("__Query used to retrieve context:__"):
+            graphrag_post_filter_queries = postfilter_run.browser_queries()
+            st.code(graphrag_post_filter_queries['params_query'], language='cypher')
+            st.code(graphrag_post_filter_queries['query_body'], language='cypher')
+            render_query_profile(postfilter_run.profile)
+            st.markdown('### Visualize Retrieval in Neo4j')
+            st.markdown('To explore the results in Neo4j do the following:\n' +
+                        f'* Go to [Neo4j Browser]({get_neo4j_url_from_uri(HM_NEO4J_URI)}) and enter your credentials\n' +
+                        '* Run the above queries')
+            st.link_button("Try in Neo4j Browser!", get_neo4j_url_from_uri(HM_NEO4J_URI))
+
+        st.success('Done!')
 
 with col2:
-    st.subheader("Graph Pre-Filtering")
     if gen_content:
-        with st.spinner('Running GraphRAG...'):
-            with st.expander('__Response:__', True):
-                st.markdown(graphrag_prefilter_chain.invoke(
-                    generate_prompt(customer_name, time_of_year),
-                    retrieval_search_text=customer_interests,
-                    query_params={"customerId": customer_id})
-                )
-            with st.expander("__Context used to answer this prompt:__"):
-                st.json(graphrag_prefilter_chain.last_used_context)
-
-            with st.expander("__Query used to retrieve context:__"):
-                graphrag_prefilter_queries = graphrag_prefilter_chain.get_last_browser_queries()
-                st.code(graphrag_prefilter_queries['params_query'], language='cypher')
-                st.code(graphrag_prefilter_queries['query_body'], language='cypher')
-                st.markdown('### Visualize Retrieval in Neo4j')
-                st.markdown('To explore the results in Neo4j do the following:\n' +
-                            f'* Go to [Neo4j Browser]({get_neo4j_url_from_uri(HM_NEO4J_URI)}) and enter your credentials\n' +
-                            '* Run the above queries')
-                st.link_button("Try in Neo4j Browser!", get_neo4j_url_from_uri(HM_NEO4J_URI))
-
-            st.success('Done!')
+        with st.expander("__Query used to retrieve context:__"):
+            graphrag_prefilter_queries = prefilter_run.browser_queries()
+            st.code(graphrag_prefilter_queries['params_query'], language='cypher')
+            st.code(graphrag_prefilter_queries['query_body'], language='cypher')
+            render_query_profile(prefilter_run.profile)
+            st.markdown('### Visualize Retrieval in Neo4j')
+            st.markdown('To explore the results in Neo4j do the following:\n' +
+                        f'* Go to [Neo4j Browser]({get_neo4j_url_from_uri(HM_NEO4J_URI)}) and enter your credentials\n' +
+                        '* Run the above queries')
+            st.link_button("Try in Neo4j Browser!", get_neo4j_url_from_uri(HM_NEO4J_URI))
+
+        st.success('Done!')
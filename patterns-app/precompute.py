@@ -0,0 +1,137 @@
+"""Batch jobs that materialize graph context the retrieval queries would otherwise recompute on every request.
+
+Run from the patterns-app directory after loading the data, and again whenever orders or purchases change:
+
+    python precompute.py copurchases
+    python precompute.py affinity --top-n 100
+"""
+import argparse
+import time
+
+import streamlit as st
+
+from connections import connection_manager, Neo4jCredentials
+
+# One transaction per batch of products replaces their co-purchases, incoming ORDERED_PRODUCT relationships and
+# aggregates, so readers never see a product without them while a refresh runs.
+COPURCHASES_QUERY = """
+MATCH (product:Product)
+CALL {
+    WITH product
+    CALL {
+        WITH product
+        MATCH (product)-[old:COPURCHASED_WITH]->(:Product)
+        DELETE old
+    }
+    CALL {
+        WITH product
+        MATCH (:Customer)-[old:ORDERED_PRODUCT]->(product)
+        DELETE old
+    }
+    CALL {
+        WITH product
+        MATCH (product)<-[:ORDER_CONTAINS]-(:Order)-[:ORDER_CONTAINS]->(other:Product)
+        WITH product, other, count(*) AS copurchaseCount
+        WHERE copurchaseCount >= $minCopurchaseCount
+        CREATE (product)-[:COPURCHASED_WITH {count: copurchaseCount}]->(other)
+    }
+    OPTIONAL MATCH (product)<-[:ORDER_CONTAINS]-(:Order)<-[:ORDERED]-(customer:Customer)
+    WITH product, customer, count(*) AS orderCount
+    FOREACH (_ IN CASE WHEN customer IS NULL THEN [] ELSE [1] END |
+        CREATE (customer)-[:ORDERED_PRODUCT {orderCount: orderCount}]->(product))
+    WITH product, sum(CASE WHEN customer IS NULL THEN 0 ELSE orderCount END) AS totalOrders,
+        count(customer) AS customerCount
+    SET product.totalOrders = totalOrders,
+        product.customerCount = customerCount,
+        product.copurchasesRefreshedAt = datetime($refreshedAt)
+} IN TRANSACTIONS OF $batchSize ROWS
+"""
+
+# One transaction per batch of customers replaces their scores, so readers never see a customer without any.
+# The score counts the same Customer-PURCHASED->Article<-PURCHASED-Customer-PURCHASED->Article-VARIANT_OF->Product
+# paths the live Graph Filtering queries count.
+AFFINITY_QUERY = """
+MATCH (customer:Customer)
+CALL {
+    WITH customer
+    CALL {
+        WITH customer
+        MATCH (customer)-[old:AFFINITY]->(:Product)
+        DELETE old
+    }
+    MATCH (customer)-[:PURCHASED]->(:Article)<-[:PURCHASED]-(:Customer)-[:PURCHASED]->(recArticle:Article)
+        -[:VARIANT_OF]->(product:Product)
+    WITH customer, product, count(recArticle) AS score
+    ORDER BY score DESC LIMIT $topN
+    CREATE (customer)-[:AFFINITY {score: score}]->(product)
+} IN TRANSACTIONS OF $batchSize ROWS
+"""
+
+
+def refresh_copurchases(credentials: Neo4jCredentials, min_copurchase_count: int = 1,
+                        batch_size: int = 100) -> float:
+    """Rebuilds `COPURCHASED_WITH {count}` between products ordered together, `ORDERED_PRODUCT {orderCount}` from
+    customers to the products they ordered, and `totalOrders`/`customerCount` on every product.
+
+    Returns the elapsed seconds. The retrieval queries filter on `count`, so `min_copurchase_count` only trims
+    pairs no query will ever read.
+    """
+    start = time.perf_counter()
+    params = {'batchSize': batch_size, 'minCopurchaseCount': min_copurchase_count,
+              'refreshedAt': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())}
+    # CALL { ... } IN TRANSACTIONS needs an auto-commit transaction, hence session.run
+    with connection_manager.get_driver(credentials).session(database=credentials.database) as session:
+        session.run(COPURCHASES_QUERY, params).consume()
+    return time.perf_counter() - start
+
+
+def refresh_affinities(credentials: Neo4jCredentials, top_n: int = 100, batch_size: int = 50) -> float:
+    """Rebuilds `AFFINITY {score}` from every customer to their `top_n` highest scoring products.
+
+    Returns the elapsed seconds. Products outside a customer's top n read as a score of 0.
+    """
+    start = time.perf_counter()
+    with connection_manager.get_driver(credentials).session(database=credentials.database) as session:
+        session.run(AFFINITY_QUERY, {'topN': top_n, 'batchSize': batch_size}).consume()
+    return time.perf_counter() - start
+
+
+def northwind_credentials() -> Neo4jCredentials:
+    return Neo4jCredentials(uri=st.secrets['NORTHWIND_NEO4J_URI'],
+                            password=st.secrets['NORTHWIND_NEO4J_PASSWORD'],
+                            username=st.secrets['NORTHWIND_NEO4J_USERNAME'],
+                            database=st.secrets.get('NORTHWIND_NEO4J_DATABASE', 'neo4j'))
+
+
+def hm_credentials() -> Neo4jCredentials:
+    return Neo4jCredentials(uri=st.secrets['HM_NEO4J_URI'],
+                            password=st.secrets['HM_NEO4J_PASSWORD'],
+                            username=st.secrets['HM_NEO4J_USERNAME'],
+                            database=st.secrets.get('HM_NEO4J_DATABASE', 'neo4j'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    jobs = parser.add_subparsers(dest='job', required=True)
+    copurchases = jobs.add_parser('copurchases', help='materialize Northwind co-purchases and product aggregates')
+    copurchases.add_argument('--min-copurchase-count', type=int, default=1)
+    copurchases.add_argument('--batch-size', type=int, default=100)
+    affinity = jobs.add_parser('affinity', help='materialize H&M customer-product affinity scores')
+    affinity.add_argument('--top-n', type=int, default=100)
+    affinity.add_argument('--batch-size', type=int, default=50)
+    args = parser.parse_args()
+
+    try:
+        if args.job == 'copurchases':
+            seconds = refresh_copurchases(northwind_credentials(), min_copurchase_count=args.min_copurchase_count,
+                                          batch_size=args.batch_size)
+            print(f'Materialized Northwind co-purchases in {seconds:.1f}s')
+        elif args.job == 'affinity':
+            seconds = refresh_affinities(hm_credentials(), top_n=args.top_n, batch_size=args.batch_size)
+            print(f'Materialized H&M customer affinities in {seconds:.1f}s')
+    finally:
+        connection_manager.close_all()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+
+@dataclass
+class OperatorProfile:
+    operator: str
+    details: str
+    depth: int
+    rows: int
+    db_hits: int
+    page_cache_hits: int
+    page_cache_misses: int
+    step: Optional[str] = None
+
+
+@dataclass
+class QueryProfile:
+    """Per-operator counters from a PROFILE run, flattened depth first from the plan root."""
+    operators: List[OperatorProfile] = field(default_factory=list)
+
+    @classmethod
+    def from_plan(cls, plan: Dict, step: Optional[str] = None) -> 'QueryProfile':
+        """Builds the profile from `ResultSummary.profile`."""
+        operators = []
+
+        def visit(node: Dict, depth: int):
+            args = node.get('args') or {}
+            operators.append(OperatorProfile(operator=node.get('operatorType', '').split('@')[0],
+                                             details=str(args.get('Details', '')),
+                                             depth=depth,
+                                             rows=node.get('rows', 0),
+                                             db_hits=node.get('dbHits', 0),
+                                             page_cache_hits=node.get('pageCacheHits', 0),
+                                             page_cache_misses=node.get('pageCacheMisses', 0),
+                                             step=step))
+            for child in node.get('children') or []:
+                visit(child, depth + 1)
+
+        if plan:
+            visit(plan, 0)
+        return cls(operators)
+
+    @classmethod
+    def merge(cls, *profiles: 'QueryProfile') -> 'QueryProfile':
+        """Concatenates the profiles of statements that together make up one retrieval."""
+        return cls([op for p in profiles for op in p.operators])
+
+    @property
+    def db_hits(self) -> int:
+        return sum(op.db_hits for op in self.operators)
+
+    @property
+    def rows(self) -> int:
+        """Rows produced by the root operator of every statement."""
+        return sum(op.rows for op in self.operators if op.depth == 0)
+
+    @property
+    def page_cache_hits(self) -> int:
+        return sum(op.page_cache_hits for op in self.operators)
+
+    @property
+    def page_cache_misses(self) -> int:
+        return sum(op.page_cache_misses for op in self.operators)
+
+    @property
+    def page_cache_hit_ratio(self) -> float:
+        accesses = self.page_cache_hits + self.page_cache_misses
+        return self.page_cache_hits / accesses if accesses else 1.0
+
+    def summary(self) -> Dict:
+        return {'dbHits': self.db_hits,
+                'rows': self.rows,
+                'pageCacheHits': self.page_cache_hits,
+                'pageCacheMisses': self.page_cache_misses,
+                'pageCacheHitRatio': round(self.page_cache_hit_ratio, 4)}
+
+    def to_rows(self) -> List[Dict]:
+        """One row per operator, indented by plan depth, for tabular display."""
+        return [{**({'step': op.step} if op.step is not None else {}),
+                 'operator': '  ' * op.depth + op.operator,
+                 'details': op.details,
+                 'rows': op.rows,
+                 'dbHits': op.db_hits,
+                 'pageCacheHits': op.page_cache_hits,
+                 'pageCacheMisses': op.page_cache_misses}
+                for op in self.operators]
+
+
+def run_profiled(driver, query: str, params: Dict = None, database: Optional[str] = None,
+                 step: Optional[str] = None) -> Tuple[List[Dict], QueryProfile]:
+    """Runs `query` under PROFILE and returns its rows (as `Neo4jGraph.query` would) together with the profile."""
+    with driver.session(database=database) as session:
+        result = session.run('PROFILE ' + query, params or {})
+        rows = [record.data() for record in result]
+        return rows, QueryProfile.from_plan(result.consume().profile, step=step)
+
+
+async def arun_profiled(driver, query: str, params: Dict = None, database: Optional[str] = None,
+                        step: Optional[str] = None) -> Tuple[List[Dict], QueryProfile]:
+    async with driver.session(database=database) as session:
+        result = await session.run('PROFILE ' + query, params or {})
+        rows = await result.data()
+        summary = await result.consume()
+        return rows, QueryProfile.from_plan(summary.profile, step=step)
@@ -0,0 +1,121 @@
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from embedding_cache import normalize_text
+
+# numbers and quoted names, which embeddings barely tell apart ("3 cheeses" vs "5 cheeses")
+_LITERAL = re.compile(r'\d+(?:[.,]\d+)*|"[^"]*"')
+
+
+@dataclass
+class SemanticCacheEntry:
+    prompt: str
+    embedding: np.ndarray
+    context: str
+    answer: str
+    created_at: float
+    literals: Tuple[str, ...] = ()
+
+
+class SemanticCache:
+    """Answer cache that matches prompts by embedding similarity rather than exact text.
+
+    Entries live in namespaces so that chains with different prompt templates or retrieval queries never share
+    answers. Each namespace holds at most `maxsize` entries (least recently used evicted first), and entries older
+    than `ttl_seconds` are dropped on lookup. A prompt only matches entries whose prompts contain the same numbers
+    and quoted names, however similar the embeddings.
+    """
+
+    def __init__(self, similarity_threshold: float = 0.95, ttl_seconds: Optional[float] = 3600, maxsize: int = 256):
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.maxsize = maxsize
+        self._namespaces: Dict[str, OrderedDict] = dict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def namespace(*parts) -> str:
+        return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def literals(prompt: str) -> Tuple[str, ...]:
+        return tuple(m.lower() for m in _LITERAL.findall(prompt))
+
+    def _expire(self, entries: OrderedDict):
+        if self.ttl_seconds is None:
+            return
+        cutoff = time.monotonic() - self.ttl_seconds
+        for key in [k for k, e in entries.items() if e.created_at < cutoff]:
+            del entries[key]
+
+    def lookup(self, namespace: str, prompt: str, embedding: List[float]) -> Optional[SemanticCacheEntry]:
+        query = np.asarray(embedding, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        literals = self.literals(prompt)
+        with self._lock:
+            entries = self._namespaces.get(namespace)
+            if entries:
+                self._expire(entries)
+            keys = [k for k, e in entries.items() if e.literals == literals] if entries else []
+            if not keys:
+                self.misses += 1
+                return None
+            scores = np.stack([entries[k].embedding for k in keys]) @ query
+            best = int(np.argmax(scores))
+            if scores[best] < self.similarity_threshold:
+                self.misses += 1
+                return None
+            entries.move_to_end(keys[best])
+            self.hits += 1
+            return entries[keys[best]]
+
+    def store(self, namespace: str, prompt: str, embedding: List[float], context: str, answer: str):
+        vector = np.asarray(embedding, dtype=np.float32)
+        vector /= np.linalg.norm(vector) or 1.0
+        entry = SemanticCacheEntry(prompt=prompt, embedding=vector, context=context, answer=answer,
+                                   created_at=time.monotonic(), literals=self.literals(prompt))
+        key = normalize_text(prompt)
+        with self._lock:
+            entries = self._namespaces.setdefault(namespace, OrderedDict())
+            entries[key] = entry
+            entries.move_to_end(key)
+            while len(entries) > self.maxsize:
+                entries.popitem(last=False)
+
+    def clear(self, namespace: Optional[str] = None):
+        with self._lock:
+            if namespace is None:
+                self._namespaces.clear()
+            else:
+                self._namespaces.pop(namespace, None)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'namespaces': len(self._namespaces),
+                    'size': sum(len(e) for e in self._namespaces.values()),
+                    'hit_rate': self.hits / lookups if lookups else 0.0}
+
+
+_answer_caches: Dict[float, SemanticCache] = dict()
+_answer_caches_lock = threading.Lock()
+
+
+def get_answer_cache(similarity_threshold: float = 0.95) -> SemanticCache:
+    """Returns the process-wide answer cache for `similarity_threshold`."""
+    with _answer_caches_lock:
+        if similarity_threshold not in _answer_caches:
+            _answer_caches[similarity_threshold] = SemanticCache(similarity_threshold=similarity_threshold)
+        return _answer_caches[similarity_threshold]
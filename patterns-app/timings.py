@@ -0,0 +1,227 @@
+import functools
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Deque, Dict, Iterator, Optional, Tuple
+from uuid import UUID
+
+import numpy as np
+from langchain_core.callbacks import BaseCallbackHandler
+
+from chain_run import ChainRun
+
+# Stage names recorded by the chains. A single Cypher statement doing both the vector search and the graph
+# traversal is recorded as `retrieval`; `vector_search` and `graph_expansion` are only split when the chain
+# runs them as separate steps (vector mirror, client-side scoring).
+STAGES = ('cache_lookup', 'embedding', 'cypher_generation_first_token', 'cypher_generation', 'cypher_validation',
+          'graph_prefilter', 'vector_search', 'graph_expansion', 'retrieval', 'context_formatting',
+          'llm_first_token', 'llm', 'total')
+
+
+class StageTimer:
+    """Accumulates seconds per stage for one chain invocation."""
+
+    def __init__(self):
+        self._stages: Dict[str, float] = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float):
+        with self._lock:
+            self._stages[name] += seconds
+
+    def as_dict(self) -> Dict[str, float]:
+        with self._lock:
+            return {name: self._stages[name] for name in STAGES if name in self._stages}
+
+
+_current_timer: ContextVar[Optional[StageTimer]] = ContextVar('graphrag_stage_timer', default=None)
+_current_run: ContextVar[Optional[ChainRun]] = ContextVar('graphrag_chain_run', default=None)
+
+
+def current_run() -> ChainRun:
+    """The run of the chain invocation in the current context, or a throwaway one outside any invocation."""
+    run = _current_run.get()
+    return run if run is not None else ChainRun()
+
+
+@contextmanager
+def stage(name: str):
+    """Times the block into the invocation timer of the current context, if there is one."""
+    timer = _current_timer.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timer is not None:
+            timer.add(name, time.perf_counter() - start)
+
+
+class TimingRegistry:
+    """Rolling per-(chain, stage) latency windows plus cumulative counts and sums, exportable for Prometheus."""
+
+    def __init__(self, window: int = 1024):
+        self.window = window
+        self._samples: Dict[Tuple[str, str], Deque[float]] = dict()
+        self._totals: Dict[Tuple[str, str], Tuple[int, float]] = dict()
+        self._lock = threading.Lock()
+
+    def observe(self, chain: str, timings: Dict[str, float]):
+        with self._lock:
+            for name, seconds in timings.items():
+                key = (chain, name)
+                self._samples.setdefault(key, deque(maxlen=self.window)).append(seconds)
+                count, total = self._totals.get(key, (0, 0.0))
+                self._totals[key] = (count + 1, total + seconds)
+
+    def percentiles(self, chain: str, name: str, quantiles=(0.5, 0.95)) -> Dict[float, float]:
+        with self._lock:
+            samples = list(self._samples.get((chain, name), ()))
+        if not samples:
+            return dict()
+        return dict(zip(quantiles, np.quantile(samples, quantiles).tolist()))
+
+    def summary(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """{chain: {stage: {'p50', 'p95', 'count'}}} over the rolling window."""
+        with self._lock:
+            keys = list(self._samples.keys())
+            totals = dict(self._totals)
+        res = defaultdict(dict)
+        for chain, name in keys:
+            p = self.percentiles(chain, name)
+            res[chain][name] = {'p50': p[0.5], 'p95': p[0.95], 'count': totals[(chain, name)][0]}
+        return dict(res)
+
+    def to_prometheus(self, metric: str = 'graphrag_chain_stage_seconds') -> str:
+        """Renders a Prometheus text-format summary: rolling-window quantiles, cumulative `_count` and `_sum`."""
+        lines = [f'# HELP {metric} Latency of chain invocation stages in seconds.',
+                 f'# TYPE {metric} summary']
+        with self._lock:
+            keys = sorted(self._samples.keys())
+            totals = dict(self._totals)
+        for chain, name in keys:
+            labels = f'chain="{chain}",stage="{name}"'
+            for q, value in self.percentiles(chain, name).items():
+                lines.append(f'{metric}{{{labels},quantile="{q}"}} {value:.6f}')
+            count, total = totals[(chain, name)]
+            lines.append(f'{metric}_count{{{labels}}} {count}')
+            lines.append(f'{metric}_sum{{{labels}}} {total:.6f}')
+        return '\n'.join(lines) + '\n'
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+            self._totals.clear()
+
+
+timing_registry = TimingRegistry()
+
+
+def _enter(timer: StageTimer, run: ChainRun) -> Tuple:
+    return _current_timer.set(timer), _current_run.set(run)
+
+
+def _exit(tokens: Tuple):
+    timer_token, run_token = tokens
+    _current_run.reset(run_token)
+    _current_timer.reset(timer_token)
+
+
+def _observe(chain, timer: StageTimer, run: ChainRun, start: float, registry: Optional[TimingRegistry]):
+    timer.add('total', time.perf_counter() - start)
+    run.timings = timer.as_dict()
+    (registry or timing_registry).observe(type(chain).__name__, run.timings)
+
+
+@contextmanager
+def timed(chain, run: Optional[ChainRun] = None, registry: TimingRegistry = None):
+    """Times one invocation of `chain` and yields its `run` (a new one if not given), which is the `current_run`
+    inside the block. Stages recorded inside the block land in `run.timings`, which are also observed into
+    `registry` (the process-wide `timing_registry` by default) under the chain's class name.
+
+    Not for generators, whose `yield` would leave the run current in the consumer's context; see `timed_stream`.
+    """
+    run = run if run is not None else ChainRun()
+    timer = StageTimer()
+    tokens = _enter(timer, run)
+    start = time.perf_counter()
+    try:
+        yield run
+    finally:
+        _exit(tokens)
+        _observe(chain, timer, run, start, registry)
+
+
+def timed_stream(method: Callable[..., Iterator]) -> Callable[..., Iterator]:
+    """Like `timed`, for a chain's generator method, adding a `run` keyword argument to it. The run and timer are
+    only current while the generator runs, inside each `next()`, so stages the consumer records between items never
+    land in them. Timings are observed once the generator is exhausted or closed."""
+    @functools.wraps(method)
+    def wrapper(chain, *args, run: Optional[ChainRun] = None, **kwargs):
+        run = run if run is not None else ChainRun()
+        timer = StageTimer()
+        start = time.perf_counter()
+        items = method(chain, *args, **kwargs)
+        try:
+            while True:
+                tokens = _enter(timer, run)
+                try:
+                    item = next(items)
+                except StopIteration:
+                    return
+                finally:
+                    _exit(tokens)
+                yield item
+        finally:
+            tokens = _enter(timer, run)
+            try:
+                items.close()
+            finally:
+                _exit(tokens)
+            _observe(chain, timer, run, start, None)
+
+    return wrapper
+
+
+class LLMStageCallback(BaseCallbackHandler):
+    """Records an LLM call as `<stage_name>` and its time to first token as `<stage_name>_first_token`.
+
+    LLMs that do not stream report their first token when the call ends.
+    """
+    run_inline = True
+
+    def __init__(self, stage_name: str = 'llm'):
+        self.stage_name = stage_name
+        self._runs: Dict[UUID, list] = dict()
+
+    def on_llm_start(self, serialized, prompts, *, run_id: UUID, **kwargs):
+        timer = _current_timer.get()
+        if timer is not None:
+            self._runs[run_id] = [timer, time.perf_counter(), False]
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs):
+        run = self._runs.get(run_id)
+        if run is not None and not run[2]:
+            run[0].add(self.stage_name + '_first_token', time.perf_counter() - run[1])
+            run[2] = True
+
+    def _finish(self, run_id: UUID):
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        timer, start, first_token_seen = run
+        elapsed = time.perf_counter() - start
+        if not first_token_seen:
+            timer.add(self.stage_name + '_first_token', elapsed)
+        timer.add(self.stage_name, elapsed)
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs):
+        self._finish(run_id)
+
+    def on_llm_error(self, error, *, run_id: UUID, **kwargs):
+        self._finish(run_id)
+
+
+llm_timing_callback = LLMStageCallback('llm')
+cypher_generation_timing_callback = LLMStageCallback('cypher_generation')
@@ -1,8 +1,13 @@
 import base64
-from typing import Dict
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List
 
 import streamlit as st
 
+from chain_registry import chain_registry
+
 
 def render_centered_svg_from_str(svg: str, px):
     """Renders the given svg string."""
@@ -21,3 +26,73 @@ def get_neo4j_url_from_uri(uri):
     if uri[5] == '+':
         return 'http' + uri[6:]
     return 'http' + uri[5:]
+
+
+@dataclass
+class ComparisonColumn:
+    container: st.delta_generator.DeltaGenerator
+    running_message: str
+    stream: Callable[[Callable[[str], None]], Iterator[str]]
+
+
+def run_side_by_side(columns: List[ComparisonColumn]) -> List[str]:
+    """Runs each column's chain stream on its own thread and renders response and context as results land.
+
+    Worker threads only push events onto a queue; all Streamlit calls happen on the script thread.
+    Returns the full response text for every column.
+    """
+    events = queue.Queue()
+    response_placeholders = []
+    context_expanders = []
+    for column in columns:
+        with column.container:
+            response_placeholders.append(st.expander('__Response:__', True).empty())
+            context_expanders.append(st.expander("__Context used to answer this prompt:__"))
+        response_placeholders[-1].markdown(f'_{column.running_message}_')
+
+    def run(i: int, column: ComparisonColumn):
+        try:
+            for token in column.stream(lambda context: events.put((i, 'context', context))):
+                events.put((i, 'token', token))
+        except Exception as e:
+            events.put((i, 'error', e))
+        events.put((i, 'done', None))
+
+    responses = [''] * len(columns)
+    errors = []
+    with ThreadPoolExecutor(max_workers=len(columns)) as executor:
+        for i, column in enumerate(columns):
+            executor.submit(run, i, column)
+        remaining = len(columns)
+        while remaining:
+            i, kind, payload = events.get()
+            if kind == 'context':
+                # the encoded context is one JSON record per line, not a single JSON document
+                context_expanders[i].code(payload, language=None)
+            elif kind == 'token':
+                responses[i] += payload
+                response_placeholders[i].markdown(responses[i])
+            elif kind == 'error':
+                response_placeholders[i].error(str(payload))
+                errors.append(payload)
+            else:
+                remaining -= 1
+    if errors:
+        raise errors[0]
+    return responses
+
+
+def render_query_profile(profile):
+    """Renders the PROFILE counters of the last retrieval, if the chain captured any."""
+    if profile is None:
+        return
+    st.markdown('### Query Profile')
+    summary = profile.summary()
+    st.caption(f"{summary['dbHits']} db hits, {summary['rows']} rows, "
+               f"page cache hit ratio {summary['pageCacheHitRatio']:.2%}")
+    st.dataframe(profile.to_rows(), use_container_width=True)
+
+
+def get_chain(chain_cls, **config):
+    """Returns the process-wide chain for `config`, constructing it the first time any session asks for it."""
+    return chain_registry.get(chain_cls, **config)
@@ -0,0 +1,242 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+class IVFIndex:
+    """Inverted-file approximate nearest neighbour index over L2-normalized float32 vectors (cosine similarity).
+
+    A spherical k-means coarse quantizer splits the base matrix into `n_lists` inverted lists and a search only
+    scores the `n_probe` lists closest to the query. The base matrix can be persisted and memory-mapped back.
+    Vectors upserted after the build go into a small in-memory delta which is searched exhaustively until the next
+    `compact()`, and replaced or removed base rows are tombstoned.
+    """
+
+    def __init__(self, n_lists: Optional[int] = None, n_probe: int = 16, kmeans_iterations: int = 10, seed: int = 7474):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.kmeans_iterations = kmeans_iterations
+        self.seed = seed
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self.ids: List[str] = []
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+        self.centroids = np.zeros((0, 0), dtype=np.float32)
+        self.assignments = np.zeros(0, dtype=np.int32)
+        self._lists: List[np.ndarray] = []
+        self._rows: Dict[str, int] = dict()
+        self._tombstones = np.zeros(0, dtype=bool)
+        self._delta: Dict[str, np.ndarray] = dict()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._rows) - int(self._tombstones.sum()) + len(self._delta)
+
+    def _train(self, vectors: np.ndarray) -> np.ndarray:
+        n = len(vectors)
+        n_lists = min(self.n_lists or max(1, int(np.sqrt(n))), n)
+        rng = np.random.default_rng(self.seed)
+        centroids = vectors[rng.choice(n, n_lists, replace=False)]
+        for _ in range(self.kmeans_iterations):
+            assignments = np.argmax(vectors @ centroids.T, axis=1)
+            for c in range(n_lists):
+                members = vectors[assignments == c]
+                if len(members):
+                    centroids[c] = members.sum(axis=0)
+            centroids = _normalize(centroids)
+        return centroids
+
+    def _index_lists(self):
+        self._lists = [np.flatnonzero(self.assignments == c) for c in range(len(self.centroids))]
+
+    def build(self, ids: List[str], vectors):
+        with self._lock:
+            self._reset()
+            if not ids:
+                return
+            self.ids = list(ids)
+            self.vectors = _normalize(vectors)
+            self.centroids = self._train(self.vectors)
+            self.assignments = np.argmax(self.vectors @ self.centroids.T, axis=1).astype(np.int32)
+            self._rows = {node_id: row for row, node_id in enumerate(self.ids)}
+            self._tombstones = np.zeros(len(self.ids), dtype=bool)
+            self._index_lists()
+
+    def upsert(self, ids: List[str], vectors):
+        vectors = _normalize(vectors)
+        with self._lock:
+            for node_id, vector in zip(ids, vectors):
+                row = self._rows.get(node_id)
+                if row is not None:
+                    self._tombstones[row] = True
+                self._delta[node_id] = vector
+
+    def remove(self, ids: List[str]):
+        with self._lock:
+            for node_id in ids:
+                row = self._rows.get(node_id)
+                if row is not None:
+                    self._tombstones[row] = True
+                self._delta.pop(node_id, None)
+
+    def live_ids(self) -> set:
+        """Ids searchable right now: base rows not tombstoned plus the delta."""
+        with self._lock:
+            return {node_id for node_id, row in self._rows.items() if not self._tombstones[row]} | set(self._delta)
+
+    def compact(self):
+        """Folds the delta into the base matrix and drops tombstoned rows by rebuilding the index."""
+        with self._lock:
+            live = [row for row in range(len(self.ids)) if not self._tombstones[row]]
+            ids = [self.ids[row] for row in live] + list(self._delta.keys())
+            vectors = [self.vectors[live]] + ([np.stack(list(self._delta.values()))] if self._delta else [])
+            vectors = np.concatenate(vectors) if ids else np.zeros((0, 0), dtype=np.float32)
+        self.build(ids, vectors)
+
+    def search(self, query_vector, k: int) -> List[Tuple[str, float]]:
+        """Returns up to k (id, cosine similarity) pairs, best first."""
+        query = _normalize(query_vector)
+        with self._lock:
+            ids, scores = [], []
+            if len(self.centroids):
+                probe = np.argsort(-(self.centroids @ query))[:self.n_probe]
+                rows = np.concatenate([self._lists[c] for c in probe])
+                rows = rows[~self._tombstones[rows]]
+                ids.extend(self.ids[row] for row in rows)
+                scores.append(self.vectors[rows] @ query)
+            if self._delta:
+                ids.extend(self._delta.keys())
+                scores.append(np.stack(list(self._delta.values())) @ query)
+        if not ids:
+            return []
+        scores = np.concatenate(scores)
+        best = np.argpartition(-scores, k - 1)[:k] if len(scores) > k else np.arange(len(scores))
+        best = best[np.argsort(-scores[best])]
+        return [(ids[b], float(scores[b])) for b in best]
+
+    def save(self, path: str):
+        """Compacts and writes the index to `path` (a directory)."""
+        self.compact()
+        os.makedirs(path, exist_ok=True)
+        with self._lock:
+            np.save(os.path.join(path, 'vectors.npy'), self.vectors)
+            np.save(os.path.join(path, 'centroids.npy'), self.centroids)
+            np.save(os.path.join(path, 'assignments.npy'), self.assignments)
+            with open(os.path.join(path, 'ids.json'), 'w', encoding='utf-8') as f:
+                json.dump(self.ids, f)
+
+    @classmethod
+    def load(cls, path: str, n_probe: int = 16) -> 'IVFIndex':
+        index = cls(n_probe=n_probe)
+        with open(os.path.join(path, 'ids.json'), encoding='utf-8') as f:
+            index.ids = json.load(f)
+        index.vectors = np.load(os.path.join(path, 'vectors.npy'), mmap_mode='r')
+        index.centroids = np.load(os.path.join(path, 'centroids.npy'))
+        index.assignments = np.load(os.path.join(path, 'assignments.npy'))
+        index.n_lists = len(index.centroids)
+        index._rows = {node_id: row for row, node_id in enumerate(index.ids)}
+        index._tombstones = np.zeros(len(index.ids), dtype=bool)
+        index._index_lists()
+        return index
+
+
+class Neo4jVectorMirror:
+    """Local IVF mirror of a Neo4j vector index.
+
+    Scores are reported on the same [0, 1] scale as `db.index.vector.queryNodes` with cosine similarity, so ids
+    and scores can be handed back to Neo4j in place of the vector index call.
+
+    With a `refresh_interval` (seconds), a search after the interval first calls `sync`, picking up added and
+    deleted nodes. Changed embeddings of existing nodes need `refresh(ids)` or `build()`.
+    """
+
+    def __init__(self, driver, label: str, embedding_node_property: str, database: Optional[str] = None,
+                 path: Optional[str] = None, n_probe: int = 16, refresh_interval: Optional[float] = None):
+        self.driver = driver
+        self.label = label
+        self.embedding_node_property = embedding_node_property
+        self.database = database
+        self.path = path
+        self.n_probe = n_probe
+        self.refresh_interval = refresh_interval
+        self.index = IVFIndex(n_probe=n_probe)
+        self._synced_at = time.monotonic()
+
+    @classmethod
+    def from_index(cls, driver, index_name: str, database: Optional[str] = None, path: Optional[str] = None,
+                   n_probe: int = 16, refresh_interval: Optional[float] = None) -> 'Neo4jVectorMirror':
+        res = driver.execute_query("""
+        SHOW VECTOR INDEXES YIELD name, labelsOrTypes, properties
+        WHERE name = $name
+        RETURN labelsOrTypes[0] AS label, properties[0] AS property
+        """, name=index_name, database_=database)
+        if not res.records:
+            raise ValueError(f"Vector index {index_name!r} does not exist")
+        record = res.records[0]
+        mirror = cls(driver, record['label'], record['property'], database=database, path=path, n_probe=n_probe,
+                     refresh_interval=refresh_interval)
+        mirror.load_or_build()
+        return mirror
+
+    def _fetch(self, ids: Optional[List[str]] = None) -> Tuple[List[str], List[List[float]]]:
+        where = "AND elementId(n) IN $ids" if ids is not None else ""
+        res = self.driver.execute_query(f"""
+        MATCH (n:`{self.label}`) WHERE n.`{self.embedding_node_property}` IS NOT NULL {where}
+        RETURN elementId(n) AS id, n.`{self.embedding_node_property}` AS embedding
+        """, ids=ids, database_=self.database)
+        return [r['id'] for r in res.records], [r['embedding'] for r in res.records]
+
+    def build(self):
+        self._synced_at = time.monotonic()
+        ids, embeddings = self._fetch()
+        self.index.build(ids, embeddings)
+        if self.path is not None:
+            self.index.save(self.path)
+
+    def load_or_build(self):
+        if self.path is not None and os.path.exists(os.path.join(self.path, 'ids.json')):
+            self.index = IVFIndex.load(self.path, n_probe=self.n_probe)
+            if self.refresh_interval is not None:
+                # the saved mirror may predate changes to the graph
+                self.sync()
+        else:
+            self.build()
+
+    def refresh(self, ids: List[str]):
+        """Re-reads the given nodes: changed embeddings are upserted, deleted nodes are dropped."""
+        found, embeddings = self._fetch(ids)
+        if found:
+            self.index.upsert(found, embeddings)
+        self.index.remove(list(set(ids) - set(found)))
+
+    def sync(self):
+        """Upserts nodes added and drops nodes deleted since the last build or sync, reading only ids for the rest."""
+        self._synced_at = time.monotonic()
+        res = self.driver.execute_query(f"""
+        MATCH (n:`{self.label}`) WHERE n.`{self.embedding_node_property}` IS NOT NULL
+        RETURN elementId(n) AS id
+        """, database_=self.database)
+        current = {r['id'] for r in res.records}
+        known = self.index.live_ids()
+        added, removed = list(current - known), list(known - current)
+        if added:
+            self.refresh(added)
+        if removed:
+            self.index.remove(removed)
+
+    def search(self, query_vector: List[float], k: int) -> List[Dict]:
+        if self.refresh_interval is not None and time.monotonic() - self._synced_at > self.refresh_interval:
+            self.sync()
+        return [{'id': node_id, 'score': (1.0 + score) / 2} for node_id, score in self.index.search(query_vector, k)]
@@ -0,0 +1,134 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from neo4j.exceptions import DriverError, Neo4jError
+
+_FENCE = re.compile(r"^\s*```(?:cypher)?\s*|\s*```\s*$", re.IGNORECASE)
+
+
+def normalize_question(question: str) -> str:
+    return ' '.join(question.lower().split()).rstrip('?!. ')
+
+
+def clean_generated_cypher(text: str) -> str:
+    """Strips markdown code fences and surrounding whitespace the LLM may wrap around the statement."""
+    return _FENCE.sub('', text).strip()
+
+
+def validate_cypher(driver, query: str, database: Optional[str] = None) -> Optional[str]:
+    """Plans `query` with EXPLAIN, which neither executes it nor needs parameter values.
+
+    Returns None if the statement is valid, otherwise the database or driver error message (e.g. when the server
+    is unreachable), so the statement is never cached unvalidated.
+    """
+    try:
+        driver.execute_query('EXPLAIN ' + query, database_=database)
+    except Neo4jError as e:
+        return e.message or str(e)
+    except DriverError as e:
+        return str(e)
+    return None
+
+
+async def avalidate_cypher(driver, query: str, database: Optional[str] = None) -> Optional[str]:
+    try:
+        await driver.execute_query('EXPLAIN ' + query, database_=database)
+    except Neo4jError as e:
+        return e.message or str(e)
+    except DriverError as e:
+        return str(e)
+    return None
+
+
+class CypherCache:
+    """Thread-safe LRU cache of validated Cypher keyed by (namespace, normalized question).
+
+    The namespace should identify the schema and prompt used for generation, so that a change to either never
+    serves stale Cypher. With a `path` the cache is loaded from and written back to a JSON file on every insert. A
+    file that can't be read or parsed is logged and treated as empty, and is overwritten on the next insert.
+    """
+
+    def __init__(self, path: Optional[str] = None, maxsize: int = 1024):
+        self.path = path
+        self.maxsize = maxsize
+        self._data: OrderedDict[Tuple[str, str], str] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if path is not None and os.path.exists(path):
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                entries = [((namespace, question), query) for namespace, question, query in json.load(f)]
+        except (OSError, ValueError, TypeError) as e:
+            logging.warning(f"Ignoring unreadable Cypher cache {self.path}: {e}")
+            return
+        self._data.update(entries[-self.maxsize:])
+
+    @staticmethod
+    def namespace(*parts) -> str:
+        return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+    def get(self, namespace: str, question: str) -> Optional[str]:
+        key = (namespace, normalize_question(question))
+        with self._lock:
+            query = self._data.get(key)
+            if query is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return query
+
+    def put(self, namespace: str, question: str, query: str):
+        key = (namespace, normalize_question(question))
+        with self._lock:
+            self._data[key] = query
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+            if self.path is not None:
+                self._save()
+
+    def _save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump([[namespace, question, query] for (namespace, question), query in self._data.items()], f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+            if self.path is not None:
+                self._save()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'size': len(self._data),
+                    'maxsize': self.maxsize,
+                    'hit_rate': self.hits / lookups if lookups else 0.0}
+
+
+_cypher_caches: Dict[Optional[str], CypherCache] = dict()
+_cypher_caches_lock = threading.Lock()
+
+
+def get_cypher_cache(path: Optional[str] = None) -> CypherCache:
+    """Returns the process-wide cache for `path` (in-memory only when None)."""
+    with _cypher_caches_lock:
+        if path not in _cypher_caches:
+            _cypher_caches[path] = CypherCache(path=path)
+        return _cypher_caches[path]
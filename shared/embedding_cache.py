@@ -0,0 +1,98 @@
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+
+def normalize_text(text: str) -> str:
+    return ' '.join(text.split())
+
+
+class EmbeddingCache:
+    """Bounded, thread-safe LRU cache of embeddings keyed by (model name, normalized text)."""
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._data: OrderedDict[Tuple[str, str], List[float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple[str, str]) -> Optional[List[float]]:
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Tuple[str, str], value: List[float]):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'size': len(self._data),
+                    'maxsize': self.maxsize,
+                    'hit_rate': self.hits / lookups if lookups else 0.0}
+
+
+embedding_cache = EmbeddingCache()
+
+
+class CachedEmbeddings(Embeddings):
+    """Wraps an `Embeddings` model so that repeated texts are served from an `EmbeddingCache`."""
+
+    def __init__(self, embeddings: Embeddings, model_name: Optional[str] = None, cache: EmbeddingCache = None):
+        self.embeddings = embeddings
+        self.model_name = model_name or getattr(embeddings, 'model_name', type(embeddings).__name__)
+        self.cache = cache if cache is not None else embedding_cache
+
+    def _key(self, text: str) -> Tuple[str, str]:
+        return self.model_name, normalize_text(text)
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self._key(text)
+        vector = self.cache.get(key)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.put(key, vector)
+        return list(vector)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(t) for t in texts]
+        vectors = [self.cache.get(k) for k in keys]
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        if missing:
+            computed = self.embeddings.embed_documents([texts[i] for i in missing])
+            for i, vector in zip(missing, computed):
+                self.cache.put(keys[i], vector)
+                vectors[i] = vector
+        return [list(v) for v in vectors]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key = self._key(text)
+        vector = self.cache.get(key)
+        if vector is None:
+            vector = await asyncio.get_running_loop().run_in_executor(None, self.embeddings.embed_query, text)
+            self.cache.put(key, vector)
+        return list(vector)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await asyncio.get_running_loop().run_in_executor(None, self.embed_documents, texts)